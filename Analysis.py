@@ -25,7 +25,16 @@ import matplotlib.pyplot as plt
 import os
 import time
 import collections
+import multiprocessing
+import shutil
+import hashlib
+import json
+from decimal import Decimal
+import re
+import sqlite3
 import seaborn as sns
+from scipy.stats import norm
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 
 # Import CLOVER scripts, available for dowload at: https://github.com/phil-sandwell/CLOVER
@@ -87,6 +96,9 @@ class Analysis():
 #           * get_loaddata (Loadtype)
 #               Obtain data about the number of devices in use, hourly load by 
 #               device and total load of the system on an hourly basis
+#
+#           * get_load_filepath (Loadtype)
+#               Obtain the total load file of a load profile, calculating it if not available
 # 
 #           * simulate_system (PV_kWp, storage_kWh, Systype, Loadtype)
 #               Perform a simulation with the chosen system inputs and saves outputs
@@ -94,8 +106,53 @@ class Analysis():
 #           * optimise_system (Systype, Loadtype, max_blackouts, Stepsize)
 #               Perform an optimisation of the type of system/scenario selected and saves outputs           
 # 
+#
+# Optimisation functions
+#
+#           * set_system_type (Systype, max_blackouts)
+#               Enable the technologies of the selected system type and set the blackout threshold for simulation
+#
+#           * open_evaluations (Systype, Loadtype)
+#               Read the evaluation table once for an optimisation
+#
+#           * evaluate_system (PV_kWp, storage_kWh, Systype, Loadtype, max_blackouts, start_year, end_year, evaluations)
+#               Simulate and appraise a single candidate system, reusing the evaluations opened when available
+#
+#           * surrogate_design_search (Systype, Loadtype, max_blackouts, Stepsize, tolerance, max_evaluations)
+#               Search the single-period design of PV and storage sizes proposing candidates by expected improvement 
+#               of a surrogate model of LCUE and blackouts, and save convergence diagnostics
+#
+#           * cached_optimise_system (Systype, Loadtype, max_blackouts, Stepsize)
+#               Optimise PV and storage sizes stage by stage from the evaluation table shared by all blackout 
+#               thresholds, simulating only candidates never evaluated before
+#
+#           * dynamic_optimise_system (Systype, Loadtype, max_blackouts, Stepsize, Iteration_length)
+#               Optimise the cheapest expansion path of PV and storage over stages of the scenario by dynamic programming
+#
+#           * renewables_fraction_sweep (Loadtype, max_blackouts, fractions, Stepsize, refinements)
+#               Obtain the lowest LCUE hybrid system for each renewables fraction from one evaluated grid,
+#               densified only around the best systems
+#
+#           * convergence_study (Systype, Loadtype, max_blackouts, Stepsizes, tolerance)
+#               Optimise a system with decreasing step sizes reusing all previous evaluations, and recommend
+#               the coarsest step size with an LCUE within the tolerance of the finest one
+#
+#           * reappraise_systems (df_aggregates, finance, ghgs)
+#               Recompute costs, GHGs, LCUE and emissions intensity of systems from their yearly energy flows
+#               for new financial and GHG inputs, for one or many sets of inputs at once, without simulating again
+#
+#           * equipment_costs (Optimisation_Names)
+#               Obtain the PV, storage, BOS and other equipment costs of many optimisations at once, for any number of stages
+#
+#           * dispatch_systems (load, variant, PV_output, PV_kWp, storage_kWh, battery, max_blackouts)
+#               Simulate the hourly operation of a batch of PV-battery systems (with optional diesel backup) at once,
+#               for many sizes, loads or battery inputs
+# 
 # =============================================================================
 
+# Filepaths redirected to a workspace by isolate_workspace()
+CLOVER_paths = {'Origin':None, 'Workspace':None}
+
 # Define the colour palet that will be used for all figures:
 mypalet=['lightseagreen','darkcyan','lightsalmon','palevioletred','steelblue','cornflowerblue','orchid','yellowgreen','gold','burlywood']
 
@@ -687,10 +744,32 @@ def get_loaddata (Loadtype):
     # Save the new total_load.csv file
     filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Device Load/total_load.csv"
     total_load.to_csv(filepath, index=True)    
+    
+    # Save a copy of the total load of the load profile, kept when other load profiles are calculated
+    total_load.to_csv(get_load_filepath(Loadtype, False), index=True)
 
     print('All loads in use calculated, total load calculated and saved.')
 
     
+def get_load_filepath (Loadtype, calculate=True):
+    """
+    Obtain the total load file of a load profile, saved by get_loaddata(Loadtype) as total_load_Load{}.csv
+    
+    Input: Load profile for the selected scenario, between 'Mix1', 'Mix2', 'Mix2B', 'Mix1Adv', 'Mix2Adv', 'Mix1to2B'
+           Calculate, if True the load is calculated with get_loaddata(Loadtype) when the file doesn't exist, 
+               which also makes it the total load of the scenario
+    
+    Output: Filepath of the total load of the load profile
+    
+    """
+    filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Device load/total_load_Load{}.csv".format(Loadtype)
+    
+    if calculate == True and not os.path.exists(filepath):
+        print('\n Total load of', Loadtype, 'not found, calculating it...')
+        get_loaddata(Loadtype)
+    
+    return filepath
+    
     
 def simulate_system (PV_kWp, storage_kWh, Systype, Loadtype):
    
@@ -1068,12 +1147,15 @@ def simulate_system (PV_kWp, storage_kWh, Systype, Loadtype):
     # Obtain reliability of system for identifying the saved simulation (0-100)
     filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Scenario/Scenario inputs.csv"    
     df_scenario = pd.read_csv(filepath, header=None)
-    Reliability = int((1.0 - float(df_scenario.iat[3,1]))*100.0)  
+    Reliability = reliability_level(float(df_scenario.iat[3,1]))  
     
     # Save the outputs from the simulation
     Simulation_Name = 'Sim_PV{}_Storage{}_{}_Re{}_Load{}'.format(PV_kWp, storage_kWh, Systype, Reliability, Loadtype)
     Energy_System().save_simulation(SysSimulation, Simulation_Name)
     
+    # Save the rollup cube of the simulation alongside it
+    save_rollup(SysSimulation[0], self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/" + Simulation_Name + '.csv')
+    
     # Save appraisal results together with optimisation
     Appraisal_Name = 'Sim_PV{}_Storage{}_{}_Re{}_Load{}_Appraisal.csv'.format(PV_kWp, storage_kWh, Systype, Reliability, Loadtype)
     Appraisal_Filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV{}_Storage{}_{}_Re{}_Load{}_Appraisal.csv".format(PV_kWp, storage_kWh, Systype, Reliability, Loadtype) 
@@ -1460,7 +1542,7 @@ def optimise_system (Systype, Loadtype, max_blackouts, Stepsize):
     df_optimisation.iat[11,1] = max_blackouts
     
     # Define reliability of system for identifying the saved files
-    Reliability = int((1.0 - max_blackouts)*100.0) 
+    Reliability = reliability_level(max_blackouts) 
     
     # Find  previous optimization for the closest lower reliability level
     # This is done to reduce the optimisation computing time by starting from a system size closer to the final optimum one
@@ -1511,193 +1593,1821 @@ def optimise_system (Systype, Loadtype, max_blackouts, Stepsize):
     Optimisation().save_optimisation(SysOptimisation,Optimisation_Name)
     
 # =============================================================================
-#                           Analysis functions
+#                           Optimisation functions
 # =============================================================================   
 #
-# Load profiles
-# 
-#           * public_loadprofile (txt, Loadtype)
-#               Obtain and present the average daily load profile of each public facility and total public load profile in the camp           
-#
-#           * private_loadprofile (txt, Loadtype)
-#               Obtain and present the average daily load profile of each private business and the total private load profile of the camp           
-# 
-#           * total_loadprofile (Loadtype)
-#               Obtain and present the average daily load profile of the combined public and private loads of the camp
-#
-#
-# Systems Comparison
-#
-#           * diesel_sys_performance (max_blackouts, Loadtype)
-#               Simulate performance of diesel-powered system for the selected scenario           
-# 
-#           * diesel_sys_stats (max_blackouts, Loadtype)
-#               Present costs, GHGs, diesel consumption of diesel-powered system for the selected scenario        
-# 
-#           * hybrid_sys_performance (max_blackouts, Loadtype, accuracy)
-#               Optimise and simulate the performance of a PV-battery-diesel system for the selected scenario           
-# 
-#           * hybrid_sys_stats (max_blackouts, Loadtype)
-#               Present sys sizes, costs, GHGs, diesel consumption of PV-battery-diesel system for the selected scenario        
-# 
-#           * PVBatt_sys_performance (max_blackouts, Loadtype, accuracy)
-#               Optimise and simulate the performance of a PV-battery system for the selected scenario                      
-# 
-#           * PVBatt_sys_stats (max_blackouts, Loadtype)
-#               Present sys sizes, costs, GHGs of PV-battery system for the selected scenario        
-# 
-#           * compare_keymetrics (max_blackouts, Loadtype)
-#               Compare LCUE, renewables fraction, GHG savings, diesel savings compared to base diesel case         
-# 
-#           * compare_costs (max_blackouts, Loadtype)
-#               Compare breakdown of costs of PVbatt/hybrid systems compared to base diesel case         
-#
-#           * compare_GHGs (max_blackouts, Loadtype)
-#               Compare breakdown of emissions of PVbatt/hybrid systems compared to base diesel case         
-#
-#
-# Sensitivity Analysis
-#
-#           * LCUE_sensitivity (Loadtype, initial_max_blackout, final_max_blackout, stepsize)
-#               Compare LCUE for diesel/hybrid/PVbatt systems for different reliability thresholds           
-# 
-#           * GHG_sensitivity (Loadtype, initial_max_blackout, final_max_blackout, stepsize)
-#               Compare GHG emissions for diesel/hybrid/PVbatt systems for different reliability thresholds           
-#
-#           * renewables_sensitivity (Loadtype, max_blackouts, initial_renewablesfraction, final_renewablesfraction, stepsize)
-#               Compare increase in LCUE for hybrid systems with higher renewables fraction compared to "min LCUE" hybrid system
-#
-#
-# Productive uses of electricity
-#
-#           * privateimpact_reliability(Loadtype, max_blackouts, Systype)
-#               Present reliability drop over time when additional private loads are included in the system         
-# 
-#           * privateimpact_design(Loadtype, max_blackouts):
-#               Present growing load over time from Scenario 1 to Scenario 2B
-#               Present compared wasted energy between initial sizing for Scenario 2B and optimized increase
-#
-#           * tariff_calculation(Systype, max_blackouts)
-#              Calculates the tariff for refugee businesses required to recover the additional investment 
-#              of Approach A and B scenarios in comparison with optimised PV-Battery System over 15 years
-#              Calculates the cost recovered if refugees pay a grid tariff value and the remaining additional costs
-#              Calculates the tariff for public users to cover Scenario 1 to 2B complete system (B), and
-#              Scenario 1 PV-Battery system plus the remaining additional costs that refugees can't cover
-#  
-# Scenario comparison
-# 
-#           * cumulative_capacity(max_blackouts):
-#               Present installed PV and storage capacity over lifetime for optimized systes for each scenario
-#
-#           * cumulative_costs(max_blackouts):
-#               Present cumulative costs for optimized systems for each scenario over lifetime
-#               Present final LCUE and initial equipment costs for each system for each scenario
-#
-# =============================================================================   
+
+def set_system_type (Systype, max_blackouts):
+    """
+    Enable the technologies of the selected system type and set the diesel backup threshold in Scenario inputs.csv
+    
+    Input: System type, between 'Diesel', 'Hybrid', or 'PVBatt'
+           Maximum fraction of blackouts allowed
+    
+    Output: Scenario inputs.csv updated for the simulation of the selected system type
+    
+    """
+    # Read the Scenario inputs.csv file 
+    filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Scenario/Scenario inputs.csv"
+    df_scenario = pd.read_csv(filepath, header=None)
+    
+    # PV, battery storage and diesel backup (Y/N) considered for each system type
+    technologies = {'Diesel':['N','N','Y'], 'Hybrid':['Y','Y','Y'], 'PVBatt':['Y','Y','N']}
+    
+    for n in range(0,3):
+        df_scenario.iat[n,1] = technologies[Systype][n]
+    
+    # Define diesel backup threshold of system for scenario
+    df_scenario.iat[3,1] = max_blackouts
+    
+    # Substitute new values in Scenario inputs.csv file for simulation
+    df_scenario.to_csv(filepath, index=None, header =None)
     
 
-# =============================================================================
-#                           Load profiles
-#    
-#   PRE-REQUISITE: Run get_loaddata(Loadtype) for selected scenario
-# =============================================================================   
-#
+def get_design_grid (Stepsize):
+    """
+    Obtain the PV and storage sizes considered by the optimisation, as defined in Optimisation inputs.csv
+    
+    Input: Step size of PV and battery capacity for optimization (in kWp or kWh)
+    
+    Output: Arrays of PV sizes (kWp) and storage sizes (kWh) of the optimisation grid
+            Scenario length and iteration length (years)
+    
+    """
+    # Locate and open Optimisation inputs file
+    filepathopt = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Optimisation inputs.csv"   
+    df_optimisation = pd.read_csv(filepathopt, header=None)
+    
+    # Sizes from the minimum to the maximum value with the chosen step size 
+    PV_sizes = np.arange(float(df_optimisation.iat[2,1]), float(df_optimisation.iat[3,1]) + 0.5*Stepsize, Stepsize)
+    storage_sizes = np.arange(float(df_optimisation.iat[6,1]), float(df_optimisation.iat[7,1]) + 0.5*Stepsize, Stepsize)
+    
+    # Scenario and iteration length of the optimisation
+    Scenario_length = int(df_optimisation.iat[0,1])
+    Iteration_length = int(df_optimisation.iat[1,1])
+    
+    return np.round(PV_sizes, 6), np.round(storage_sizes, 6), Scenario_length, Iteration_length
 
-def public_loadprofile (txt, Loadtype):
+
+def get_inputs_hash ():
     """
+    Obtain a hash of the input files that define the simulation and appraisal of a system, identifying the evaluations 
+    that remain valid. The blackout threshold is excluded when there is no diesel backup, as the simulation does not depend on it
     
-    Obtain and present the average daily load profile of each public facility and total public load profile in the camp
+    Input: Current input files of the location, including the total load of the scenario
     
-    Input: "txt" name of public load to be presented, write "total" to display total loads
-           Load profile for the selected scenario, between 'InstitutionalBase', 'InstitutionalAdv', 'Mix1', 'Mix2'
+    Output: Hash of the inputs (hexadecimal string)
     
-    Output: Display on console average hourly load
-            Save on /Plots/Plots Public XLoad/ directory a .png graph of the hourly average load     
+    """
+    # Technical, financial, environmental inputs and total load of the scenario    
+    input_files = ['Simulation/Energy system inputs.csv', 'Impact/Finance inputs.csv', 'Impact/GHG inputs.csv', 'Diesel/Diesel inputs.csv',
+                   'PV/PV generation inputs.csv', 'Location data/Location inputs.csv', 'Load/Device load/total_load.csv']
     
-    """    
-  
-    # Read the load.csv file for the corresponding device selected, or the total public   
-    filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Device load/" + txt + "_load.csv"  
-    df1 = pd.read_csv(filepath)
-    length = len(df1.index)
+    return hash_inputs(input_files)
 
-    # Read the devices.csv file containing hourly load information of the selected facility     
-    filepathdevices = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Devices.csv"  
-    df_devices = pd.read_csv(filepathdevices)    
-    lengthdevices = len(df_devices.index)     
+
+def get_energy_inputs_hash ():
+    """
+    Obtain a hash of the input files that define the simulation of a system, identifying the energy flows that remain 
+    valid for re-appraisal when only financial and environmental inputs change
     
-    # Create a new column with the hours from 0 to 23 repeatedly
-    hours=[0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,23]
-    repeated_hours = hours * int(length/len(hours))    
-    df1['Hours'] = repeated_hours
+    Input: Current input files of the location, including the total load of the scenario
     
-    # For every load scenario, the load from the existent public facilities is calculated and displayed
+    Output: Hash of the inputs (hexadecimal string)
     
-    # For the existing load in Nyabiheke (Scenario 1)
-    if Loadtype == 'Mix1':
+    """
+    # Technical inputs and total load of the scenario    
+    input_files = ['Simulation/Energy system inputs.csv', 'Diesel/Diesel inputs.csv', 'PV/PV generation inputs.csv', 
+                   'Location data/Location inputs.csv', 'Load/Device load/total_load.csv']
+    
+    return hash_inputs(input_files)
+
+
+def hash_inputs (input_files):
+    """
+    Obtain a hash of the Scenario inputs and the selected input files of the location
+    
+    Input: List of input files, relative to the location directory
+    
+    Output: Hash of the inputs (hexadecimal string)
+    
+    """
+    location_filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/"
+    
+    # Scenario inputs, without the blackout threshold if the system has no diesel backup
+    df_scenario = pd.read_csv(location_filepath + "Scenario/Scenario inputs.csv", header=None)
+    if df_scenario.iat[2,1] == 'N':
+        df_scenario.iat[3,1] = ''
+    
+    inputs_hash = hashlib.md5(df_scenario.to_csv(index=None, header=None).encode())
+    
+    for input_file in input_files:
+        if os.path.exists(location_filepath + input_file):
+            with open(location_filepath + input_file, 'rb') as f:
+                inputs_hash.update(f.read())
+                
+    return inputs_hash.hexdigest()
+    
+
+def open_evaluations (Systype, Loadtype):
+    """
+    Open the systems already evaluated for the selected system type and load profile which remain valid for the current inputs,
+    read once for an optimisation and passed to evaluate_system()
+    
+    Input: System type, between 'Diesel', 'Hybrid', or 'PVBatt'
+           Load profile for the selected scenario, between 'Mix1', 'Mix2', 'Mix2B', 'Mix1Adv', 'Mix2Adv', 'Mix1to2B'
+    
+    Output: Dictionary with the hashes of the current inputs ('Input hash' and 'Energy input hash') and the appraisal results 
+            of each system evaluated with them ('Systems'), by (PV size, storage size, start year, end year)
+    
+    """
+    # Evaluations are saved in the /Saved optimisations/Evaluations/ directory
+    filepath = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Evaluations/Evaluations_{}_Load{}.csv'.format(Systype, Loadtype)
+    
+    evaluations = {'Input hash':get_inputs_hash(), 'Energy input hash':get_energy_inputs_hash(), 'Systems':{}}
+    
+    if os.path.exists(filepath):
         
-       # Calculate the average load for each hour (0 to 23)
-       hourly_mean = {'1 UNHCR Office':[],
-                   '2 Other Offices':[],
-                   '5 Water Pump 1':[],
-                   '4 Water Pump 2':[],
-                   '3 Bank':[],
-                   '6 Health Centre':[]}
+        # Keep only evaluations with the current inputs
+        df_evaluations = pd.read_csv(filepath)
+        df_evaluations = df_evaluations[df_evaluations['Input hash'] == evaluations['Input hash']]
         
-       for i in range(0, 24):
-           
-           # To calculate the total, first calculate the average load from each facility for each hour
-           if txt == 'total':
-            
-               txt='UNHCR Office'
-               filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Device load/UNHCR_load.csv"  
-               df1 = pd.read_csv(filepath)
-               df1['Hours'] = repeated_hours
-               df_i = df1.loc[df1['Hours'] == i].mean(axis=0).iloc[1]
+        for _, evaluation in df_evaluations.iterrows():
+            key = (float(evaluation['Candidate PV size']), float(evaluation['Candidate storage size']), int(evaluation['Start year']), int(evaluation['End year']))
+            evaluations['Systems'].setdefault(key, evaluation)
+    
+    return evaluations
+    
 
-               hourly_mean['1 UNHCR Office'].append(df_i)
+def evaluation_table (evaluations, start_year, end_year):
+    """
+    Arrange the systems evaluated for a simulated period in a table
+    
+    Input: Dictionary of evaluations, as obtained with open_evaluations(Systype, Loadtype)
+           Start and end year of the simulated period
+    
+    Output: DataFrame with the appraisal results of each evaluated system (one row per candidate)
+    
+    """
+    systems = [evaluation for (PV, storage, start, end), evaluation in evaluations['Systems'].items() if start == start_year and end == end_year]
+    
+    if len(systems) == 0:
+        return pd.DataFrame({'Input hash':[], 'Candidate PV size':[], 'Candidate storage size':[], 'Blackouts':[], 'LCUE ($/kWh)':[]})
+    
+    return pd.DataFrame(systems).reset_index(drop=True)
+    
 
-            
-               txt='Other Offices'
-               filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Device load/NGOOfficeBlock_load.csv"  
-               df1 = pd.read_csv(filepath)
-               df1['Hours'] = repeated_hours
-               df_i = df1.loc[df1['Hours'] == i].mean(axis=0).iloc[1]            
-               hourly_mean['2 Other Offices'].append(df_i)
-            
-            
-               txt='Water Pump 1'
-               filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Device load/WaterPump1_load.csv"  
-               df1 = pd.read_csv(filepath)
-               df1['Hours'] = repeated_hours
-               df_i = df1.loc[df1['Hours'] == i].mean(axis=0).iloc[1]            
-               hourly_mean['5 Water Pump 1'].append(df_i)
-            
-               txt='Water Pump 2'
-               filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Device load/WaterPump2_load.csv"  
-               df1 = pd.read_csv(filepath)
-               df1['Hours'] = repeated_hours
-               df_i = df1.loc[df1['Hours'] == i].mean(axis=0).iloc[1]            
-               hourly_mean['4 Water Pump 2'].append(df_i)
-            
-               txt='Bank'
-               filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Device load/Bank_load.csv"  
-               df1 = pd.read_csv(filepath)
-               df1['Hours'] = repeated_hours
-               df_i = df1.loc[df1['Hours'] == i].mean(axis=0).iloc[1]            
-               hourly_mean['3 Bank'].append(df_i)            
-            
-               txt='Health Centre'
-               filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Device load/HealthCentre_load.csv"  
-               df1 = pd.read_csv(filepath)
-               df1['Hours'] = repeated_hours
-               df_i = df1.loc[df1['Hours'] == i].mean(axis=0).iloc[1]
-               hourly_mean['6 Health Centre'].append(df_i)      
-            
-               txt='total'
+def open_evaluation_table (Systype, Loadtype, start_year, end_year):
+    """
+    Open the systems already evaluated for the selected system type and load profile which remain valid for the current inputs
     
-               # When all hours calculated, plot the resulting graph with the stacked public loads
-               if i == 23:
+    Input: System type, between 'Diesel', 'Hybrid', or 'PVBatt'
+           Load profile for the selected scenario, between 'Mix1', 'Mix2', 'Mix2B', 'Mix1Adv', 'Mix2Adv', 'Mix1to2B'
+           Start and end year of the simulated period
+    
+    Output: DataFrame with the appraisal results of each evaluated system (one row per candidate)
+    
+    """
+    return evaluation_table(open_evaluations(Systype, Loadtype), start_year, end_year)
+    
+
+def evaluate_system (PV_kWp, storage_kWh, Systype, Loadtype, max_blackouts, start_year, end_year, evaluations):
+    """
+    Simulate and appraise a single candidate system, as done by CLOVER for each point of an optimisation
+    
+    The candidate is simulated in a single period from the start to the end year with fixed sizes, as one stage of 
+    an optimisation. Each evaluation is stored in the evaluation table of the system type and load profile, and reused by later 
+    optimisations with the same inputs. Without diesel backup this is independent of the blackout threshold.
+    
+    PRE-REQUISITE: Run get_loaddata(Loadtype) and set_system_type(Systype, max_blackouts)
+    
+    Input: PV and battery size in kWp and kWh
+           System type, between 'Diesel', 'Hybrid', or 'PVBatt'
+           Load profile for the selected scenario, between 'Mix1', 'Mix2', 'Mix2B', 'Mix1Adv', 'Mix2Adv', 'Mix1to2B'
+           Maximum fraction of blackouts allowed
+           Start and end year of the simulated period
+           Dictionary of evaluations opened once for the optimisation with open_evaluations(Systype, Loadtype)
+    
+    Output: Series with the appraisal results (technical, financial, environmental) of the candidate system, 
+            also added to the dictionary of evaluations
+    
+    """
+    # Check if the candidate has already been evaluated with the current inputs
+    key = (float(PV_kWp), float(storage_kWh), int(start_year), int(end_year))
+    
+    if key in evaluations['Systems']:
+        return evaluations['Systems'][key]
+    
+    # Simulate candidate system in CLOVER on hourly basis for the chosen period
+    SysSimulation = Energy_System().simulation(start_year, end_year, PV_kWp, storage_kWh)
+    
+    # Perform system appraisal (technical, environmental, financial) of simulated system
+    AppraisalResults = Optimisation().system_appraisal(SysSimulation)
+    
+    # Identify the evaluation by the inputs used and the candidate sizes
+    df_evaluation = AppraisalResults.iloc[[0]].reset_index(drop=True)
+    df_evaluation.insert(0, 'Input hash', evaluations['Input hash'])
+    df_evaluation.insert(1, 'Candidate PV size', PV_kWp)
+    df_evaluation.insert(2, 'Candidate storage size', storage_kWh)
+    
+    # Add the evaluation to the evaluation table
+    filepath = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Evaluations/Evaluations_{}_Load{}.csv'.format(Systype, Loadtype)
+    
+    if not os.path.isdir(os.path.dirname(filepath)):
+        os.makedirs(os.path.dirname(filepath))
+    
+    df_evaluation.to_csv(filepath, mode='a', header=not os.path.exists(filepath), index=None)
+    
+    # Add the yearly energy flows of the candidate to the aggregates table, for its re-appraisal with other financial inputs
+    df_aggregates = get_energy_aggregates(SysSimulation, 'PV{}_Storage{}_{}to{}'.format(PV_kWp, storage_kWh, start_year, end_year))
+    df_aggregates.insert(0, 'Input hash', evaluations['Energy input hash'])
+    
+    filepath = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Evaluations/Aggregates_{}_Load{}.csv'.format(Systype, Loadtype)
+    df_aggregates.to_csv(filepath, mode='a', header=not os.path.exists(filepath), index=None)
+    
+    evaluations['Systems'][key] = df_evaluation.iloc[0]
+    
+    return evaluations['Systems'][key]
+    
+
+def open_aggregates_table (Systype, Loadtype):
+    """
+    Open the yearly energy flows of the systems already evaluated for the selected system type and load profile 
+    which remain valid for the current technical inputs
+    
+    Input: System type, between 'Diesel', 'Hybrid', or 'PVBatt'
+           Load profile for the selected scenario, between 'Mix1', 'Mix2', 'Mix2B', 'Mix1Adv', 'Mix2Adv', 'Mix1to2B'
+    
+    Output: DataFrame of yearly energy flows of each evaluated design, named i.e.: 'PV100.0_Storage50.0_0to15'
+    
+    """
+    filepath = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Evaluations/Aggregates_{}_Load{}.csv'.format(Systype, Loadtype)
+    
+    if not os.path.exists(filepath):
+        return pd.DataFrame({'Design':[], 'Year':[]})
+    
+    df_aggregates = pd.read_csv(filepath)
+    
+    # Keep only energy flows simulated with the current technical inputs, once for each design
+    df_aggregates = df_aggregates[df_aggregates['Input hash'] == get_energy_inputs_hash()]
+    df_aggregates = df_aggregates.drop_duplicates(subset=['Design','Year'])
+    
+    return df_aggregates.drop(columns='Input hash').reset_index(drop=True)
+    
+
+def open_checkpoint (Optimisation_Name, configuration):
+    """
+    Open the append-only checkpoint journal of an optimisation run, identified by a hash of its configuration
+    
+    Input: Name of the optimisation run
+           Dictionary with the arguments of the run
+    
+    Output: Filepath of the checkpoint journal
+            List of the records journaled by a previous run with the same configuration (empty for a new run)
+    
+    """
+    # Configuration of the run: arguments, optimisation inputs and simulation inputs
+    filepathopt = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Optimisation inputs.csv"
+    df_optimisation = pd.read_csv(filepathopt, header=None)
+    
+    configuration = dict(configuration)
+    configuration['Optimisation inputs'] = df_optimisation.to_csv(index=None, header=None)
+    configuration['Input hash'] = get_inputs_hash()
+    configuration_hash = hashlib.md5(json.dumps(configuration, sort_keys=True, default=str).encode()).hexdigest()[:12]
+    
+    # Checkpoints are saved in the /Optimisation/Checkpoints/ directory
+    checkpoint_dir = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Checkpoints/'
+    
+    if not os.path.isdir(checkpoint_dir):
+        os.makedirs(checkpoint_dir)
+        
+    filepath = checkpoint_dir + '{}_{}.jsonl'.format(Optimisation_Name, configuration_hash)
+    
+    # Read the records of a previous run, removing a last record left incomplete by an interruption 
+    # so that the records appended next start on a new line
+    records = []
+    
+    if os.path.exists(filepath):
+        with open(filepath, 'rb+') as f:
+            journal = f.read()
+            f.truncate(journal.rfind(b'\n') + 1)
+        
+        for line in journal[:journal.rfind(b'\n') + 1].splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        
+        print('\n Resuming', Optimisation_Name, 'from', len(records), 'records of checkpoint', os.path.basename(filepath))
+    
+    return filepath, records
+    
+
+def write_checkpoint (filepath, record):
+    """
+    Append a record to the checkpoint journal of an optimisation run, written to disk before continuing
+    
+    Input: Filepath of the checkpoint journal
+           Dictionary with the record (evaluated candidate, completed stage...)
+    
+    Output: Record appended to the checkpoint journal
+    
+    """
+    with open(filepath, 'a') as f:
+        f.write(json.dumps(record, default=float) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+        
+
+def checkpoint_evaluation (checkpoint, journaled, PV_kWp, storage_kWh, Systype, Loadtype, max_blackouts, start_year, end_year, evaluations):
+    """
+    Evaluate a candidate system within an optimisation run, reusing the evaluations journaled by the run
+    
+    Input: Filepath of the checkpoint journal
+           Dictionary of evaluations journaled, by (PV size, storage size, start year, end year)
+           Candidate system, simulated period and dictionary of evaluations, as for evaluate_system()
+    
+    Output: Series with the appraisal results of the candidate system, journaled if it is a new evaluation
+    
+    """
+    key = (float(PV_kWp), float(storage_kWh), int(start_year), int(end_year))
+    
+    if key not in journaled:
+        
+        # Evaluate the candidate and journal it
+        appraisal = evaluate_system(PV_kWp, storage_kWh, Systype, Loadtype, max_blackouts, start_year, end_year, evaluations)
+        write_checkpoint(checkpoint, {'Record':'Evaluation', 'Candidate':list(key), 'Appraisal':appraisal.to_dict()})
+        journaled[key] = appraisal
+        
+    return journaled[key]
+    
+
+def surrogate_model (X, y, X_new):
+    """
+    Fit a Gaussian process (squared exponential kernel) to the evaluated points and predict the candidates not evaluated
+    
+    Input: X  Evaluated points (n x 2), normalised to the range (0.0-1.0)
+           y  Value obtained for each evaluated point
+           X_new  Candidate points (m x 2), normalised to the range (0.0-1.0)
+    
+    Output: Predicted mean and standard deviation for each candidate point
+            Length scale of the kernel selected by maximum likelihood
+    
+    """
+    # Normalise values to zero mean and unit variance
+    y_mean = np.mean(y)
+    y_std = np.std(y) if np.std(y) > 0 else 1.0
+    y_norm = (y - y_mean)/y_std
+    
+    # Squared distances between evaluated points
+    sq_dist = ((X[:,None,:] - X[None,:,:])**2).sum(axis=2)
+    
+    # Select the length scale with the highest marginal likelihood
+    best_likelihood = -np.inf
+    for length_scale in [0.05, 0.1, 0.15, 0.2, 0.3, 0.5, 0.75, 1.0]:
+        
+        K = np.exp(-0.5*sq_dist/length_scale**2) + 1e-6*np.eye(len(X))
+        try:
+            L = np.linalg.cholesky(K)
+        except np.linalg.LinAlgError:
+            continue
+        
+        alpha = np.linalg.solve(L.T, np.linalg.solve(L, y_norm))
+        likelihood = -0.5*np.dot(y_norm, alpha) - np.log(np.diag(L)).sum()
+        
+        if likelihood > best_likelihood:
+            best_likelihood, best_length_scale, best_L, best_alpha = likelihood, length_scale, L, alpha
+    
+    # Predict mean and standard deviation at the candidate points 
+    K_new = np.exp(-0.5*((X_new[:,None,:] - X[None,:,:])**2).sum(axis=2)/best_length_scale**2)
+    mean = np.dot(K_new, best_alpha)
+    v = np.linalg.solve(best_L, K_new.T)
+    variance = np.clip(1.0 - (v**2).sum(axis=0), 1e-12, None)
+    
+    return mean*y_std + y_mean, np.sqrt(variance)*y_std, best_length_scale
+    
+
+def surrogate_design_search (Systype, Loadtype, max_blackouts, Stepsize, tolerance, max_evaluations):
+    """
+    Search the PV and storage sizes with the lowest LCUE meeting the blackout threshold, using a surrogate model
+    of LCUE and blackouts fitted to the evaluated systems to propose the next candidate by expected improvement
+    
+    This is a single-period design search: each candidate is one fixed system simulated over the whole scenario in a
+    single period, while optimise_system() optimises the system stage by stage over the iteration length. Its results 
+    are only comparable with those of optimise_system() when the iteration length equals the scenario length
+    
+    PRE-REQUISITE: Run get_loaddata(Loadtype) for selected scenario
+    
+    Input: System type, between 'Hybrid', or 'PVBatt'
+           Load profile for the selected scenario, between 'Mix1', 'Mix2', 'Mix2B', 'Mix1Adv', 'Mix2Adv', 'Mix1to2B'
+           Maximum fraction of blackouts allowed
+           Step size of PV and battery capacity for optimization (in kWp or kWh)
+           tolerance  Expected improvement of LCUE ($/kWh) below which the optimisation stops
+           max_evaluations  Maximum number of systems simulated
+    
+    Output: Save appraisal of the optimum design as Surrogate_Design_{}_Re{}_Load{}.csv
+            Save convergence diagnostics of each evaluation as Surrogate_Design_{}_Re{}_Load{}_Convergence.csv
+    
+    """
+    # Define reliability of system for identifying the saved files
+    Reliability = reliability_level(max_blackouts) 
+    
+    # Set the technologies of the system type and blackout threshold
+    set_system_type(Systype, max_blackouts)
+    
+    # Candidate systems from the optimisation grid, normalised to (0.0-1.0) for the surrogate model, 
+    # simulated over the whole scenario whatever the iteration length
+    PV_sizes, storage_sizes, Scenario_length, _ = get_design_grid(Stepsize)
+    candidates = np.array([[PV, storage] for PV in PV_sizes for storage in storage_sizes])
+    span = np.ptp(candidates, axis=0)
+    span[span == 0] = 1.0
+    X_candidates = (candidates - candidates.min(axis=0))/span
+    
+    # Resume the candidates evaluated and diagnostics journaled by a previous run with the same configuration
+    checkpoint, records = open_checkpoint('Surrogate_Design_{}_Re{}_Load{}'.format(Systype, Reliability, Loadtype),
+                                          {'Systype':Systype, 'Loadtype':Loadtype, 'max_blackouts':max_blackouts, 'Stepsize':Stepsize, 'tolerance':tolerance, 'max_evaluations':max_evaluations})
+    journaled = {tuple(record['Candidate']): pd.Series(record['Appraisal']) for record in records if record['Record'] == 'Evaluation'}
+    journaled_sizes = set((PV, storage) for (PV, storage, start_year, end_year) in journaled)
+    
+    # Candidates evaluated by other runs in the evaluation table are included without new simulations
+    evaluations = open_evaluations(Systype, Loadtype)
+    df_evaluations = evaluation_table(evaluations, 0, Scenario_length)
+    cached = set(zip(df_evaluations['Candidate PV size'], df_evaluations['Candidate storage size'])) - journaled_sizes
+    evaluated = [index for index in range(len(candidates)) if tuple(candidates[index]) in cached]
+    n_cached = len(evaluated)
+    evaluated += [index for index in range(len(candidates)) if tuple(candidates[index]) in journaled_sizes]
+    
+    # Initial design: corners and centre of the grid plus a latin hypercube sample 
+    n_initial = min(9, len(candidates) - n_cached, max_evaluations)
+    rng = np.random.default_rng(0)
+    initial_points = [[0.0,0.0], [0.0,1.0], [1.0,0.0], [1.0,1.0], [0.5,0.5]]
+    latin_hypercube = (np.array([rng.permutation(n_initial), rng.permutation(n_initial)]).T + 0.5)/max(n_initial, 1)
+    initial_points = np.vstack([initial_points, latin_hypercube])
+    
+    for point in initial_points:
+        index = int(np.argmin(((X_candidates - point)**2).sum(axis=1)))
+        if index not in evaluated and len(evaluated) - n_cached < n_initial:
+            evaluated.append(index)
+    
+    # No surrogate model can be fitted without any evaluated system
+    if len(evaluated) == 0:
+        raise ValueError('No candidate system to evaluate with max_evaluations = {}'.format(max_evaluations))
+    
+    # Simulate and appraise the initial candidates
+    appraisals = []
+    diagnostics = [record['Diagnostics'] for record in records if record['Record'] == 'Stage' and record['Diagnostics']['Evaluation'] < len(evaluated)]
+    
+    print('\n Single-period surrogate design search over years 0 to', Scenario_length, 'in progress...')
+    
+    while True:
+        
+        # Simulate the systems pending of evaluation, journaling those of this run
+        for position in range(len(appraisals), len(evaluated)):
+            index = evaluated[position]
+            
+            if position < n_cached:
+                appraisals.append(evaluate_system(candidates[index,0], candidates[index,1], Systype, Loadtype, max_blackouts, 0, Scenario_length, evaluations))
+            else:
+                appraisals.append(checkpoint_evaluation(checkpoint, journaled, candidates[index,0], candidates[index,1], Systype, Loadtype, max_blackouts, 0, Scenario_length, evaluations))
+        
+        LCUE = np.array([float(appraisal['LCUE ($/kWh)']) for appraisal in appraisals])
+        blackouts = np.array([float(appraisal['Blackouts']) for appraisal in appraisals])
+        feasible = blackouts <= max_blackouts
+        
+        # Best system meeting the blackout threshold so far
+        best_LCUE = LCUE[feasible].min() if feasible.any() else np.nan
+        
+        # Candidates not yet evaluated
+        pending = np.setdiff1d(np.arange(len(candidates)), evaluated)
+        
+        if len(pending) == 0 or len(evaluated) - n_cached >= max_evaluations:
+            max_improvement = np.nan
+            length_scale = np.nan
+            next_index = None
+        
+        else:
+            # Fit surrogate models of LCUE and blackouts to the evaluated systems
+            LCUE_mean, LCUE_std, length_scale = surrogate_model(X_candidates[evaluated], LCUE, X_candidates[pending])
+            blackouts_mean, blackouts_std, _ = surrogate_model(X_candidates[evaluated], blackouts, X_candidates[pending])
+            
+            # Probability of meeting the blackout threshold
+            feasibility = norm.cdf((max_blackouts - blackouts_mean)/blackouts_std)
+            
+            # Expected improvement of LCUE weighted by feasibility (or only feasibility until a feasible system is found)
+            if feasible.any():
+                z = (best_LCUE - LCUE_mean)/LCUE_std
+                improvement = ((best_LCUE - LCUE_mean)*norm.cdf(z) + LCUE_std*norm.pdf(z))*feasibility
+            else:
+                improvement = feasibility
+                
+            max_improvement = float(improvement.max())
+            next_index = int(pending[np.argmax(improvement)])
+        
+        # Record convergence diagnostics of the last evaluation
+        diagnostics.append({'Evaluation': len(evaluated),
+                            'PV size (kWp)': candidates[evaluated[-1],0],
+                            'Storage size (kWh)': candidates[evaluated[-1],1],
+                            'LCUE ($/kWh)': LCUE[-1],
+                            'Blackouts': blackouts[-1],
+                            'Best LCUE ($/kWh)': best_LCUE,
+                            'Expected improvement ($/kWh)': max_improvement,
+                            'Length scale': length_scale})
+        write_checkpoint(checkpoint, {'Record':'Stage', 'Diagnostics':diagnostics[-1]})
+        
+        # Stop once the expected improvement is below the tolerance or no further evaluations are possible
+        if next_index is None or (feasible.any() and max_improvement < tolerance):
+            break
+        
+        evaluated.append(next_index)
+        
+    df_diagnostics = pd.DataFrame(diagnostics)
+    
+    if not feasible.any():
+        print('\n No system of the grid meets the blackout threshold after', len(evaluated) - n_cached, 'evaluations.')
+        return df_diagnostics
+    
+    # Optimum system found
+    optimum = appraisals[int(np.where(feasible, LCUE, np.inf).argmin())]
+    df_optimum = pd.DataFrame([optimum], index=['System results'])
+    
+    # Save the optimum system and the convergence diagnostics
+    opt_dir = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/'
+    Optimisation_Name = 'Surrogate_Design_{}_Re{}_Load{}'.format(Systype, Reliability, Loadtype)
+    df_optimum.to_csv(opt_dir + Optimisation_Name + '.csv')
+    df_diagnostics.to_csv(opt_dir + Optimisation_Name + '_Convergence.csv', index=None)
+    
+    print('\n Optimum single-period design found after', len(evaluated) - n_cached, 'evaluations and', n_cached, 'previous evaluations of', len(candidates), 'candidates:')
+    print('\n PV size:', optimum['Initial PV size'], 'kWp, Storage size:', optimum['Initial storage size'], 'kWh, LCUE:', optimum['LCUE ($/kWh)'], '$/kWh')
+    print('\n Optimisation saved as', Optimisation_Name + '.csv', 'and convergence diagnostics as', Optimisation_Name + '_Convergence.csv')
+    
+    return df_diagnostics
+    
+
+def cached_optimise_system (Systype, Loadtype, max_blackouts, Stepsize):
+    """
+    Optimise the PV and storage sizes with the lowest LCUE meeting the blackout threshold stage by stage over the
+    iteration length, as optimise_system(), answering from the evaluation table and simulating only the candidates 
+    never evaluated before.
+    
+    The candidates of each stage are the sizes of the grid not smaller than the final sizes of the previous stage. For 
+    each PV size, the smallest storage size meeting the threshold is found by bisection, as blackouts decrease with 
+    storage, and larger storage sizes are then checked while the LCUE keeps decreasing. The LCUE up to the end of the 
+    stage is obtained from the evaluation of the stage alone, crediting the cost of the equipment already installed, 
+    which is the same for every candidate of the stage. The selected system of each stage is then appraised by CLOVER 
+    considering the previous stages.
+    
+    PRE-REQUISITE: Run get_loaddata(Loadtype) for selected scenario
+    
+    Input: System type, between 'Hybrid', or 'PVBatt'
+           Load profile for the selected scenario, between 'Mix1', 'Mix2', 'Mix2B', 'Mix1Adv', 'Mix2Adv', 'Mix1to2B'
+           Maximum fraction of blackouts allowed
+           Step size of PV and battery capacity for optimization (in kWp or kWh)
+    
+    Output: Save the optimum system as Cached_Opt_{}_Re{}_Load{} with the same format as optimise_system()
+            DataFrame with the appraisal of each stage of the optimum system
+    
+    """
+    # Define reliability of system for identifying the saved files
+    Reliability = reliability_level(max_blackouts) 
+    
+    # Set the technologies of the system type and blackout threshold
+    set_system_type(Systype, max_blackouts)
+    
+    # Candidate systems from the optimisation grid and stages of the scenario
+    PV_sizes, storage_sizes, Scenario_length, Iteration_length = get_design_grid(Stepsize)
+    stages = [(start_year, min(start_year + Iteration_length, Scenario_length)) for start_year in range(0, Scenario_length, Iteration_length)]
+    
+    # Evaluations available before the optimisation
+    evaluations = open_evaluations(Systype, Loadtype)
+    n_cached = len(evaluations['Systems'])
+    
+    print('\n Optimisation of', len(stages), 'stages from', n_cached, 'previous evaluations in progress...')
+    
+    # Resume the stages and PV sizes completed by a previous run with the same configuration
+    checkpoint, records = open_checkpoint('Cached_Opt_{}_Re{}_Load{}'.format(Systype, Reliability, Loadtype),
+                                          {'Systype':Systype, 'Loadtype':Loadtype, 'max_blackouts':max_blackouts, 'Stepsize':Stepsize})
+    journaled = {tuple(record['Candidate']): pd.Series(record['Appraisal']) for record in records if record['Record'] == 'Evaluation'}
+    completed = {(record['Stage'], record['PV size']): record['Best'] for record in records if record['Record'] == 'PV size'}
+    credits = {record['Stage']: record['Credit'] for record in records if record['Record'] == 'Credit'}
+    optima = {record['Stage']: pd.DataFrame(record['Appraisal'], index=['System results']) for record in records if record['Record'] == 'Optimum'}
+    
+    # Define an initial system with 0 PV, 0 Storage and 13kW of diesel, as installed in Nyabiheke now   
+    initial_sys = pd.DataFrame({'Final PV size':0.0,
+                                            'Final storage size':0.0,
+                                            'Diesel capacity':13,
+                                            'Total system cost ($)':0.0,
+                                            'Total system GHGs (kgCO2eq)':0.0,
+                                            'Discounted energy (kWh)':0.0,
+                                            'Cumulative cost ($)':0.0,
+                                            'Cumulative system cost ($)':0.0,
+                                            'Cumulative GHGs (kgCO2eq)':0.0,
+                                            'Cumulative system GHGs (kgCO2eq)':0.0,
+                                            'Cumulative energy (kWh)':0.0,
+                                            'Cumulative discounted energy (kWh)':0.0,
+                                            },index=['System results'])
+    
+    previous_systems = initial_sys
+    SysOptimisation = pd.DataFrame([])
+    
+    for stage, (start_year, end_year) in enumerate(stages):
+        
+        # Candidates reached from the previous stage without removing capacity
+        stage_PV_sizes = PV_sizes[PV_sizes >= previous_systems['Final PV size'].iat[0]]
+        stage_storage_sizes = storage_sizes[storage_sizes >= previous_systems['Final storage size'].iat[0]]
+        
+        if len(stage_PV_sizes) == 0 or len(stage_storage_sizes) == 0:
+            print('\n No system of the grid can be reached in years', start_year, 'to', end_year)
+            return pd.DataFrame([])
+        
+        # Cost of the equipment already installed, credited to every candidate of the stage
+        if stage not in credits:
+            SysSimulation = Energy_System().simulation(start_year, end_year, stage_PV_sizes[0], stage_storage_sizes[0])
+            credits[stage] = (float(Optimisation().system_appraisal(SysSimulation)['Total system cost ($)'].iat[0])
+                              - float(Optimisation().system_appraisal(SysSimulation, previous_systems)['Total system cost ($)'].iat[0]))
+            write_checkpoint(checkpoint, {'Record':'Credit', 'Stage':stage, 'Credit':credits[stage]})
+        
+        # LCUE up to the end of the stage of a candidate evaluated alone
+        def stage_LCUE (evaluation):
+            return ((float(previous_systems['Cumulative system cost ($)'].iat[0]) + float(evaluation['Total system cost ($)']) - credits[stage])
+                    / (float(previous_systems['Cumulative discounted energy (kWh)'].iat[0]) + float(evaluation['Discounted energy (kWh)'])))
+        
+        df_evaluations = evaluation_table(evaluations, start_year, end_year)
+        frontier = [pd.Series(best) for (completed_stage, PV), best in completed.items() if completed_stage == stage and best is not None]
+        
+        for PV in stage_PV_sizes:
+            
+            if (stage, float(PV)) in completed:
+                continue
+            
+            # Storage sizes of this PV size known to meet or miss the blackout threshold
+            df_column = df_evaluations[(df_evaluations['Candidate PV size'] == PV) & (df_evaluations['Candidate storage size'] >= stage_storage_sizes[0])]
+            feasible_sizes = df_column.loc[df_column['Blackouts'] <= max_blackouts, 'Candidate storage size']
+            infeasible_sizes = df_column.loc[df_column['Blackouts'] > max_blackouts, 'Candidate storage size']
+            
+            low = int(np.searchsorted(stage_storage_sizes, infeasible_sizes.max(), side='right')) if len(infeasible_sizes) > 0 else 0
+            high = int(np.searchsorted(stage_storage_sizes, feasible_sizes.min())) if len(feasible_sizes) > 0 else len(stage_storage_sizes) - 1
+            
+            best = None
+            
+            # PV sizes that can't meet the threshold with the largest storage size are skipped
+            if low <= high and checkpoint_evaluation(checkpoint, journaled, PV, stage_storage_sizes[high], Systype, Loadtype, max_blackouts, start_year, end_year, evaluations)['Blackouts'] <= max_blackouts:
+                
+                # Bisection of the smallest storage size meeting the threshold
+                while low < high:
+                    middle = (low + high)//2
+                    
+                    if checkpoint_evaluation(checkpoint, journaled, PV, stage_storage_sizes[middle], Systype, Loadtype, max_blackouts, start_year, end_year, evaluations)['Blackouts'] <= max_blackouts:
+                        high = middle
+                    else:
+                        low = middle + 1
+                
+                # Increase storage size while the LCUE decreases
+                best = checkpoint_evaluation(checkpoint, journaled, PV, stage_storage_sizes[high], Systype, Loadtype, max_blackouts, start_year, end_year, evaluations)
+                
+                for storage in stage_storage_sizes[high+1:]:
+                    candidate = checkpoint_evaluation(checkpoint, journaled, PV, storage, Systype, Loadtype, max_blackouts, start_year, end_year, evaluations)
+                    
+                    if stage_LCUE(candidate) >= stage_LCUE(best):
+                        break
+                    
+                    best = candidate
+                
+                frontier.append(best)
+            
+            # Journal the PV size of the stage as completed
+            write_checkpoint(checkpoint, {'Record':'PV size', 'Stage':stage, 'PV size':float(PV), 'Best':None if best is None else best.to_dict()})
+        
+        if len(frontier) == 0:
+            print('\n No system of the grid meets the blackout threshold in years', start_year, 'to', end_year, ',', len(evaluations['Systems']) - n_cached, 'new evaluations.')
+            return pd.DataFrame([])
+        
+        # Appraise the best candidate of the stage considering the previous stages
+        if stage not in optima:
+            best = min(frontier, key=stage_LCUE)
+            SysSimulation = Energy_System().simulation(start_year, end_year, best['Candidate PV size'], best['Candidate storage size'])
+            optima[stage] = Optimisation().system_appraisal(SysSimulation, previous_systems)
+            write_checkpoint(checkpoint, {'Record':'Optimum', 'Stage':stage, 'Appraisal':optima[stage].iloc[0].to_dict()})
+        
+        previous_systems = optima[stage]
+        SysOptimisation = pd.concat([SysOptimisation, previous_systems])
+        
+        print('\n Stage', stage + 1, 'of', len(stages), 'optimised: PV size', previous_systems['Initial PV size'].iat[0], 'kWp, Storage size', previous_systems['Initial storage size'].iat[0], 'kWh')
+    
+    n_new = len(evaluations['Systems']) - n_cached
+    
+    # Save the outputs from the optimisation
+    Optimisation_Name = 'Cached_Opt_{}_Re{}_Load{}'.format(Systype, Reliability, Loadtype)
+    Optimisation().save_optimisation(SysOptimisation, Optimisation_Name)
+    
+    print('\n Optimum system found with', n_new, 'new evaluations and', n_cached, 'previous evaluations, LCUE:', SysOptimisation['LCUE ($/kWh)'].iat[-1], '$/kWh')
+    print('\n Optimisation saved as', Optimisation_Name)
+    
+    return SysOptimisation
+    
+
+def dynamic_optimise_system (Systype, Loadtype, max_blackouts, Stepsize, Iteration_length):
+    """
+    Optimise the expansion of the system over the whole scenario in stages of the selected length by dynamic programming,
+    finding the path of PV and storage sizes with the lowest total system cost meeting the blackout threshold in each stage.
+    
+    Each stage is simulated once for each (PV, storage) state, and appraised once for each starting state from which it can
+    be reached without removing capacity. Each state keeps the starting state of the cheapest path reaching it and the 
+    appraisal of the stage from that starting state, so stages shared between expansion paths are never recomputed and 
+    the rows of the optimum path are the appraisals of its own predecessors.
+    
+    PRE-REQUISITE: Run get_loaddata(Loadtype) for selected scenario
+    
+    Input: System type, between 'Hybrid', or 'PVBatt'
+           Load profile for the selected scenario, between 'Mix1', 'Mix2', 'Mix2B', 'Mix1Adv', 'Mix2Adv', 'Mix1to2B'
+           Maximum fraction of blackouts allowed
+           Step size of PV and battery capacity of the states (in kWp or kWh), coarser than for optimise_system()
+           Length of each expansion stage (years)
+    
+    Output: Save the optimum expansion path as DP_Opt_{}_Re{}_Load{} with the same format as optimise_system()
+            DataFrame with the appraisal of each stage of the optimum expansion path
+    
+    """
+    # Define reliability of system for identifying the saved files
+    Reliability = reliability_level(max_blackouts) 
+    
+    # Set the technologies of the system type and blackout threshold
+    set_system_type(Systype, max_blackouts)
+    
+    # States of the system and stages of the scenario
+    PV_sizes, storage_sizes, Scenario_length, _ = get_design_grid(Stepsize)
+    states = [(float(PV), float(storage)) for PV in PV_sizes for storage in storage_sizes]
+    stages = [(start_year, min(start_year + Iteration_length, Scenario_length)) for start_year in range(0, Scenario_length, Iteration_length)]
+    
+    # Define an initial system with 0 PV, 0 Storage and 13kW of diesel, as installed in Nyabiheke now   
+    initial_sys = pd.DataFrame({'Final PV size':0.0,
+                                            'Final storage size':0.0,
+                                            'Diesel capacity':13,
+                                            'Total system cost ($)':0.0,
+                                            'Total system GHGs (kgCO2eq)':0.0,
+                                            'Discounted energy (kWh)':0.0,
+                                            'Cumulative cost ($)':0.0,
+                                            'Cumulative system cost ($)':0.0,
+                                            'Cumulative GHGs (kgCO2eq)':0.0,
+                                            'Cumulative system GHGs (kgCO2eq)':0.0,
+                                            'Cumulative energy (kWh)':0.0,
+                                            'Cumulative discounted energy (kWh)':0.0,
+                                            },index=['System results'])
+    
+    # Starting states of the first stage (-1 for the initial system) and cost of the cheapest path reaching them
+    starting_states = {-1: initial_sys}
+    path_costs = {-1: 0.0}
+    stage_appraisals = []
+    stage_predecessors = []
+    
+    # Resume the states evaluated by a previous run with the same configuration
+    checkpoint, records = open_checkpoint('DP_Opt_{}_Re{}_Load{}'.format(Systype, Reliability, Loadtype),
+                                          {'Systype':Systype, 'Loadtype':Loadtype, 'max_blackouts':max_blackouts, 'Stepsize':Stepsize, 'Iteration_length':Iteration_length})
+    journaled = {(record['Stage'], record['State']): record for record in records if record['Record'] == 'Evaluation'}
+    
+    print('\n Dynamic programming optimisation of', len(stages), 'stages and', len(states), 'states in progress...')
+    
+    for stage, (start_year, end_year) in enumerate(stages):
+        
+        final_states = {}
+        predecessors = {}
+        
+        for state, (PV, storage) in enumerate(states):
+            
+            # States evaluated by a previous run
+            if (stage, state) in journaled:
+                
+                if journaled[(stage, state)]['Appraisal'] is not None:
+                    final_states[state] = pd.DataFrame(journaled[(stage, state)]['Appraisal'], index=['System results'])
+                    predecessors[state] = (journaled[(stage, state)]['Predecessor'], journaled[(stage, state)]['Cost'])
+                    
+                continue
+            
+            # Starting states from which this state is reached without removing capacity
+            sources = [source for source, df_source in starting_states.items() 
+                       if PV >= df_source['Final PV size'].iat[0] and storage >= df_source['Final storage size'].iat[0]]
+            
+            if len(sources) == 0:
+                continue
+            
+            # Simulate the state once for the stage
+            SysSimulation = Energy_System().simulation(start_year, end_year, PV, storage)
+            
+            for source in sources:
+                
+                # Appraise the stage considering the equipment existing in the starting state
+                AppraisalResults = Optimisation().system_appraisal(SysSimulation, starting_states[source])
+                
+                # Blackouts of the state do not depend on the starting state
+                if AppraisalResults['Blackouts'].iat[0] > max_blackouts:
+                    break
+                
+                # Keep the appraisal from the starting state of the cheapest path reaching the state
+                cost = path_costs[source] + float(AppraisalResults['Total system cost ($)'].iat[0])
+                
+                if state not in predecessors or cost < predecessors[state][1]:
+                    final_states[state] = AppraisalResults
+                    predecessors[state] = (source, cost)
+            
+            # Journal the evaluated state
+            write_checkpoint(checkpoint, {'Record':'Evaluation', 'Stage':stage, 'State':state, 
+                                          'Predecessor':predecessors[state][0] if state in predecessors else None,
+                                          'Cost':predecessors[state][1] if state in predecessors else None,
+                                          'Appraisal':final_states[state].iloc[0].to_dict() if state in final_states else None})
+        
+        write_checkpoint(checkpoint, {'Record':'Stage', 'Stage':stage})
+        
+        print('\n Stage', stage + 1, 'of', len(stages), 'evaluated:', len(final_states), 'states meet the blackout threshold')
+        
+        if len(final_states) == 0:
+            print('\n No system of the grid meets the blackout threshold in years', start_year, 'to', end_year)
+            return pd.DataFrame([])
+        
+        stage_appraisals.append(final_states)
+        stage_predecessors.append({state: source for state, (source, cost) in predecessors.items()})
+        path_costs = {state: cost for state, (source, cost) in predecessors.items()}
+        starting_states = final_states
+    
+    # Cheapest state at the end of the scenario, and the optimum expansion path leading to it
+    state = min(path_costs, key=path_costs.get)
+    total_cost = path_costs[state]
+    
+    path = []
+    rows = []
+    for stage in range(len(stages)-1, -1, -1):
+        path.insert(0, states[state])
+        rows.insert(0, stage_appraisals[stage][state])
+        state = stage_predecessors[stage][state]
+    
+    # Appraisal of each stage of the optimum expansion path from its own predecessor
+    SysOptimisation = pd.concat(rows)
+    
+    # Save the outputs from the optimisation
+    Optimisation_Name = 'DP_Opt_{}_Re{}_Load{}'.format(Systype, Reliability, Loadtype)
+    Optimisation().save_optimisation(SysOptimisation, Optimisation_Name)
+    
+    print('\n Optimum expansion path (PV kWp, storage kWh):', path, 'with total system cost', round(total_cost, 2), '$')
+    print('\n Optimisation saved as', Optimisation_Name)
+    
+    return SysOptimisation
+    
+
+def renewables_fraction_sweep (Loadtype, max_blackouts, fractions, Stepsize, refinements):
+    """
+    Obtain the hybrid system with the lowest LCUE for each minimum renewables fraction from one set of evaluated systems.
+    
+    A coarse grid of candidates is evaluated once and the best candidate for each fraction is found by constrained argmin.
+    The grid is then densified only around those candidates, halving the step size at each refinement until Stepsize.
+    
+    PRE-REQUISITE: Run get_loaddata(Loadtype) for selected scenario
+    
+    Input: Load profile for the selected scenario, between 'Mix1', 'Mix2', 'Mix2B', 'Mix1Adv', 'Mix2Adv', 'Mix1to2B'
+           Maximum fraction of blackouts allowed
+           Minimum renewables fractions (0.0-1.0) considered
+           Step size of PV and battery capacity of the final grid (in kWp or kWh)
+           Number of refinements of the grid, the coarse grid having a step size of Stepsize*2^refinements
+    
+    Output: Save the best system for each renewables fraction as RF_Sweep_Hybrid_Re{}_Load{}.csv
+            DataFrame with the best system for each renewables fraction
+    
+    """
+    # Analysis done for hybrid system
+    Systype = 'Hybrid'
+    Reliability = reliability_level(max_blackouts) 
+    fractions = np.array(fractions, dtype=float)
+    
+    # Set the technologies of the system type and blackout threshold
+    set_system_type(Systype, max_blackouts)
+    
+    # Limits of the grid and step size of the coarse grid
+    PV_sizes, storage_sizes, Scenario_length, Iteration_length = get_design_grid(Stepsize)
+    step = Stepsize*2**refinements
+    coarse_PV_sizes, coarse_storage_sizes, _, _ = get_design_grid(step)
+    
+    print('\n Evaluating coarse grid of', len(coarse_PV_sizes)*len(coarse_storage_sizes), 'hybrid systems...')
+    
+    evaluations = open_evaluations(Systype, Loadtype)
+    
+    for PV in coarse_PV_sizes:
+        for storage in coarse_storage_sizes:
+            evaluate_system(PV, storage, Systype, Loadtype, max_blackouts, 0, Scenario_length, evaluations)
+    
+    for refinement in range(refinements+1):
+        
+        # Systems evaluated meeting the blackout threshold
+        df_evaluations = evaluation_table(evaluations, 0, Scenario_length)
+        df_evaluations = df_evaluations[df_evaluations['Blackouts'] <= max_blackouts].reset_index(drop=True)
+        
+        # Lowest LCUE of the systems meeting each renewables fraction
+        meets_fraction = df_evaluations['Renewables fraction'].values[None,:] >= fractions[:,None]
+        LCUE = np.where(meets_fraction, df_evaluations['LCUE ($/kWh)'].values[None,:], np.inf)
+        optima = np.argmin(LCUE, axis=1)
+        feasible = meets_fraction.any(axis=1)
+        
+        if refinement == refinements:
+            break
+        
+        # Densify the grid around the best systems with half the step size
+        step = step/2.0
+        print('\n Refining grid around', len(set(optima[feasible])), 'systems with step size', step)
+        
+        for optimum in set(optima[feasible]):
+            
+            PV_optimum = df_evaluations.at[optimum, 'Candidate PV size']
+            storage_optimum = df_evaluations.at[optimum, 'Candidate storage size']
+            
+            for PV in np.round(PV_optimum + np.array([-step, 0.0, step]), 6):
+                for storage in np.round(storage_optimum + np.array([-step, 0.0, step]), 6):
+                    
+                    if PV_sizes[0] <= PV <= PV_sizes[-1] and storage_sizes[0] <= storage <= storage_sizes[-1]:
+                        evaluate_system(PV, storage, Systype, Loadtype, max_blackouts, 0, Scenario_length, evaluations)
+    
+    # Best system for each renewables fraction
+    df_sweep = df_evaluations.loc[optima, ['Candidate PV size', 'Candidate storage size', 'Renewables fraction', 'LCUE ($/kWh)', 'Cumulative cost ($)', 'New equipment cost ($)']].reset_index(drop=True)
+    df_sweep.loc[~feasible, :] = np.nan
+    df_sweep.insert(0, 'Minimum renewables fraction', fractions)
+    
+    # Save the results of the sweep
+    filepath = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/RF_Sweep_{}_Re{}_Load{}.csv'.format(Systype, Reliability, Loadtype)
+    df_sweep.to_csv(filepath, index=None)
+    
+    print('\n Renewables fraction sweep saved as RF_Sweep_{}_Re{}_Load{}.csv'.format(Systype, Reliability, Loadtype))
+    
+    return df_sweep
+
+
+def convergence_study (Systype, Loadtype, max_blackouts, Stepsizes, tolerance):
+    """
+    Obtain how the optimum system converges as the step size of the optimisation decreases, and the coarsest step size 
+    with an LCUE within the tolerance of the finest one.
+    
+    The system is optimised with cached_optimise_system() from the coarsest to the finest step size. All candidates 
+    evaluated for coarser grids are reused by the finer ones, so with nested grids (i.e. halving the step size) the whole
+    study costs about as many evaluations as a single optimisation with the finest step size.
+    
+    PRE-REQUISITE: Run get_loaddata(Loadtype) for selected scenario
+    
+    Input: System type, between 'Hybrid', or 'PVBatt'
+           Load profile for the selected scenario, between 'Mix1', 'Mix2', 'Mix2B', 'Mix1Adv', 'Mix2Adv', 'Mix1to2B'
+           Maximum fraction of blackouts allowed
+           List of step sizes of PV and battery capacity (in kWp or kWh), i.e.: [80, 40, 20, 10, 5]
+           Maximum relative difference of LCUE with the finest step size accepted (i.e.: 0.01 for 1%)
+    
+    Output: DataFrame with the optimum system (sizes of the last stage) and evaluations of each step size and its LCUE 
+                difference with the finest one
+            Save .csv file and .png graph as Convergence_{}_Re{}_Load{} in Saved optimisations directory
+    
+    """
+    # Define reliability of system for identifying the saved files
+    Reliability = reliability_level(max_blackouts) 
+    Stepsizes = sorted(Stepsizes, reverse=True)
+    
+    # Set the technologies of the system type for the hash of the evaluations
+    set_system_type(Systype, max_blackouts)
+    
+    df_convergence = pd.DataFrame(columns=['Stepsize', 'PV size (kWp)', 'Storage size (kWh)', 'LCUE ($/kWh)', 'New evaluations', 'Total evaluations'])
+    
+    # Optimise from the coarsest to the finest grid, reusing the evaluations of the previous grids
+    for Stepsize in Stepsizes:
+        
+        print('\n Optimisation with step size', Stepsize, 'in progress...')
+        
+        n_cached = len(open_evaluations(Systype, Loadtype)['Systems'])
+        SysOptimisation = cached_optimise_system(Systype, Loadtype, max_blackouts, Stepsize)
+        n_total = len(open_evaluations(Systype, Loadtype)['Systems'])
+        
+        if len(SysOptimisation) == 0:
+            df_convergence.loc[len(df_convergence)] = [Stepsize, np.nan, np.nan, np.nan, n_total - n_cached, n_total]
+            continue
+        
+        # Sizes of the last stage and LCUE of the whole scenario
+        optimum = SysOptimisation.iloc[-1]
+        df_convergence.loc[len(df_convergence)] = [Stepsize, optimum['Initial PV size'], optimum['Initial storage size'], optimum['LCUE ($/kWh)'], 
+                                                   n_total - n_cached, n_total]
+    
+    df_convergence = df_convergence.astype(float)
+    
+    # Difference of each step size with the finest one
+    LCUE_finest = df_convergence['LCUE ($/kWh)'].iat[-1]
+    df_convergence['LCUE difference'] = (df_convergence['LCUE ($/kWh)'] - LCUE_finest).abs() / LCUE_finest
+    
+    # Coarsest step size for which the step size and all finer ones are within the tolerance
+    within = (df_convergence['LCUE difference'] <= tolerance).values
+    converged = np.logical_and.accumulate(within[::-1])[::-1]
+    df_convergence['Converged'] = converged
+    
+    # Save the convergence study in the Saved optimisations directory
+    Convergence_Name = 'Convergence_{}_Re{}_Load{}'.format(Systype, Reliability, Loadtype)
+    plot_dir = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/'
+    df_convergence.to_csv(plot_dir + Convergence_Name + '.csv', index=None)
+    
+    # Plot the LCUE, PV size and storage size of the optimum system for each step size
+    fig, axes = plt.subplots(3, 1, sharex=True, figsize=(6,8))
+    
+    for ax, column, colour in zip(axes, ['LCUE ($/kWh)', 'PV size (kWp)', 'Storage size (kWh)'], mypalet):
+        ax.plot(df_convergence['Stepsize'], df_convergence[column], 'o-', linewidth=2, color=colour)
+        ax.set_ylabel(column, fontsize=12)
+        ax.grid()
+    
+    axes[0].fill_between(df_convergence['Stepsize'], LCUE_finest*(1.0 - tolerance), LCUE_finest*(1.0 + tolerance), color='lightgrey', alpha=0.5)
+    axes[-1].set_xlabel('Step size (kWp or kWh)', fontsize=12)
+    axes[-1].invert_xaxis()
+    
+    plot_name = Convergence_Name + '.png'
+    fig.savefig(plot_dir + plot_name, dpi=300, bbox_inches='tight')
+    plt.show()
+    
+    print(df_convergence)
+    
+    if converged.any():
+        print('\n Recommended step size:', df_convergence['Stepsize'].iat[int(np.argmax(converged))], 'with',
+              int(df_convergence['Total evaluations'].iat[-1]), 'evaluations in total')
+    else:
+        print('\n No step size converged within the tolerance')
+    
+    print('Figure saved as', plot_name)
+    
+    return df_convergence
+
+
+def get_impact_inputs ():
+    """
+    Obtain the financial and environmental inputs used for the appraisal of systems
+    
+    Input: Finance inputs.csv and GHG inputs.csv files of the location
+    
+    Output: Dictionaries of financial and GHG inputs, with the name of each input and its value
+    
+    """
+    location_filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/"
+    
+    df_finance = pd.read_csv(location_filepath + 'Impact/Finance inputs.csv', header=None)
+    df_GHGs = pd.read_csv(location_filepath + 'Impact/GHG inputs.csv', header=None)
+    
+    finance = dict(zip(df_finance[0], df_finance[1].astype(float)))
+    ghgs = dict(zip(df_GHGs[0], df_GHGs[1].astype(float)))
+    
+    return finance, ghgs
+
+
+def discount_factors (discount_rate, years):
+    """
+    Obtain the discount factors applied by the appraisal to each year 
+    
+    Input: Discount rate (fraction), single value or array of values
+           Years since the start of the scenario
+    
+    Output: Array of discount factors (1 - discount rate)^year, one row per discount rate and one column per year
+    
+    """
+    discount_rate = np.reshape(np.asarray(discount_rate, dtype=float), (-1, 1))
+    
+    return (1.0 - discount_rate) ** np.asarray(years, dtype=float)
+
+
+def get_energy_aggregates (SysSimulation, Design):
+    """
+    Obtain the yearly energy flows of a simulated system, used for its re-appraisal with reappraise_systems()
+    
+    Input: Simulation resulting of Energy_System().simulation() (hourly performance and system details)
+           Name of the design
+    
+    Output: DataFrame with one row per year with the installed and new capacities, new households, energy flows,
+            diesel fuel usage and kerosene lamp hours of the system
+    
+    """
+    df_simulation, df_details = SysSimulation
+    
+    start_year = int(df_details['Start year'].iat[0])
+    PV_kWp = float(df_details['Initial PV size'].iat[0])
+    storage_kWh = float(df_details['Initial storage size'].iat[0])
+    diesel_kW = float(df_details['Diesel capacity'].iat[0])
+    
+    # Sum each hourly energy flow over every year simulated
+    years = start_year + np.arange(len(df_simulation)) // 8760
+    
+    flows = {'Total energy (kWh)':'Total energy used (kWh)', 'Renewable energy (kWh)':'Renewables energy used (kWh)', 
+             'Storage energy (kWh)':'Storage energy supplied (kWh)', 'Grid energy (kWh)':'Grid energy (kWh)', 
+             'Diesel energy (kWh)':'Diesel energy (kWh)', 'Unmet energy (kWh)':'Unmet energy (kWh)', 
+             'Diesel fuel usage (l)':'Diesel fuel usage (l)', 'Kerosene lamps (hours)':'Kerosene lamps', 
+             'Kerosene mitigation (hours)':'Kerosene mitigation'}
+    
+    df_aggregates = pd.DataFrame({name: df_simulation[column].groupby(years).sum() for name, column in flows.items()})
+    
+    # Households connected during each year
+    households = df_simulation['Households'].groupby(years).last()
+    new_households = households.diff()
+    new_households.iat[0] = households.iat[0] - df_simulation['Households'].iat[0]
+    
+    # Capacities installed and added at the start of the simulation
+    first_year = df_aggregates.index == start_year
+    
+    df_aggregates.insert(0, 'Design', Design)
+    df_aggregates.insert(1, 'Year', df_aggregates.index)
+    df_aggregates.insert(2, 'PV size (kWp)', PV_kWp)
+    df_aggregates.insert(3, 'Storage size (kWh)', storage_kWh)
+    df_aggregates.insert(4, 'Diesel capacity (kW)', diesel_kW)
+    df_aggregates.insert(5, 'New PV size (kWp)', np.where(first_year, PV_kWp, 0.0))
+    df_aggregates.insert(6, 'New storage size (kWh)', np.where(first_year, storage_kWh, 0.0))
+    df_aggregates.insert(7, 'New diesel capacity (kW)', np.where(first_year, diesel_kW, 0.0))
+    df_aggregates.insert(8, 'New households', new_households.values)
+    
+    return df_aggregates.reset_index(drop=True)
+
+
+def get_optimisation_aggregates (Optimisation_Name, Design):
+    """
+    Obtain the yearly energy flows of an optimised system from its saved optimisation file, used for its re-appraisal 
+    with reappraise_systems(). The energy flows of each stage are evenly split between its years, and new households 
+    and kerosene lamp hours are recovered from the connection and kerosene costs of the stage
+    
+    Input: Name of the saved optimisation, i.e.: 'Opt_Hybrid_Re95_LoadMix1'
+           Name of the design
+    
+    Output: DataFrame with one row per year with the installed and new capacities, new households, energy flows,
+            diesel fuel usage and kerosene lamp hours of the system
+    
+    """
+    df_opt = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/{}.csv'.format(Optimisation_Name))
+    finance, ghgs = get_impact_inputs()
+    
+    # Capacities added at the start of each stage 
+    new_PV = df_opt['Initial PV size'] - df_opt['Final PV size'].shift(1).fillna(0.0)
+    new_storage = df_opt['Initial storage size'] - df_opt['Final storage size'].shift(1).fillna(0.0)
+    new_diesel = (df_opt['Diesel capacity'] - df_opt['Diesel capacity'].shift(1).fillna(0.0)).clip(lower=0.0)
+    
+    stages = []
+    
+    for stage in range(len(df_opt)):
+        
+        years = np.arange(int(df_opt['Start year'].iat[stage]), int(df_opt['End year'].iat[stage]))
+        discount = discount_factors(finance['Discount rate'], years)[0]
+        
+        df_stage = pd.DataFrame({'Design':Design, 'Year':years, 
+                                 'PV size (kWp)':df_opt['Initial PV size'].iat[stage],
+                                 'Storage size (kWh)':df_opt['Initial storage size'].iat[stage],
+                                 'Diesel capacity (kW)':df_opt['Diesel capacity'].iat[stage]})
+        
+        df_stage['New PV size (kWp)'] = np.where(years == years[0], new_PV.iat[stage], 0.0)
+        df_stage['New storage size (kWh)'] = np.where(years == years[0], new_storage.iat[stage], 0.0)
+        df_stage['New diesel capacity (kW)'] = np.where(years == years[0], new_diesel.iat[stage], 0.0)
+        df_stage['New households'] = np.where(years == years[0], df_opt['New connection cost ($)'].iat[stage] / (finance['Connection cost'] * discount[0]), 0.0)
+        
+        for column in ['Total energy (kWh)', 'Renewable energy (kWh)', 'Storage energy (kWh)', 'Grid energy (kWh)', 
+                       'Diesel energy (kWh)', 'Unmet energy (kWh)', 'Diesel fuel usage (l)']:
+            df_stage[column] = df_opt[column].iat[stage] / len(years)
+        
+        df_stage['Kerosene lamps (hours)'] = df_opt['Kerosene cost ($)'].iat[stage] / (finance['Kerosene cost'] * discount.sum())
+        df_stage['Kerosene mitigation (hours)'] = df_opt['Kerosene cost mitigated ($)'].iat[stage] / (finance['Kerosene cost'] * discount.sum())
+        
+        stages.append(df_stage)
+    
+    return pd.concat(stages, ignore_index=True)
+
+
+def reappraise_systems (df_aggregates, finance, ghgs):
+    """
+    Recompute the financial and environmental appraisal of systems from their yearly energy flows, without simulating 
+    them again. Any input can be given as an array of samples, in which case all samples are appraised at once
+    
+    Input: DataFrame of yearly energy flows of one or more designs, as obtained with get_energy_aggregates() 
+               or get_optimisation_aggregates()
+           Dictionaries of financial and GHG inputs, as obtained with get_impact_inputs(), where any value can be 
+               an array with one value per sample. The diesel fuel cost can also be an array of price trajectories,
+               one row per sample and one column per year of the scenario ($/litre)
+    
+    Output: Dictionary with the appraisal results (as in system_appraisal) of every design over all its years, 
+            each one an array with one row per sample and one column per design (in order of appearance)
+            Replacement of inverters is not included
+    
+    """
+    # Order the years of each design to add them with a single operation
+    codes, designs = pd.factorize(df_aggregates['Design'])
+    order = np.argsort(codes, kind='stable')
+    starts = np.searchsorted(codes[order], np.arange(len(designs)))
+    
+    rows = {column: df_aggregates[column].values[order].astype(float) for column in df_aggregates.columns if column != 'Design'}
+    years = rows['Year']
+    
+    # Read any input as a column of samples
+    F = {name: np.reshape(np.asarray(value, dtype=float), (-1, 1)) for name, value in finance.items()}
+    G = {name: np.reshape(np.asarray(value, dtype=float), (-1, 1)) for name, value in ghgs.items()}
+    
+    def decrease (rate):
+        return (1.0 - 0.01 * rate) ** years
+    
+    discount = discount_factors(F['Discount rate'][:, 0], years)
+    
+    # Scenario length over which grid GHGs change from initial to final values
+    df_optimisation = pd.read_csv(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Optimisation inputs.csv", header=None)
+    Scenario_length = float(df_optimisation.iat[0,1])
+    
+    new_PV, new_storage, new_diesel = rows['New PV size (kWp)'], rows['New storage size (kWh)'], rows['New diesel capacity (kW)']
+    
+    # Diesel fuel cost of each year, from a price trajectory with one column per year when given
+    if np.ndim(finance['Diesel fuel cost']) == 2:
+        fuel_price = np.asarray(finance['Diesel fuel cost'], dtype=float)[:, years.astype(int)]
+    else:
+        fuel_price = F['Diesel fuel cost'] * decrease(F['Diesel fuel cost decrease'])
+    
+    # Discounted costs of each year
+    costs = collections.OrderedDict()
+    costs['New equipment cost ($)'] = discount * (new_PV * (F['PV cost'] * decrease(F['PV cost decrease']) + F['BOS cost'] * decrease(F['BOS cost decrease'])
+                                                            + F['PV installation cost'] * decrease(F['PV installation cost decrease']))
+                                                  + new_storage * F['Storage cost'] * decrease(F['Storage cost decrease'])
+                                                  + new_diesel * (F['Diesel generator cost'] * decrease(F['Diesel generator cost decrease'])
+                                                                  + F['Diesel installation cost'] * decrease(F['Diesel installation cost decrease'])))
+    costs['New connection cost ($)'] = discount * rows['New households'] * F['Connection cost']
+    costs['O&M cost ($)'] = discount * (rows['PV size (kWp)'] * F['PV O&M'] + rows['Storage size (kWh)'] * F['Storage O&M'] 
+                                        + rows['Diesel capacity (kW)'] * F['Diesel O&M'] + F['General O&M'])
+    costs['Diesel cost ($)'] = discount * rows['Diesel fuel usage (l)'] * fuel_price
+    costs['Grid cost ($)'] = discount * rows['Grid energy (kWh)'] * F['Grid cost']
+    costs['Kerosene cost ($)'] = discount * rows['Kerosene lamps (hours)'] * F['Kerosene cost']
+    costs['Kerosene cost mitigated ($)'] = discount * rows['Kerosene mitigation (hours)'] * F['Kerosene cost']
+    
+    # GHGs of each year
+    GHGs = collections.OrderedDict()
+    GHGs['New equipment GHGs (kgCO2eq)'] = (new_PV * (G['PV GHGs'] * decrease(G['PV GHG decrease']) + G['BOS GHGs'] * decrease(G['BOS GHG decrease'])
+                                                      + G['PV installation GHGs'] * decrease(G['PV installation GHG decrease']))
+                                            + new_storage * G['Storage GHGs'] * decrease(G['Storage GHG decrease'])
+                                            + new_diesel * (G['Diesel generator GHGs'] * decrease(G['Diesel generator GHG decrease'])
+                                                            + G['Diesel installation GHGs'] * decrease(G['Diesel installation GHG decrease'])))
+    GHGs['New connection GHGs (kgCO2eq)'] = rows['New households'] * G['Connection GHGs']
+    GHGs['O&M GHGs (kgCO2eq)'] = (rows['PV size (kWp)'] * G['PV O&M GHGs'] + rows['Storage size (kWh)'] * G['Storage O&M GHGs'] 
+                                  + rows['Diesel capacity (kW)'] * G['Diesel O&M GHGs'] + G['General O&M GHGs'])
+    GHGs['Diesel GHGs (kgCO2eq)'] = rows['Diesel fuel usage (l)'] * G['Diesel fuel GHGs']
+    GHGs['Grid GHGs (kgCO2eq)'] = rows['Grid energy (kWh)'] * (G['Grid GHGs (initial)'] + (G['Grid GHGs (final)'] - G['Grid GHGs (initial)']) * years / Scenario_length)
+    GHGs['Kerosene GHGs (kgCO2eq)'] = rows['Kerosene lamps (hours)'] * G['Kerosene GHGs']
+    GHGs['Kerosene GHGs mitigated (kgCO2eq)'] = rows['Kerosene mitigation (hours)'] * G['Kerosene GHGs']
+    
+    energy = collections.OrderedDict()
+    energy['Total energy (kWh)'] = rows['Total energy (kWh)']
+    energy['Discounted energy (kWh)'] = discount * rows['Total energy (kWh)']
+    energy['Renewable energy (kWh)'] = rows['Renewable energy (kWh)'] + rows['Storage energy (kWh)']
+    
+    # Add the years of each design
+    results = collections.OrderedDict()
+    
+    for name, values in list(costs.items()) + list(GHGs.items()) + list(energy.items()):
+        results[name] = np.add.reduceat(np.atleast_2d(values), starts, axis=1)
+    
+    samples = max(len(values) for values in results.values())
+    results = collections.OrderedDict((name, np.broadcast_to(values, (samples, len(designs)))) for name, values in results.items())
+    
+    # Totals and key metrics of each design
+    results['Total system cost ($)'] = sum(results[name] for name in ['New equipment cost ($)', 'New connection cost ($)', 'O&M cost ($)', 'Diesel cost ($)', 'Grid cost ($)'])
+    results['Total cost ($)'] = results['Total system cost ($)'] + results['Kerosene cost ($)']
+    results['Total system GHGs (kgCO2eq)'] = sum(results[name] for name in ['New equipment GHGs (kgCO2eq)', 'New connection GHGs (kgCO2eq)', 'O&M GHGs (kgCO2eq)', 'Diesel GHGs (kgCO2eq)', 'Grid GHGs (kgCO2eq)'])
+    results['Total GHGs (kgCO2eq)'] = results['Total system GHGs (kgCO2eq)'] + results['Kerosene GHGs (kgCO2eq)']
+    results['Cumulative cost ($)'] = results['Total cost ($)']
+    results['Cumulative system cost ($)'] = results['Total system cost ($)']
+    results['Cumulative GHGs (kgCO2eq)'] = results['Total GHGs (kgCO2eq)']
+    results['Cumulative system GHGs (kgCO2eq)'] = results['Total system GHGs (kgCO2eq)']
+    results['LCUE ($/kWh)'] = results['Total system cost ($)'] / results['Discounted energy (kWh)']
+    results['Emissions intensity (gCO2/kWh)'] = 1000.0 * results['Total system GHGs (kgCO2eq)'] / results['Total energy (kWh)']
+    results['Renewables fraction'] = results.pop('Renewable energy (kWh)') / results['Total energy (kWh)']
+    
+    return results
+
+
+def reappraisal_table (df_aggregates, finance, ghgs):
+    """
+    Recompute the financial and environmental appraisal of systems for a single set of inputs
+    
+    Input: DataFrame of yearly energy flows of one or more designs, as obtained with get_energy_aggregates() 
+               or get_optimisation_aggregates()
+           Dictionaries of financial and GHG inputs, as obtained with get_impact_inputs()
+    
+    Output: DataFrame with the appraisal results of each design (one row per design)
+    
+    """
+    results = reappraise_systems(df_aggregates, finance, ghgs)
+    
+    return pd.DataFrame({name: values[0] for name, values in results.items()}, index=pd.unique(df_aggregates['Design']))
+
+
+def equipment_costs (Optimisation_Names):
+    """
+    Obtain the breakdown of the discounted equipment cost of optimised systems into PV, storage, BOS and other equipment,
+    for all stages of all optimisations at once, whatever their number of stages and iteration length
+    
+    Input: List of names of saved optimisations, i.e.: ['Opt_Hybrid_Re95_LoadMix1'], or None for all the saved optimisations
+           Finance inputs.csv file of the location
+    
+    Output: DataFrame with one row per optimisation with its PV, storage, BOS and other equipment costs ($)
+    
+    """
+    opt_dir = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/'
+    
+    if Optimisation_Names is None:
+        Optimisation_Names = sorted(name[:-len('.csv')] for name in os.listdir(opt_dir) if name.startswith('Opt_') and name.endswith('.csv'))
+    
+    # Stages of all optimisations in a single table
+    df_stages = pd.concat([pd.read_csv(opt_dir + Name + '.csv') for Name in Optimisation_Names], keys=range(len(Optimisation_Names)), names=['Optimisation', 'Stage'])
+    codes = df_stages.index.get_level_values('Optimisation').values
+    
+    finance, ghgs = get_impact_inputs()
+    
+    # Capacities added at the start of each stage and prices and discount factor of its installation year
+    new_PV = (df_stages['Initial PV size'] - df_stages['Final PV size'].groupby(level='Optimisation').shift(1).fillna(0.0)).values
+    new_storage = (df_stages['Initial storage size'] - df_stages['Final storage size'].groupby(level='Optimisation').shift(1).fillna(0.0)).values
+    
+    years = df_stages['Start year'].values.astype(float)
+    discount = discount_factors(finance['Discount rate'], years)[0]
+    
+    def price (cost, decrease):
+        return finance[cost] * (1.0 - 0.01 * finance[decrease]) ** years
+    
+    # Discounted cost of each stage added for each optimisation
+    def total (stage_costs):
+        return np.bincount(codes, weights=discount * stage_costs, minlength=len(Optimisation_Names))
+    
+    df_equipmentcost = pd.DataFrame(index=pd.Index(Optimisation_Names, name='Optimisation'))
+    df_equipmentcost['PV Cost'] = total(new_PV * price('PV cost', 'PV cost decrease'))
+    df_equipmentcost['Storage Cost'] = total(new_storage * price('Storage cost', 'Storage cost decrease'))
+    df_equipmentcost['BOS Cost'] = total(new_PV * price('BOS cost', 'BOS cost decrease'))
+    df_equipmentcost['Other equipment Cost'] = (np.bincount(codes, weights=df_stages['New equipment cost ($)'].values, minlength=len(Optimisation_Names))
+                                                - df_equipmentcost[['PV Cost', 'Storage Cost', 'BOS Cost']].sum(axis=1).values)
+    
+    return df_equipmentcost
+
+
+def get_energy_system_inputs ():
+    """
+    Obtain the battery, transmission and conversion inputs used for the simulation of systems
+    
+    Input: Energy system inputs.csv file of the location
+    
+    Output: Dictionary of energy system inputs, with the name of each input and its value
+    
+    """
+    filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Simulation/Energy system inputs.csv"
+    df_energysystem = pd.read_csv(filepath, header=None)
+    
+    return dict(zip(df_energysystem[0], df_energysystem[1].astype(float)))
+
+
+def get_PV_profile (Simulation_Name):
+    """
+    Obtain the hourly PV output per kWp installed from a saved simulation, including degradation and conversion losses
+    
+    Input: Name of a saved simulation with PV, i.e.: 'Sim_PV200_Storage500_PVBatt_Re95_LoadMix1'
+    
+    Output: Array of hourly PV output (kWh per kWp)
+    
+    """
+    filepath = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/' + Simulation_Name
+    
+    df_simulation = pd.read_csv(filepath + '.csv')
+    df_appraisal = pd.read_csv(filepath + '_Appraisal.csv')
+    
+    return df_simulation['Renewables energy supplied (kWh)'].values / float(df_appraisal['Initial PV size'].iat[0])
+
+
+def get_category_loads ():
+    """
+    Obtain the hourly load of each category of users included in the scenario 
+    
+    PRE-REQUISITE: Run get_loaddata(Loadtype) for selected scenario
+    
+    Input: total_load.csv file and Scenario inputs.csv file of the location
+    
+    Output: DataFrame of hourly load (kWh) of the Domestic, Commercial and Public users included in the scenario
+    
+    """
+    df_load = pd.read_csv(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Device load/total_load.csv")
+    df_scenario = pd.read_csv(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Scenario/Scenario inputs.csv", header=None)
+    
+    # Categories of users included (Y/N) in the scenario
+    included = dict(zip(df_scenario[0], df_scenario[1]))
+    categories = [category for category in ['Domestic', 'Commercial', 'Public'] if included.get(category, 'Y') == 'Y']
+    
+    return df_load[categories] / 1000.0
+
+
+def dispatch_systems (load, variant, PV_output, PV_kWp, storage_kWh, battery, max_blackouts):
+    """
+    Simulate the hourly operation of a batch of PV-battery systems at once, as an approximation of the CLOVER simulation
+    for comparing many systems, loads or battery inputs
+    
+    PV supplies the load first and charges the battery with any surplus. The battery covers the remaining load 
+    within its state of charge limits and C rate, and loses capacity in proportion to the energy discharged. 
+    With a blackout threshold, diesel backup covers the largest energy deficits until blackouts are within it.
+    
+    Input: Array of hourly load (kWh), one column per load variant
+           Array with the load variant of each system
+           Array of hourly PV output per kWp (kWh), i.e. from get_PV_profile(Simulation_Name)
+           Arrays of PV (kWp) and battery (kWh) sizes of each system
+           Dictionary of energy system inputs, as obtained with get_energy_system_inputs(), where any battery input 
+               can be an array with one value per system
+           Maximum fraction of blackouts allowed with diesel backup, or None for systems without diesel
+    
+    Output: Dictionary with the yearly energy flows and diesel fuel usage of each system (one row per system, one
+            column per year), and the blackouts and diesel capacity of each system
+    
+    """
+    load = np.asarray(load, dtype=float).reshape(len(PV_output), -1)
+    PV_kWp = np.asarray(PV_kWp, dtype=float)
+    storage_kWh = np.asarray(storage_kWh, dtype=float)
+    
+    hours = len(PV_output)
+    years = hours // 8760
+    systems = len(PV_kWp)
+    
+    # Battery inputs of each system
+    maximum_charge = np.broadcast_to(battery['Battery maximum charge'], (systems,))
+    minimum_charge = np.broadcast_to(battery['Battery minimum charge'], (systems,))
+    leakage = np.broadcast_to(battery['Battery leakage'], (systems,))
+    conversion_in = np.broadcast_to(battery['Battery conversion in'], (systems,))
+    conversion_out = np.broadcast_to(battery['Battery conversion out'], (systems,))
+    C_rate = np.broadcast_to(battery['Battery C rate'], (systems,))
+    
+    # Capacity lost per kWh discharged, reaching the lifetime loss after the cycle lifetime
+    capacity_loss = np.broadcast_to(battery['Battery lifetime loss'], (systems,)) / np.maximum(
+            np.broadcast_to(battery['Battery cycle lifetime'], (systems,)) * (maximum_charge - minimum_charge), 1e-9)
+    
+    flows = ['Total energy (kWh)', 'Renewable energy (kWh)', 'Storage energy (kWh)', 'Diesel energy (kWh)', 'Unmet energy (kWh)', 
+             'Dumped energy (kWh)', 'Diesel fuel usage (l)']
+    results = {flow: np.zeros((systems, years)) for flow in flows}
+    
+    capacity = storage_kWh.copy()
+    storage = capacity * maximum_charge
+    unmet_hourly = np.zeros((hours, systems), dtype=np.float32)
+    
+    for year in range(years):
+        
+        # PV used directly by the load, surplus and deficit of every hour of the year for all systems
+        hours_year = slice(year * 8760, (year + 1) * 8760)
+        demand = load[hours_year][:, variant]
+        generation = PV_output[hours_year, np.newaxis] * PV_kWp
+        direct = np.minimum(generation, demand)
+        surplus = generation - direct
+        deficit = demand - direct
+        
+        supplied = np.zeros((8760, systems))
+        charged = np.zeros((8760, systems))
+        
+        # Hourly operation of the batteries
+        for hour in range(8760):
+            
+            storage *= 1.0 - leakage
+            throughput = C_rate * capacity
+            
+            charge = np.minimum(np.minimum(surplus[hour] * conversion_in, throughput), np.maximum(capacity * maximum_charge - storage, 0.0))
+            storage += charge
+            
+            discharge = np.minimum(np.minimum(deficit[hour] / conversion_out, throughput), np.maximum(storage - capacity * minimum_charge, 0.0))
+            storage -= discharge
+            capacity -= capacity_loss * discharge
+            
+            charged[hour] = charge
+            supplied[hour] = discharge * conversion_out
+        
+        # Unmet energy, neglecting rounding errors of fully supplied hours
+        unmet = deficit - supplied
+        unmet_hourly[hours_year] = np.where(unmet > 1e-9, unmet, 0.0)
+        
+        results['Renewable energy (kWh)'][:, year] = direct.sum(axis=0)
+        results['Storage energy (kWh)'][:, year] = supplied.sum(axis=0)
+        results['Dumped energy (kWh)'][:, year] = (surplus - charged / conversion_in).sum(axis=0)
+        results['Total energy (kWh)'][:, year] = demand.sum(axis=0)
+    
+    # Diesel backup covering the largest deficits until blackouts are within the threshold
+    diesel_capacity = np.zeros(systems)
+    
+    if max_blackouts != None:
+        
+        df_diesel = pd.read_csv(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Diesel/Diesel inputs.csv", header=None)
+        consumption, minimum_load = float(df_diesel.iat[0,1]), float(df_diesel.iat[1,1])
+        allowed = int(max_blackouts * hours)
+        
+        for system in range(systems):
+            
+            unmet = unmet_hourly[:, system]
+            covered = np.count_nonzero(unmet > 0) - allowed
+            
+            if covered <= 0:
+                continue
+            
+            threshold = np.partition(unmet, hours - covered)[hours - covered]
+            diesel_energy = np.where(unmet >= threshold, unmet, 0.0)
+            diesel_capacity[system] = math.ceil(diesel_energy.max())
+            
+            # Fuel used by the generator in each hour it runs, at least at its minimum load
+            fuel = np.where(diesel_energy > 0, np.maximum(diesel_energy, minimum_load * diesel_capacity[system]) * consumption, 0.0)
+            
+            results['Diesel energy (kWh)'][system] = diesel_energy.reshape(years, 8760).sum(axis=1)
+            results['Diesel fuel usage (l)'][system] = fuel.reshape(years, 8760).sum(axis=1)
+            unmet_hourly[:, system] = unmet - diesel_energy
+    
+    results['Unmet energy (kWh)'] = unmet_hourly.reshape(years, 8760, systems).sum(axis=1).T.astype(float)
+    results['Total energy (kWh)'] -= results['Unmet energy (kWh)']
+    results['Blackouts'] = np.mean(unmet_hourly > 0, axis=0)
+    results['Diesel capacity (kW)'] = diesel_capacity
+    
+    return results
+
+
+def dispatch_aggregates (results, Designs, PV_kWp, storage_kWh):
+    """
+    Arrange the yearly energy flows of systems simulated with dispatch_systems() for their re-appraisal
+    
+    Input: Dictionary of results of dispatch_systems()
+           Names of the designs and arrays of PV (kWp) and battery (kWh) sizes of each system
+    
+    Output: DataFrame of yearly energy flows of the systems, to be used with reappraise_systems()
+    
+    """
+    systems, years = results['Total energy (kWh)'].shape
+    
+    df_aggregates = pd.DataFrame({'Design':np.repeat(Designs, years), 'Year':np.tile(np.arange(years), systems),
+                                  'PV size (kWp)':np.repeat(PV_kWp, years), 'Storage size (kWh)':np.repeat(storage_kWh, years),
+                                  'Diesel capacity (kW)':np.repeat(results['Diesel capacity (kW)'], years)})
+    
+    first_year = df_aggregates['Year'] == 0
+    
+    df_aggregates['New PV size (kWp)'] = np.where(first_year, df_aggregates['PV size (kWp)'], 0.0)
+    df_aggregates['New storage size (kWh)'] = np.where(first_year, df_aggregates['Storage size (kWh)'], 0.0)
+    df_aggregates['New diesel capacity (kW)'] = np.where(first_year, df_aggregates['Diesel capacity (kW)'], 0.0)
+    df_aggregates['New households'] = 0.0
+    
+    for flow in ['Total energy (kWh)', 'Renewable energy (kWh)', 'Storage energy (kWh)', 'Diesel energy (kWh)', 'Unmet energy (kWh)', 'Diesel fuel usage (l)']:
+        df_aggregates[flow] = results[flow].ravel()
+    
+    df_aggregates['Grid energy (kWh)'] = 0.0
+    df_aggregates['Kerosene lamps (hours)'] = 0.0
+    df_aggregates['Kerosene mitigation (hours)'] = 0.0
+    
+    return df_aggregates
+
+
+# =============================================================================
+#                           Analysis functions
+# =============================================================================   
+#
+# Load profiles
+# 
+#           * public_loadprofile (txt, Loadtype)
+#               Obtain and present the average daily load profile of each public facility and total public load profile in the camp           
+#
+#           * private_loadprofile (txt, Loadtype)
+#               Obtain and present the average daily load profile of each private business and the total private load profile of the camp           
+# 
+#           * total_loadprofile (Loadtype)
+#               Obtain and present the average daily load profile of the combined public and private loads of the camp
+# 
+#           * load_analytics (Loadtype, points)
+#               Obtain the load duration curves, yearly peaks, load factors and coincident peaks of each category of users
+#
+#
+# Systems Comparison
+#
+#           * diesel_sys_performance (max_blackouts, Loadtype)
+#               Simulate performance of diesel-powered system for the selected scenario           
+# 
+#           * diesel_sys_stats (max_blackouts, Loadtype)
+#               Present costs, GHGs, diesel consumption of diesel-powered system for the selected scenario        
+# 
+#           * diesel_sys_metrics (max_blackouts, Loadtype), diesel_sys_figures (max_blackouts, Loadtype)
+#               Save the metrics of diesel-powered system, and render its figures separately
+# 
+#           * hybrid_sys_performance (max_blackouts, Loadtype, accuracy)
+#               Optimise and simulate the performance of a PV-battery-diesel system for the selected scenario           
+# 
+#           * rollup_cube (df_hourly), save_rollup (df_hourly, filepath), open_rollup (filepath)
+#               Obtain, save and open the sums of all variables of a simulation by year, month and hour of the day
+# 
+#           * rollup_query (df_rollup, by, columns, statistic)
+#               Obtain daily profiles for all days or by year/season, monthly, yearly or lifetime averages and totals 
+#               of a simulation from its rollup cube
+# 
+#           * blackout_events (blackouts), blackout_analytics (Simulation_Names)
+#               Obtain the blackout events of hourly series, and the number, duration distribution, longest blackout
+#               and SAIFI/SAIDI/CAIDI indices of the blackouts of many simulations
+# 
+#           * blackout_heatmap (Simulation_Name)
+#               Present the hours with blackouts and the blackouts started by month and hour of the day
+# 
+#           * hybrid_sys_stats (max_blackouts, Loadtype)
+#               Present sys sizes, costs, GHGs, diesel consumption of PV-battery-diesel system for the selected scenario        
+# 
+#           * hybrid_sys_metrics (max_blackouts, Loadtype), hybrid_sys_figures (max_blackouts, Loadtype)
+#               Save the metrics of PV-battery-diesel system, and render its figures separately
+# 
+#           * PVBatt_sys_performance (max_blackouts, Loadtype, accuracy)
+#               Optimise and simulate the performance of a PV-battery system for the selected scenario                      
+# 
+#           * PVBatt_sys_stats (max_blackouts, Loadtype)
+#               Present sys sizes, costs, GHGs of PV-battery system for the selected scenario        
+# 
+#           * PVBatt_sys_metrics (max_blackouts, Loadtype), PVBatt_sys_figures (max_blackouts, Loadtype)
+#               Save the metrics of PV-battery system, and render its figures separately
+# 
+#           * batch_stats (runs, max_workers, render)
+#               Save the metrics of a list of systems in parallel, queueing their figures for rendering
+# 
+#           * queue_figures (runs), render_figures (max_workers)
+#               Queue the figures of systems and render all queued figures later, optionally in parallel
+# 
+#           * open_warehouse (), ingest_results ()
+#               Open the results warehouse and add every saved appraisal, optimisation and metrics file to the results warehouse with the key of its run
+# 
+#           * query_results (metrics, filters)
+#               Obtain metrics of all runs in the results warehouse filtered by system type, load type, reliability or any metric
+# 
+#           * compare_keymetrics (max_blackouts, Loadtype)
+#               Compare LCUE, renewables fraction, GHG savings, diesel savings compared to base diesel case         
+# 
+#           * compare_costs (max_blackouts, Loadtype)
+#               Compare breakdown of costs of PVbatt/hybrid systems compared to base diesel case         
+#
+#           * compare_GHGs (max_blackouts, Loadtype)
+#               Compare breakdown of emissions of PVbatt/hybrid systems compared to base diesel case         
+#
+#
+# Sensitivity Analysis
+#
+#           * reliability_sweep (Loadtype, initial_max_blackout, final_max_blackout, stepsize, accuracy, max_workers, cached)
+#               Obtain LCUE, emissions intensity, costs, GHGs and renewables fraction of diesel/hybrid/PVbatt 
+#               systems for different reliability thresholds in a single results table, simulating
+#               up to max_workers systems at the same time in isolated workspaces and only the thresholds 
+#               not completed with the current inputs in previous sweeps
+#
+#           * LCUE_sensitivity (Loadtype, initial_max_blackout, final_max_blackout, stepsize, accuracy, max_workers, cached)
+#               Compare LCUE for diesel/hybrid/PVbatt systems for different reliability thresholds           
+# 
+#           * GHG_sensitivity (Loadtype, initial_max_blackout, final_max_blackout, stepsize, accuracy, max_workers, cached)
+#               Compare GHG emissions for diesel/hybrid/PVbatt systems for different reliability thresholds           
+#
+#           * global_sensitivity (Systype, Loadtype, max_blackouts, parameters, samples, method, reoptimise)
+#               Obtain Sobol or Morris sensitivity indices of LCUE, cumulative cost and emissions intensity to 
+#               financial and GHG inputs by re-appraising cached systems
+#
+#           * fuel_price_sweep (Simulation_Names, trajectories)
+#               Compare LCUE and ranking of simulated systems for a batch of yearly or monthly diesel fuel price trajectories
+#
+#           * load_growth_sweep (Simulation_Name, PV_sizes, storage_sizes, growth_rates, categories, max_blackouts)
+#               Obtain blackouts of PV-battery systems for yearly load growth of selected users, and the growth rate 
+#               at which each system breaches its reliability target
+#
+#           * battery_sensitivity (Simulation_Name, PV_sizes, storage_sizes, parameters, max_blackouts)
+#               Obtain blackouts and LCUE of a grid of PV-battery systems for every combination of battery inputs,
+#               and the minimum LCUE system meeting the reliability target with each combination
+#
+#           * renewables_sensitivity (Loadtype, max_blackouts, initial_renewablesfraction, final_renewablesfraction, stepsize, accuracy=10, refinements=2)
+#               Compare increase in LCUE for hybrid systems with higher renewables fraction compared to "min LCUE" hybrid system
+#
+#
+# Productive uses of electricity
+#
+#           * privateimpact_reliability(Loadtype, max_blackouts, Systype)
+#               Present reliability drop over time when additional private loads are included in the system         
+# 
+#           * privateimpact_design(Loadtype, max_blackouts):
+#               Present growing load over time from Scenario 1 to Scenario 2B
+#               Present compared wasted energy between initial sizing for Scenario 2B and optimized increase
+#
+#           * tariff_calculation(Systype, max_blackouts)
+#              Calculates the tariff for refugee businesses required to recover the additional investment 
+#              of Approach A and B scenarios in comparison with optimised PV-Battery System over 15 years
+#              Calculates the cost recovered if refugees pay a grid tariff value and the remaining additional costs
+#              Calculates the tariff for public users to cover Scenario 1 to 2B complete system (B), and
+#              Scenario 1 PV-Battery system plus the remaining additional costs that refugees can't cover
+#
+#           * tariff_structure (classes, peak_hours, peak_ratio), break_even_tariffs (df_targets, structures, df_load, discount_rate)
+#              Define flat, time-of-use and per-class tariff structures and obtain the tariffs recovering a set of costs
+#              for all structures at once
+#
+#           * tariff_table (Systype, Blackout_levels, structures, ROI)
+#              Obtain the break-even tariffs of Scenario 1, Approach A and B systems and of their additional costs 
+#              for all reliability levels and tariff structures
+#
+#           * uncertainty_analysis (Systype, max_blackouts, distributions, samples)
+#              Obtain percentile bands of LCUE, cumulative costs, additional costs of Approach A and B and tariffs
+#              by Monte Carlo sampling of financial inputs and load, re-appraising the saved systems
+#  
+# Scenario comparison
+# 
+#           * cumulative_capacity(max_blackouts):
+#               Present installed PV and storage capacity over lifetime for optimized systes for each scenario
+#
+#           * discount_vector (discount_rate, years, periods_per_year)
+#               Obtain the discount factor of each month or hour over any number of years
+#
+#           * discounted_cost_streams (df_stages, periods_per_year)
+#               Spread the discounted costs of the stages of many systems over their months or hours at once
+#
+#           * cumulative_cost_curves (max_blackouts, Scenarios, Types, periods_per_year)
+#               Obtain the monthly or hourly costs over lifetime of all scenarios and system types in one call
+#
+#           * cumulative_costs(max_blackouts):
+#               Present cumulative costs for optimized systems for each scenario over lifetime
+#               Present final LCUE and initial equipment costs for each system for each scenario
+#
+# =============================================================================   
+    
+
+# =============================================================================
+#                           Load profiles
+#    
+#   PRE-REQUISITE: Run get_loaddata(Loadtype) for selected scenario
+# =============================================================================   
+#
+
+def public_loadprofile (txt, Loadtype):
+    """
+    
+    Obtain and present the average daily load profile of each public facility and total public load profile in the camp
+    
+    Input: "txt" name of public load to be presented, write "total" to display total loads
+           Load profile for the selected scenario, between 'InstitutionalBase', 'InstitutionalAdv', 'Mix1', 'Mix2'
+    
+    Output: Display on console average hourly load
+            Save on /Plots/Plots Public XLoad/ directory a .png graph of the hourly average load     
+    
+    """    
+  
+    # Read the load.csv file for the corresponding device selected, or the total public   
+    filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Device load/" + txt + "_load.csv"  
+    df1 = pd.read_csv(filepath)
+    length = len(df1.index)
+
+    # Read the devices.csv file containing hourly load information of the selected facility     
+    filepathdevices = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Devices.csv"  
+    df_devices = pd.read_csv(filepathdevices)    
+    lengthdevices = len(df_devices.index)     
+    
+    # Create a new column with the hours from 0 to 23 repeatedly
+    hours=[0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,23]
+    repeated_hours = hours * int(length/len(hours))    
+    df1['Hours'] = repeated_hours
+    
+    # For every load scenario, the load from the existent public facilities is calculated and displayed
+    
+    # For the existing load in Nyabiheke (Scenario 1)
+    if Loadtype == 'Mix1':
+        
+       # Calculate the average load for each hour (0 to 23)
+       hourly_mean = {'1 UNHCR Office':[],
+                   '2 Other Offices':[],
+                   '5 Water Pump 1':[],
+                   '4 Water Pump 2':[],
+                   '3 Bank':[],
+                   '6 Health Centre':[]}
+        
+       for i in range(0, 24):
+           
+           # To calculate the total, first calculate the average load from each facility for each hour
+           if txt == 'total':
+            
+               txt='UNHCR Office'
+               filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Device load/UNHCR_load.csv"  
+               df1 = pd.read_csv(filepath)
+               df1['Hours'] = repeated_hours
+               df_i = df1.loc[df1['Hours'] == i].mean(axis=0).iloc[1]
+
+               hourly_mean['1 UNHCR Office'].append(df_i)
+
+            
+               txt='Other Offices'
+               filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Device load/NGOOfficeBlock_load.csv"  
+               df1 = pd.read_csv(filepath)
+               df1['Hours'] = repeated_hours
+               df_i = df1.loc[df1['Hours'] == i].mean(axis=0).iloc[1]            
+               hourly_mean['2 Other Offices'].append(df_i)
+            
+            
+               txt='Water Pump 1'
+               filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Device load/WaterPump1_load.csv"  
+               df1 = pd.read_csv(filepath)
+               df1['Hours'] = repeated_hours
+               df_i = df1.loc[df1['Hours'] == i].mean(axis=0).iloc[1]            
+               hourly_mean['5 Water Pump 1'].append(df_i)
+            
+               txt='Water Pump 2'
+               filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Device load/WaterPump2_load.csv"  
+               df1 = pd.read_csv(filepath)
+               df1['Hours'] = repeated_hours
+               df_i = df1.loc[df1['Hours'] == i].mean(axis=0).iloc[1]            
+               hourly_mean['4 Water Pump 2'].append(df_i)
+            
+               txt='Bank'
+               filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Device load/Bank_load.csv"  
+               df1 = pd.read_csv(filepath)
+               df1['Hours'] = repeated_hours
+               df_i = df1.loc[df1['Hours'] == i].mean(axis=0).iloc[1]            
+               hourly_mean['3 Bank'].append(df_i)            
+            
+               txt='Health Centre'
+               filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Device load/HealthCentre_load.csv"  
+               df1 = pd.read_csv(filepath)
+               df1['Hours'] = repeated_hours
+               df_i = df1.loc[df1['Hours'] == i].mean(axis=0).iloc[1]
+               hourly_mean['6 Health Centre'].append(df_i)      
+            
+               txt='total'
+    
+               # When all hours calculated, plot the resulting graph with the stacked public loads
+               if i == 23:
     
                  # Average hourly load profile graph
                  x = hours
@@ -2492,6 +4202,115 @@ def total_loadprofile (Loadtype):
     
     
     
+def load_analytics (Loadtype, points):
+    """
+    Obtain the load duration curve, yearly peaks, load factors and coincident peaks of each category of users and of 
+    the total load of the camp. Results are cached with the load profile and the hash of its load data, and only 
+    computed again when the load changes
+    
+    PRE-REQUISITE: Run get_loaddata(Loadtype) for selected scenario, or it is run if the total load of the load 
+                   profile is not available (see get_load_filepath)
+    
+    Input: Load profile for the selected scenario, between 'InstitutionalBase', 'InstitutionalAdv', 'Mix1', 'Mix2'
+           Number of points of the load duration curves, i.e.: 200
+    
+    Output: DataFrame of the load duration curve (kW) of each category for each fraction of the time exceeded
+            DataFrame with the peak (kW), load factor and load at the time of the total peak (kW) of each category and 
+            the coincidence factor, for each year
+            Save them as LoadDuration_Load*.csv and LoadPeaks_Load*.csv and a .png graph of the load duration curves
+            in Device load/Load analytics/ directory
+    
+    """
+    # Total load of the selected load profile
+    filepath = get_load_filepath(Loadtype)
+    
+    with open(filepath, 'rb') as f:
+        load_data = f.read()
+    
+    load_hash = hashlib.md5(load_data).hexdigest()
+    n_hours = len(load_data.splitlines()) - 1
+    
+    # Ranks of the hours at the points of the load duration curves
+    ranks = np.unique(np.linspace(0, n_hours - 1, points).round().astype(int))
+    
+    script_dir = os.path.dirname(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Load/Device load/Load analytics/")
+    filepath_duration = os.path.join(script_dir, 'LoadDuration_Load{}.csv'.format(Loadtype))
+    filepath_peaks = os.path.join(script_dir, 'LoadPeaks_Load{}.csv'.format(Loadtype))
+    
+    # Reuse the results obtained for the same load profile and load data with the same points
+    if os.path.exists(filepath_duration) and os.path.exists(filepath_peaks):
+        
+        df_duration = pd.read_csv(filepath_duration, index_col=0)
+        df_peaks = pd.read_csv(filepath_peaks, index_col=0)
+        
+        if ('Loadtype' in df_duration.columns and str(df_duration['Loadtype'].iat[0]) == Loadtype 
+            and df_duration['Load hash'].iat[0] == load_hash and len(df_duration) == len(ranks)):
+            print('\n Load analytics for Load{} found, load data unchanged.'.format(Loadtype))
+            return df_duration.drop(columns=['Loadtype', 'Load hash']), df_peaks.drop(columns=['Loadtype', 'Load hash'])
+    
+    # Hourly load of each category and total load (kW)
+    categories = ['Domestic', 'Commercial', 'Public']
+    df_load = pd.read_csv(filepath)[categories] / 1000.0
+    df_load['Total'] = df_load.sum(axis=1)
+    
+    values = df_load.values
+    
+    # Load duration curves: loads exceeded during each fraction of the time, partitioning the hours of each 
+    # category only around the points of the curve
+    positions = n_hours - 1 - ranks
+    curves = np.partition(values, positions, axis=0)[positions]
+    
+    df_duration = pd.DataFrame(curves, index=pd.Index(100.0 * ranks / (n_hours - 1), name='Time exceeded (%)'), columns=df_load.columns)
+    
+    # Yearly peaks, load factors and loads at the time of the total peak of each year
+    years = n_hours // 8760
+    yearly = values[:years*8760].reshape(years, 8760, values.shape[1])
+    
+    peaks = yearly.max(axis=1)
+    load_factors = yearly.mean(axis=1) / peaks
+    coincident = yearly[np.arange(years), yearly[:, :, -1].argmax(axis=1)]
+    
+    df_peaks = pd.DataFrame(index=pd.Index(range(years), name='Year'))
+    
+    for n, category in enumerate(df_load.columns):
+        df_peaks['Peak {} (kW)'.format(category)] = peaks[:, n]
+        df_peaks['Load factor {}'.format(category)] = load_factors[:, n]
+        
+        if category != 'Total':
+            df_peaks['Coincident {} (kW)'.format(category)] = coincident[:, n]
+    
+    df_peaks['Coincidence factor'] = peaks[:, -1] / peaks[:, :-1].sum(axis=1)
+    
+    # Plot the load duration curves
+    fig, ax = plt.subplots()
+    
+    for category, colour in zip(df_load.columns, ['lightseagreen', 'gold', 'palevioletred', 'black']):
+        ax.plot(df_duration.index, df_duration[category], color=colour, label=category)
+    
+    ax.set(xlabel='Time exceeded (%)', ylabel='Load (kW)')
+    ax.grid()
+    ax.legend(loc='upper right')
+    plt.xlim((0,100))
+    
+    if not os.path.isdir(script_dir):
+          os.makedirs(script_dir)
+    
+    plot_name = "LoadDuration_Load{}.png".format(Loadtype)
+    fig.savefig(os.path.join(script_dir, plot_name), dpi=300, bbox_inches='tight')
+    plt.show()
+    
+    print('Figure saved as', plot_name)
+    
+    # Save the results with the load profile and the hash of its load data
+    df_duration.assign(**{'Loadtype':Loadtype, 'Load hash':load_hash}).to_csv(filepath_duration)
+    df_peaks.assign(**{'Loadtype':Loadtype, 'Load hash':load_hash}).to_csv(filepath_peaks)
+    
+    print('\n Load analytics saved as LoadDuration_Load{}.csv and LoadPeaks_Load{}.csv'.format(Loadtype, Loadtype))
+    
+    return df_duration, df_peaks
+    
+
+
 # =============================================================================
 #                           Systems comparison
 # =============================================================================   
@@ -2546,36 +4365,33 @@ def diesel_sys_performance (max_blackouts, Loadtype):
         print('\n Simulation already exists, proceed with diesel_sys_stats(max_blackouts, Loadtype) to display results.')
   
 
-def diesel_sys_stats (max_blackouts, Loadtype):
+def diesel_sys_metrics (max_blackouts, Loadtype):
     """
-    Present costs, GHGs, diesel consumption of diesel-powered system for the selected scenario 
+    Obtain and save the key, financial and environmental metrics of diesel-powered system for the selected scenario,
+    without rendering figures 
     
-    Input: Simulation file resulting of diesel_sys_performance(max_blackouts,Loadtype)
-           Appraisal file resulting of diesel_sys_performance(max_blackouts,Loadtype)
+    Input: Appraisal file resulting of diesel_sys_performance(max_blackouts,Loadtype)
         
-    Output: Display LCUE, emissions intensity, Diesel capacity, Diesel fuel usage
-            Display breakdown of costs:Total System Cost, Total fuel cost, total O&M cost
-            Display breakdown of emissions: ...
-            Save on /Plots/Plots Diesel/ directory  the .png graphs  
+    Output: Key_Metrics.csv, Financial_Metrics.csv and Environmental_Metrics.csv saved in the directory of the simulation
+            DataFrame with the key metrics
                 
     """ 
     # Performance displayed for diesel system
     Systype = 'Diesel'   
-    Reliability= int((1.0 - max_blackouts)*100.0)
+    Reliability= reliability_level(max_blackouts)
 
     # Specify that there is no PV or storage available    
     PV_kWp=0   
     storage_kWh=0
     
-    # Read csv file with diesel system simulation data
-    df_dieselsim = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV{}_Storage{}_{}_Re{}_Load{}.csv'.format(PV_kWp, storage_kWh, Systype, Reliability, Loadtype))
+    # Read csv file with diesel system appraisal data
     df_dieselapp = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV{}_Storage{}_{}_Re{}_Load{}_Appraisal.csv'.format(PV_kWp, storage_kWh, Systype, Reliability, Loadtype))
     
     # Display LCUE, emissions intensity, Renewables fraction, Total system cost, Cumulative GHGs  
     Appraisal_indexes=[17,14,15,8,10]        
     df_keymetrics=df_dieselapp.iloc[:, Appraisal_indexes]
     
-    # Create a directory with the name of the simulation to save the figures 
+    # Create a directory with the name of the simulation to save the metrics and figures 
     script_dir = os.path.dirname(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/")
     plot_dir = os.path.join(script_dir, 'Sim_PV{}_Storage{}_{}_Re{}_Load{}/'.format(PV_kWp, storage_kWh, Systype, Reliability, Loadtype))
     
@@ -2583,9 +4399,9 @@ def diesel_sys_stats (max_blackouts, Loadtype):
         os.makedirs(plot_dir)
     
     # Save key metrics obtained in a .csv file)  
-    df_keymetrics.to_csv(rself.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV{}_Storage{}_{}_Re{}_Load{}/Key_Metrics.csv'.format(PV_kWp, storage_kWh, Systype, Reliability, Loadtype), index=None)
+    df_keymetrics.to_csv(plot_dir + 'Key_Metrics.csv', index=None)
   
-    print('\nKey system metrics saved as Key_Metrics.csv \n'.format(PV_kWp, storage_kWh, Systype, Reliability, Loadtype))
+    print('\nKey system metrics saved as Key_Metrics.csv \n')
     print(df_keymetrics)
     
     # Display breakdown of costs:Total System Cost, Total equipment cost, total O&M cost, total fuel cost        
@@ -2593,8 +4409,40 @@ def diesel_sys_stats (max_blackouts, Loadtype):
     df_financialmetrics=df_dieselapp.iloc[:, Financial_indexes]
     
     # Save financial metrics obtained in a .csv file
-    df_financialmetrics.to_csv(rself.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV{}_Storage{}_{}_Re{}_Load{}/Financial_Metrics.csv'.format(PV_kWp, storage_kWh, Systype, Reliability, Loadtype), index=None)
+    df_financialmetrics.to_csv(plot_dir + 'Financial_Metrics.csv', index=None)
     print('Financial metrics saved as Financial_Metrics.csv \n')
+         
+    # Display breakdown of emissions: Total emissions, Equipment emissions, O&M emissions, fuel emission       
+    Environmental_indexes=[37, 39, 41, 42]        
+    df_environmentalmetrics=df_dieselapp.iloc[:, Environmental_indexes]
+    
+    df_environmentalmetrics.to_csv(plot_dir + 'Environmental_Metrics.csv', index=None)
+    print('\nEnvironmental metrics saved as Environmental_Metrics.csv \n')
+    
+    return df_keymetrics
+
+
+def diesel_sys_figures (max_blackouts, Loadtype):
+    """
+    Render the cost and emissions breakdown figures of diesel-powered system for the selected scenario 
+    
+    PRE-REQUISITE: Run diesel_sys_metrics(max_blackouts, Loadtype)
+    
+    Input: Financial_Metrics.csv and Environmental_Metrics.csv of the simulation
+        
+    Output: Save on the directory of the simulation the .png graphs  
+                
+    """ 
+    Systype = 'Diesel'   
+    Reliability= reliability_level(max_blackouts)
+    PV_kWp=0   
+    storage_kWh=0
+    
+    # Directory of the simulation with its metrics
+    plot_dir = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV{}_Storage{}_{}_Re{}_Load{}/'.format(PV_kWp, storage_kWh, Systype, Reliability, Loadtype)
+    
+    df_financialmetrics = pd.read_csv(plot_dir + 'Financial_Metrics.csv')
+    df_environmentalmetrics = pd.read_csv(plot_dir + 'Environmental_Metrics.csv')
     
     # Cost Breakdown Donught     
     labels = ['New equipment cost', 'O&M cost (excluding fuel)', 'Fuel cost']
@@ -2617,102 +4465,352 @@ def diesel_sys_stats (max_blackouts, Loadtype):
     plt.show()
 
     print('\nFigure saved as ', plot_name)  
-         
-   # Display breakdown of emissions: Total emissions, Equipment emissions, O&M emissions, fuel emission       
-    Environmental_indexes=[37, 39, 41, 42]        
-    df_environmentalmetrics=df_dieselapp.iloc[:, Environmental_indexes]
     
-    df_environmentalmetrics.to_csv(rself.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV{}_Storage{}_{}_Re{}_Load{}/Environmental_Metrics.csv'.format(PV_kWp, storage_kWh, Systype, Reliability, Loadtype), index=None)
-    print('\nEnvironmental metrics saved as Environmental_Metrics.csv \n')
+    # GHGs Emissions Breakdown Donught  
+    labels = ['New equipment emissions', 'O&M emissions (excluding fuel)', 'Fuel emissions']
+    sizes = [df_environmentalmetrics.iat[0,1], df_environmentalmetrics.iat[0,2], df_environmentalmetrics.iat[0,3]]
+    colors = ['yellowgreen', 'lightsteelblue', 'lightcoral']
+    explode = (0.1,0.1,0.1)
+    patches, texts, autotexts = plt.pie(sizes, colors=colors, startangle=0, counterclock=True, autopct=lambda p: '{:.1f}%  '.format(p), pctdistance=1.2, explode=explode)
+    centre_circle=plt.Circle( (-0.06,-0.01), 0.6, color='white')
+    fig = plt.gcf()
+    fig.gca().add_artist(centre_circle)    
+    
+    plt.legend(patches, labels, title=r'$\bf{Emission \ categories}$',loc="lower left", bbox_to_anchor=(0.65, 0, 0.5, 1))
+    plt.axis('equal')
+    plt.tight_layout()
+    plt.title(r'$\bf{GHGs \ emissions \ breakdown \ for \ diesel \ system}$' + '\n \n')
+        
+    # Name the figure and save it in the corresponding directory
+    plot_name = "GHGsBreakdown_Sim_PV{}_Storage{}_{}_Re{}_Load{}.png".format(PV_kWp, storage_kWh, Systype, Reliability, Loadtype)
+    
+    plt.savefig(plot_dir + plot_name, dpi=300)
+    plt.show()
+        
+    print('\nFigure saved as ', plot_name)     
+
+
+def diesel_sys_stats (max_blackouts, Loadtype):
+    """
+    Present costs, GHGs, diesel consumption of diesel-powered system for the selected scenario 
+    
+    Input: Simulation file resulting of diesel_sys_performance(max_blackouts,Loadtype)
+           Appraisal file resulting of diesel_sys_performance(max_blackouts,Loadtype)
+        
+    Output: Display LCUE, emissions intensity, Diesel capacity, Diesel fuel usage
+            Display breakdown of costs:Total System Cost, Total fuel cost, total O&M cost
+            Display breakdown of emissions: ...
+            Save on /Plots/Plots Diesel/ directory  the .png graphs  
+                
+    """ 
+    diesel_sys_metrics (max_blackouts, Loadtype)
+    diesel_sys_figures (max_blackouts, Loadtype)
+
+    
+def hybrid_sys_performance (max_blackouts, Loadtype, accuracy):
+    """
+    Simulate performance of diesel-PV-battery system for the selected scenario 
+    
+    Input: max_blackouts  Maximum acceptible blackouts (0.0-1.0)
+           Load profile for the selected scenario, between 'InstitutionalBase', 'InstitutionalAdv', 'Mix1', 'Mix2'
+        
+    Output: File of optimisation to be analysed with hybrid_sys_stats()        
+    
+    """  
+    # Read the load .csv file containing hourly load information of the selected facility  
+    filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Scenario/Scenario inputs.csv"
+    df_scenario = pd.read_csv(filepath, header=None)
+    
+    # Define reliability from blackout threshold
+    Reliability= reliability_level(max_blackouts)
+    
+    # Performance analysed for hybrid system
+    Systype = 'Hybrid'
+    
+    # Check if simulation for blackout level exists already, if not, performs simulation
+    check = os.path.exists(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}.csv".format(Systype, Reliability, Loadtype)) 
+    
+    if check == False :
+        
+        # Read the load .csv file containing hourly load information of the selected facility     
+        print('\n Simulation doesn\'t exist, starting with optimisation...')
+    
+        # Set maximum blackout threshold (0.0-1.0)
+        if df_scenario.iat[3, 1] != max_blackouts :
+            df_scenario.iat[3, 1] = max_blackouts
+    
+        # Substitute new values in Scenario  Inputs.csv file for simulation
+        df_scenario.to_csv(filepath, index=None, header =None)
+        
+        # Simulate diesel system and saves file as i.e.: Sim_PV0_Storage0_Diesel_Re90_LoadInstitutionalBase.csv      
+        Optimisation = optimise_system (Systype, Loadtype, max_blackouts, accuracy)
+        
+        print('\n Optimisation finished, proceed with hybrid_sys_stats(max_blackouts, Loadtype) to display results ...')
+        
+    else:
+        
+        print('\n Optimisation already exists, proceed with diesel_sys_stats(max_blackouts, Loadtype) to display results...')
+        
+    
+    
+
+def rollup_cube (df_hourly):
+    """
+    Obtain the rollup cube of an hourly simulation: the sum of every variable and the number of hours and of hours with 
+    blackouts for each year, month and hour of the day, from which diurnal, monthly, yearly and lifetime figures are obtained
+    
+    Input: DataFrame of hourly values starting at hour 0 of the 1st of January, i.e.: simulation outputs
+    
+    Output: DataFrame with one row per year, month and hour of the day, with the number of hours and of hours with
+            blackouts and the sum of each numeric column
+    
+    """
+    df_numeric = df_hourly.select_dtypes(include=[np.number])
+    hours = np.arange(len(df_numeric))
+    
+    # Cell of the cube of each hour
+    months = month_codes(hours)
+    cells = months * 24 + hours % 24
+    n_cells = (months[-1] + 1) * 24 if len(hours) > 0 else 0
+    
+    df_rollup = pd.DataFrame({'Year':np.arange(n_cells) // (12*24), 'Month':np.arange(n_cells) // 24 % 12, 'Hour':np.arange(n_cells) % 24})
+    df_rollup['Hours'] = np.bincount(cells, minlength=n_cells)
+    
+    if 'Blackouts' in df_numeric.columns:
+        df_rollup['Blackout hours'] = np.bincount(cells, weights=(df_numeric['Blackouts'].values > 0).astype(float), minlength=n_cells)
+    
+    for column in df_numeric.columns:
+        df_rollup[column] = np.bincount(cells, weights=df_numeric[column].values.astype(float), minlength=n_cells)
+    
+    return df_rollup
+
+
+def save_rollup (df_hourly, filepath):
+    """
+    Save the rollup cube of an hourly simulation alongside it
+    
+    Input: DataFrame of hourly simulation outputs
+           Filepath of the saved simulation (.csv)
+    
+    Output: Rollup cube saved as *_Rollup.csv next to the simulation 
+            DataFrame with the rollup cube
+    
+    """
+    df_rollup = rollup_cube(df_hourly)
+    df_rollup.to_csv(filepath[:-len('.csv')] + '_Rollup.csv', index=None)
+    
+    return df_rollup
+
+
+def open_rollup (filepath):
+    """
+    Open the rollup cube saved alongside a simulation, obtaining it from the hourly simulation only when it is missing 
+    or older than the simulation
+    
+    Input: Filepath of the saved simulation (.csv)
+    
+    Output: DataFrame with the rollup cube of the simulation
+    
+    """
+    filepath_rollup = filepath[:-len('.csv')] + '_Rollup.csv'
+    
+    if os.path.exists(filepath_rollup) and (not os.path.exists(filepath) or os.path.getmtime(filepath_rollup) >= os.path.getmtime(filepath)):
+        return pd.read_csv(filepath_rollup)
+    
+    return save_rollup(pd.read_csv(filepath), filepath)
+
+
+def rollup_query (df_rollup, by, columns, statistic):
+    """
+    Obtain the average or total of variables of a simulation from its rollup cube
+    
+    Input: DataFrame with the rollup cube, as obtained with rollup_cube(df_hourly) or open_rollup(filepath)
+           List of dimensions of the results, between 'Year', 'Season', 'Month' and 'Hour': i.e. ['Hour'] for the average 
+               daily profile, ['Season','Hour'] for the daily profile of each season, ['Year','Month'] for monthly figures, 
+               [] for lifetime figures. Seasons are numbered 0 for Dec-Feb, 1 for Mar-May, 2 for Jun-Aug and 3 for Sep-Nov
+           List of columns, or None for all variables of the simulation
+           'mean' for hourly averages or 'sum' for totals
+    
+    Output: DataFrame with the average or total of each variable for each combination of the dimensions selected
+    
+    """
+    if columns is None:
+        columns = [column for column in df_rollup.columns if column not in ['Year', 'Month', 'Hour', 'Hours', 'Blackout hours']]
+    
+    columns = list(columns)
+    
+    if not set(by) <= set(['Year', 'Season', 'Month', 'Hour']):
+        raise ValueError("Dimensions {} not supported, between 'Year', 'Season', 'Month' and 'Hour'".format(by))
+    
+    # Season of each month of the cube
+    if 'Season' in by:
+        df_rollup = df_rollup.assign(Season=(df_rollup['Month'] + 1) // 3 % 4)
+    
+    if len(by) > 0:
+        df_totals = df_rollup.groupby(by)[['Hours'] + columns].sum()
+    else:
+        df_totals = df_rollup[['Hours'] + columns].sum().to_frame().T
+    
+    if statistic == 'mean':
+        return df_totals[columns].div(df_totals['Hours'], axis=0)
+    
+    return df_totals[columns]
+
+
+def blackout_events (blackouts):
+    """
+    Obtain the blackout events of one or many hourly blackout series at once, by run-length encoding
+    
+    Input: Array of hourly blackouts (1 for hours with blackouts), one row per series
+    
+    Output: Arrays with the series, first hour and duration (hours) of each blackout event
+    
+    """
+    blackouts = np.atleast_2d(np.asarray(blackouts) > 0)
+    
+    # Blackouts start where the series changes from 0 to 1 and end where it changes from 1 to 0
+    changes = np.diff(np.pad(blackouts.astype(np.int8), ((0, 0), (1, 1))), axis=1)
+    series, starts = np.nonzero(changes == 1)
+    ends = np.nonzero(changes == -1)[1]
+    
+    return series, starts, ends - starts
+
+
+def blackout_analytics (Simulation_Names):
+    """
+    Obtain the number, duration and timing of the blackouts of simulated systems, with reliability indices of the 
+    SAIFI/SAIDI type for the supply of the mini-grid: blackouts per year (SAIFI), hours of blackout per year (SAIDI),
+    average duration of blackouts (CAIDI) and fraction of hours supplied (ASAI)
+    
+    PRE-REQUISITE: Simulate the systems with simulate_system(PV_kWp, storage_kWh, Systype, Loadtype)
+    
+    Input: List of names of saved simulations, i.e.: ['Sim_PV200_Storage500_PVBatt_Re95_LoadMix1']
+        
+    Output: DataFrame with one row per simulation with its reliability indices, longest blackout, unmet energy and 
+            number of blackouts of each duration
+            Save it as Blackout_events.csv in Analysis/Reliability Analysis directory
+    
+    """
+    sim_dir = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/'
+    
+    # Hourly blackouts and unmet energy of all simulations, padded to the longest one
+    traces = [pd.read_csv(sim_dir + Name + '.csv', usecols=lambda column: column in ['Blackouts', 'Unmet energy (kWh)']) for Name in Simulation_Names]
+    lengths = np.array([len(df_trace) for df_trace in traces])
     
-    # GHGs Emissions Breakdown Donught  
-    labels = ['New equipment emissions', 'O&M emissions (excluding fuel)', 'Fuel emissions']
-    sizes = [df_environmentalmetrics.iat[0,1], df_environmentalmetrics.iat[0,2], df_environmentalmetrics.iat[0,3]]
-    colors = ['yellowgreen', 'lightsteelblue', 'lightcoral']
-    explode = (0.1,0.1,0.1)
-    patches, texts, autotexts = plt.pie(sizes, colors=colors, startangle=0, counterclock=True, autopct=lambda p: '{:.1f}%  '.format(p), pctdistance=1.2, explode=explode)
-    centre_circle=plt.Circle( (-0.06,-0.01), 0.6, color='white')
-    fig = plt.gcf()
-    fig.gca().add_artist(centre_circle)    
+    blackouts = np.zeros((len(traces), lengths.max()), dtype=np.int8)
+    unmet = np.zeros((len(traces), lengths.max()))
     
-    plt.legend(patches, labels, title=r'$\bf{Emission \ categories}$',loc="lower left", bbox_to_anchor=(0.65, 0, 0.5, 1))
-    plt.axis('equal')
-    plt.tight_layout()
-    plt.title(r'$\bf{GHGs \ emissions \ breakdown \ for \ diesel \ system}$' + '\n \n')
-        
-    # Name the figure and save it in the corresponding directory
-    plot_name = "GHGsBreakdown_Sim_PV{}_Storage{}_{}_Re{}_Load{}.png".format(PV_kWp, storage_kWh, Systype, Reliability, Loadtype)
+    for n, df_trace in enumerate(traces):
+        blackouts[n, :lengths[n]] = df_trace['Blackouts'].values > 0
+        if 'Unmet energy (kWh)' in df_trace.columns:
+            unmet[n, :lengths[n]] = df_trace['Unmet energy (kWh)'].values
     
-    plt.savefig(plot_dir + plot_name, dpi=300)
-    plt.show()
-        
-    print('\nFigure saved as ', plot_name)     
-
+    series, starts, durations = blackout_events(blackouts)
+    years = lengths / 8760.0
     
-def hybrid_sys_performance (max_blackouts, Loadtype, accuracy):
+    # Number and hours of blackouts of each simulation
+    events = np.bincount(series, minlength=len(traces))
+    hours = np.bincount(series, weights=durations, minlength=len(traces))
+    longest = np.zeros(len(traces))
+    np.maximum.at(longest, series, durations)
+    
+    df_analytics = pd.DataFrame(index=pd.Index(Simulation_Names, name='Simulation'))
+    df_analytics['Blackouts'] = events
+    df_analytics['SAIFI (blackouts/year)'] = events / years
+    df_analytics['SAIDI (hours/year)'] = hours / years
+    df_analytics['CAIDI (hours/blackout)'] = np.where(events > 0, hours / np.maximum(events, 1), 0.0)
+    df_analytics['ASAI'] = 1.0 - hours / lengths
+    df_analytics['Longest blackout (hours)'] = longest
+    df_analytics['Unmet energy (kWh/year)'] = unmet.sum(axis=1) / years
+    
+    # Number of blackouts of each duration
+    bins = [1, 2, 3, 4, 7, 13, 25]
+    labels = ['1 h', '2 h', '3 h', '4-6 h', '7-12 h', '13-24 h', '>24 h']
+    classes = np.searchsorted(bins, durations, side='right') - 1
+    counts = np.bincount(series * len(bins) + classes, minlength=len(traces) * len(bins)).reshape(len(traces), len(bins))
+    
+    for n, label in enumerate(labels):
+        df_analytics['Blackouts {}'.format(label)] = counts[:, n]
+    
+    # Create a directory for the results and save them
+    script_dir = os.path.dirname(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Analysis/Reliability Analysis/")
+    
+    if not os.path.isdir(script_dir):
+          os.makedirs(script_dir)
+    
+    df_analytics.to_csv(os.path.join(script_dir, 'Blackout_events.csv'))
+    print('\n Blackout events of {} simulations saved as Blackout_events.csv'.format(len(traces)))
+    
+    return df_analytics
+
+
+def blackout_heatmap (Simulation_Name):
     """
-    Simulate performance of diesel-PV-battery system for the selected scenario 
+    Present when the blackouts of a simulated system happen: fraction of hours with blackouts and number of blackouts
+    starting at each hour of the day of each month
     
-    Input: max_blackouts  Maximum acceptible blackouts (0.0-1.0)
-           Load profile for the selected scenario, between 'InstitutionalBase', 'InstitutionalAdv', 'Mix1', 'Mix2'
+    PRE-REQUISITE: Simulate the system with simulate_system(PV_kWp, storage_kWh, Systype, Loadtype)
+    
+    Input: Name of a saved simulation, i.e.: 'Sim_PV200_Storage500_PVBatt_Re95_LoadMix1'
         
-    Output: File of optimisation to be analysed with hybrid_sys_stats()        
+    Output: DataFrames (month x hour of the day) with the fraction of hours with blackouts and the blackouts started
+            Save .png heatmaps in Analysis/Reliability Analysis directory
     
-    """  
-    # Read the load .csv file containing hourly load information of the selected facility  
-    filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Scenario/Scenario inputs.csv"
-    df_scenario = pd.read_csv(filepath, header=None)
+    """
+    filepath = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/' + Simulation_Name + '.csv'
     
-    # Define reliability from blackout threshold
-    Reliability= int((1.0 - max_blackouts)*100.0)
+    # Fraction of hours with blackouts from the rollup cube of the simulation
+    df_rollup = open_rollup(filepath).groupby(['Month', 'Hour'])[['Hours', 'Blackout hours']].sum()
+    df_fraction = (df_rollup['Blackout hours'] / df_rollup['Hours']).unstack('Hour')
     
-    # Performance analysed for hybrid system
-    Systype = 'Hybrid'
+    # Blackouts started at each month and hour of the day
+    blackouts = pd.read_csv(filepath, usecols=['Blackouts'])['Blackouts'].values
+    series, starts, durations = blackout_events(blackouts)
     
-    # Check if simulation for blackout level exists already, if not, performs simulation
-    check = os.path.exists(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}.csv".format(Systype, Reliability, Loadtype)) 
+    df_starts = pd.DataFrame(np.bincount(month_codes(starts) % 12 * 24 + starts % 24, minlength=12*24).reshape(12, 24), index=df_fraction.index, columns=df_fraction.columns)
     
-    if check == False :
-        
-        # Read the load .csv file containing hourly load information of the selected facility     
-        print('\n Simulation doesn\'t exist, starting with optimisation...')
+    months = ['Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec']
     
-        # Set maximum blackout threshold (0.0-1.0)
-        if df_scenario.iat[3, 1] != max_blackouts :
-            df_scenario.iat[3, 1] = max_blackouts
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 4))
     
-        # Substitute new values in Scenario  Inputs.csv file for simulation
-        df_scenario.to_csv(filepath, index=None, header =None)
-        
-        # Simulate diesel system and saves file as i.e.: Sim_PV0_Storage0_Diesel_Re90_LoadInstitutionalBase.csv      
-        Optimisation = optimise_system (Systype, Loadtype, max_blackouts, accuracy)
-        
-        print('\n Optimisation finished, proceed with hybrid_sys_stats(max_blackouts, Loadtype) to display results ...')
-        
-    else:
-        
-        print('\n Optimisation already exists, proceed with diesel_sys_stats(max_blackouts, Loadtype) to display results...')
-        
+    sns.heatmap(df_fraction * 100.0, cmap='Reds', ax=ax1, yticklabels=months, cbar_kws={'label':'Hours with blackouts (%)'})
+    ax1.set(xlabel='Hour of day', ylabel='')
     
+    sns.heatmap(df_starts, cmap='Blues', ax=ax2, yticklabels=months, cbar_kws={'label':'Blackouts started'})
+    ax2.set(xlabel='Hour of day', ylabel='')
     
-def hybrid_sys_stats (max_blackouts, Loadtype):
+    plt.tight_layout()
+    
+    # Create a directory for the figures and save the figure
+    script_dir = os.path.dirname(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Analysis/Reliability Analysis/")
+    
+    if not os.path.isdir(script_dir):
+          os.makedirs(script_dir)
+    
+    plot_name = "BlackoutHeatmap_{}.png".format(Simulation_Name)
+    fig.savefig(os.path.join(script_dir, plot_name), dpi=300, bbox_inches='tight')
+    plt.show()
+    
+    print('Figure saved as', plot_name)
+    
+    return df_fraction, df_starts
+
+
+def hybrid_sys_metrics (max_blackouts, Loadtype):
     """
-    Present costs, GHGs, renewable fraction, diesel consumption of diesel-PV-battery system for the selected scenario 
+    Obtain and save the key, financial, equipment cost and environmental metrics of diesel-PV-battery system for the 
+    selected scenario, without rendering figures 
     
     Input: Optimisation file resulting of hybrid_sys_performance(max_blackouts, Loadtype)
         
-    Output: Display LCUE, emissions intensity, Diesel capacity, Diesel fuel usage
-             Save them in Key_Metrics.csv file 
-            Display breakdown of costs:Total System Cost, Total fuel cost, total O&M cost
-             Save them in Financial_Metrics.csv file 
-            Display breakdown of emissions: Total, System, Fuel, O&M
-             Save them in Environmental_Metrics.csv file 
-            Save .png figures on /Saved Optimisations/Optimisation Name*/ directory    
+    Output: Key_Metrics.csv, Financial_Metrics.csv, Equipment_costs.csv and Environmental_Metrics.csv saved in the 
+            directory of the optimisation
+            DataFrame with the key metrics
     
     """  
     # Performance displayed for hybrid system
     Systype = 'Hybrid'   
-    Reliability= int((1.0 - max_blackouts)*100.0)
+    Reliability= reliability_level(max_blackouts)
     
     # Read csv file with diesel system simulation data
     df_hybridopt = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}.csv'.format(Systype, Reliability, Loadtype))
@@ -2723,7 +4821,7 @@ def hybrid_sys_stats (max_blackouts, Loadtype):
     df_keymetrics.iat[0]=df_hybridopt["Renewables fraction"].mean()
     df_keymetrics.iat[2]=df_hybridopt["Emissions intensity (gCO2/kWh)"].mean()
        
-    # Create a directory with the name of the simulation to save the figures 
+    # Create a directory with the name of the simulation to save the metrics and figures 
     script_dir = os.path.dirname(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/")
     plot_dir = os.path.join(script_dir, 'Opt_{}_Re{}_Load{}/'.format(Systype, Reliability, Loadtype))
     
@@ -2732,7 +4830,7 @@ def hybrid_sys_stats (max_blackouts, Loadtype):
     
     df_keymetrics=pd.DataFrame(df_keymetrics)    
     df_keymetrics=df_keymetrics.transpose()
-    df_keymetrics.to_csv(rself.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}/Key_Metrics.csv'.format(Systype, Reliability, Loadtype), index=None, header=True)
+    df_keymetrics.to_csv(plot_dir + 'Key_Metrics.csv', index=None, header=True)
   
     print('\nKey system metrics saved as Key_Metrics.csv \n')
     print(df_keymetrics)
@@ -2743,41 +4841,57 @@ def hybrid_sys_stats (max_blackouts, Loadtype):
     df_financialmetrics= pd.DataFrame(df_financialmetricsperyear.sum())
     df_financialmetrics=df_financialmetrics.transpose()
     
-    #  Calculate new PV, storage and diesel installations
-    PV_array_size = pd.Series([df_hybridopt.iloc[0,3], df_hybridopt.iloc[1,3]-df_hybridopt.iloc[0,5],df_hybridopt.iloc[2,3]-df_hybridopt.iloc[1,5]])
-    storage_size = pd.Series([df_hybridopt.iloc[0,4], df_hybridopt.iloc[1,4]-df_hybridopt.iloc[0,6],df_hybridopt.iloc[2,4]-df_hybridopt.iloc[1,6]])
+    # Breakdown of the discounted cost of the equipment installed over the lifetime of the system
+    df_equipmentcost = equipment_costs(['Opt_{}_Re{}_Load{}'.format(Systype, Reliability, Loadtype)]).reset_index(drop=True)
+    
+    # Save main financial metrics into .csv file
+    df_financialmetrics.to_csv(plot_dir + 'Financial_Metrics.csv', index=None)
+    print('Financial metrics saved as Financial_Metrics.csv \n')
+    
+    # Save breakdown of equipment costs in .csv file
+    df_equipmentcost.to_csv(plot_dir + 'Equipment_costs.csv', index=None)
+    print('Equipment costs saved as Equipment_costs.csv \n')
+         
+    # Obtain breakdown of emissions: Total emissions, Equipment emissions, O&M emissions, fuel emissions     
+    Environmental_indexes=[37, 39, 41, 42]        
+    df_environmentalmetricsperyear=df_hybridopt.iloc[:, Environmental_indexes]
+    df_environmentalmetrics= pd.DataFrame(df_environmentalmetricsperyear.sum())
+    df_environmentalmetrics=df_environmentalmetrics.transpose()
+    
+    # Save environmental metrics in .csv file
+    df_environmentalmetrics.to_csv(plot_dir + 'Environmental_Metrics.csv', index=None)
+    print('\nEnvironmental metrics saved as Environmental_Metrics.csv \n')
     
-    # Calculate the discounted cost of such installations over the lifetime of the system
-    PV_cost_array = Finance().get_PV_cost(PV_array_size,0)
-    BOS_cost_array = Finance().get_BOS_cost(PV_array_size,0)
-    storage_cost_array = Finance().get_storage_cost(storage_size,0)
+    return df_keymetrics
+
     
-    # Discount fraction used for installations on years 0,5,10
-    discount_fraction = [((1.0 - 0.095)**0),((1.0 - 0.095)**5),((1.0 - 0.095)**10)]
+def hybrid_sys_figures (max_blackouts, Loadtype):
+    """
+    Render the cost and emissions breakdown and hourly energy profile figures of diesel-PV-battery system for the selected scenario,
+    simulating the lifetime of the optimisation only when its rollup cube is missing or outdated
     
-    PV_cost = sum(np.multiply(PV_cost_array,discount_fraction))
-    storage_cost = sum(np.multiply(storage_cost_array,discount_fraction))
-    BOS_cost = sum(np.multiply(BOS_cost_array,discount_fraction))
+    PRE-REQUISITE: Run hybrid_sys_metrics(max_blackouts, Loadtype)
     
-    Other_equip_cost = df_financialmetrics.iat[0,1]-(PV_cost+BOS_cost+storage_cost)
+    Input: Optimisation file resulting of hybrid_sys_performance(max_blackouts, Loadtype)
+           Financial_Metrics.csv, Equipment_costs.csv and Environmental_Metrics.csv of the optimisation
+        
+    Output: Save .png figures on /Saved Optimisations/Optimisation Name*/ directory    
     
-    df_equipmentcost=pd.DataFrame()
-    df_equipmentcost['PV Cost']=PV_cost
-    df_equipmentcost['Storage Cost']=storage_cost
-    df_equipmentcost['BOS Cost']=BOS_cost
-    df_equipmentcost['Other equipment Cost']= Other_equip_cost
+    """  
+    Systype = 'Hybrid'   
+    Reliability= reliability_level(max_blackouts)
     
-    # Save main financial metrics into .csv file
-    df_financialmetrics.to_csv(rself.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}/Financial_Metrics.csv'.format(Systype, Reliability, Loadtype), index=None)
-    print('Financial metrics saved as Financial_Metrics.csv \n')
+    # Optimisation and directory with its metrics
+    df_hybridopt = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}.csv'.format(Systype, Reliability, Loadtype))
+    plot_dir = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}/'.format(Systype, Reliability, Loadtype)
     
-    # Save breakdown of equipment costs in .csv file
-    df_equipmentcost.to_csv(rself.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}/Equipment_costs.csv'.format(Systype, Reliability, Loadtype), index=None)
-    print('Equipment costs saved as Financial_Metrics.csv \n')
+    df_financialmetrics = pd.read_csv(plot_dir + 'Financial_Metrics.csv')
+    df_equipmentcost = pd.read_csv(plot_dir + 'Equipment_costs.csv')
+    df_environmentalmetrics = pd.read_csv(plot_dir + 'Environmental_Metrics.csv')
     
     # Cost Breakdown Donught 
     labels = ['PV Cost', 'Storage Cost', 'BOS Cost', 'Other equipment costs', 'O&M cost (excluding fuel)', 'Fuel cost']
-    sizes = [PV_cost, storage_cost, BOS_cost, Other_equip_cost, df_financialmetrics.iat[0,2], df_financialmetrics.iat[0,3]]
+    sizes = list(df_equipmentcost.iloc[0]) + [df_financialmetrics.iat[0,2], df_financialmetrics.iat[0,3]]
     colors = ['gold','yellowgreen','darkcyan','steelblue', 'lightsteelblue', 'lightcoral']
     explode = (0.1,0.1,0.1,0.1,0.1,0.1)
     patches, texts, autotexts = plt.pie(sizes, colors=colors, startangle=0, counterclock=True, autopct='%1.1f%%', pctdistance=1.2, explode=explode)
@@ -2797,16 +4911,6 @@ def hybrid_sys_stats (max_blackouts, Loadtype):
 
     print('\nFigure saved as ', plot_name)  
          
-    # Obtain breakdown of emissions: Total emissions, Equipment emissions, O&M emissions, fuel emissions     
-    Environmental_indexes=[37, 39, 41, 42]        
-    df_environmentalmetricsperyear=df_hybridopt.iloc[:, Environmental_indexes]
-    df_environmentalmetrics= pd.DataFrame(df_environmentalmetricsperyear.sum())
-    df_environmentalmetrics=df_environmentalmetrics.transpose()
-    
-    # Save environmental metrics in .csv file
-    df_environmentalmetrics.to_csv(rself.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}/Environmental_Metrics.csv'.format(Systype, Reliability, Loadtype), index=None)
-    print('\nEnvironmental metrics saved as Environmental_Metrics.csv \n')
-    
     # GHGs Emissions Breakdown Donught   
     labels = ['New equipment emissions', 'O&M emissions (excluding fuel)', 'Fuel emissions']
     sizes = [df_environmentalmetrics.iat[0,1], df_environmentalmetrics.iat[0,2], df_environmentalmetrics.iat[0,3]]
@@ -2831,30 +4935,22 @@ def hybrid_sys_stats (max_blackouts, Loadtype):
     
     # Obtain the hourly energy performance of the system, divided by technology
        
-    # Run simulation of optimization file  
-    df_simulation=Energy_System().lifetime_simulation(df_hybridopt)
-    
-    # Add a column with the hour to simulation file
-    hours=pd.Series(data=[0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,23])   
-    length = len(df_simulation.index)
-    num=int(length/len(hours))
-    hours_column = pd.concat([hours]*num, ignore_index=True)   
-    df_simulation['Hour']=hours_column     
-    hourly_variables=pd.DataFrame(columns=[df_simulation.columns])
-    hourly_variables['Hour']=hours
+    # Open the rollup cube of the lifetime simulation of the optimisation, simulating it only if the optimisation changed
+    filepath_opt = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}.csv'.format(Systype, Reliability, Loadtype)
+    filepath_rollup = plot_dir + 'Lifetime_simulation_Rollup.csv'
     
-    # Obtain hourly average of all variables in simulation    
-    for column in df_simulation.columns:
-            
-               hourly_mean=pd.DataFrame()
-               
-               for i in range(0, 24):
+    if os.path.exists(filepath_rollup) and os.path.getmtime(filepath_rollup) >= os.path.getmtime(filepath_opt):
+        df_rollup = pd.read_csv(filepath_rollup)
+    else:
+        # Run simulation of optimization file  
+        df_simulation=Energy_System().lifetime_simulation(df_hybridopt)
+        df_rollup = save_rollup(df_simulation, plot_dir + 'Lifetime_simulation.csv')
     
-                  df_i = df_simulation.loc[df_simulation['Hour'] == i].mean(axis=0).loc[column]   
-                  dflocal = pd.DataFrame([df_i])      
-                  hourly_mean=pd.concat([hourly_mean, dflocal])
-                  
-               hourly_variables[column]=list(hourly_mean[0])
+    # Hours of the day
+    hours=pd.Series(data=[0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,23])
+    
+    # Obtain hourly average of all variables in simulation    
+    hourly_variables=rollup_query(df_rollup, ['Hour'], None, 'mean').reset_index(drop=True)
            
     hourly_plot=hourly_variables[['Load energy (kWh)','Renewables energy supplied (kWh)','Storage energy supplied (kWh)','Dumped energy (kWh)','Diesel energy (kWh)']]
     
@@ -2900,7 +4996,26 @@ def hybrid_sys_stats (max_blackouts, Loadtype):
     plt.show()    
     
     print('Figure saved as '+plot_name)
+
+
+def hybrid_sys_stats (max_blackouts, Loadtype):
+    """
+    Present costs, GHGs, renewable fraction, diesel consumption of diesel-PV-battery system for the selected scenario 
+    
+    Input: Optimisation file resulting of hybrid_sys_performance(max_blackouts, Loadtype)
+        
+    Output: Display LCUE, emissions intensity, Diesel capacity, Diesel fuel usage
+             Save them in Key_Metrics.csv file 
+            Display breakdown of costs:Total System Cost, Total fuel cost, total O&M cost
+             Save them in Financial_Metrics.csv file 
+            Display breakdown of emissions: Total, System, Fuel, O&M
+             Save them in Environmental_Metrics.csv file 
+            Save .png figures on /Saved Optimisations/Optimisation Name*/ directory    
     
+    """
+    hybrid_sys_metrics (max_blackouts, Loadtype)
+    hybrid_sys_figures (max_blackouts, Loadtype)
+
     
 def PVBatt_sys_performance (max_blackouts, Loadtype, accuracy):
     """
@@ -2917,7 +5032,7 @@ def PVBatt_sys_performance (max_blackouts, Loadtype, accuracy):
     df_scenario = pd.read_csv(filepath, header=None)
     
     # Define reliability from the blackouts level
-    Reliability= int((1.0 - max_blackouts)*100.0)
+    Reliability= reliability_level(max_blackouts)
     
     # Performance studied for the PV-battery system
     Systype = 'PVBatt'
@@ -2947,89 +5062,102 @@ def PVBatt_sys_performance (max_blackouts, Loadtype, accuracy):
         print('\n Optimisation already exists, proceed with PVBatt_sys_stats(max_blackouts, Loadtype) to display results...')
     
     
-def PVBatt_sys_stats (max_blackouts, Loadtype):
+def PVBatt_sys_metrics (max_blackouts, Loadtype):
     """
-    Present costs, GHGs, renewable fraction of PV-battery system for the selected scenario 
+    Obtain and save the key, financial, equipment cost and environmental metrics of PV-battery system for the 
+    selected scenario, without rendering figures 
     
-    Input: Optimisation file resulting of hybrid_sys_performance(max_blackouts, Loadtype)
+    Input: Optimisation file resulting of PVBatt_sys_performance(max_blackouts, Loadtype)
         
-    Output: Display LCUE, emissions intensity, Diesel capacity, Diesel fuel usage
-             Save them in Key_Metrics.csv file 
-            Display breakdown of costs:Total System Cost, Total fuel cost, total O&M cost
-             Save them in Financial_Metrics.csv file 
-            Display breakdown of emissions: Total, System, Fuel, O&M
-             Save them in Environmental_Metrics.csv file 
-            Save .png figures on /Saved Optimisations/Optimisation Name*/ directory    
-     
-    """ 
+    Output: Key_Metrics.csv, Financial_Metrics.csv, Equipment_costs.csv and Environmental_Metrics.csv saved in the 
+            directory of the optimisation
+            DataFrame with the key metrics
+    
+    """  
     # Performance displayed for PV-Battery system
-    Systype = 'PVBatt'
-    Reliability= int((1 - max_blackouts)*100)
+    Systype = 'PVBatt'   
+    Reliability= reliability_level(max_blackouts)
     
     # Read csv file with diesel system simulation data
     df_PVBattopt = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}.csv'.format(Systype, Reliability, Loadtype))
   
-    # Obtain LCUE, emissions intensity, Renewables fraction, Total system cost, Cumulative GHGs
+    # Obtain LCUE, emissions intensity, Renewables fraction, Total system cost, Cumulative GHGs   
     Appraisal_indexes=[18,14,15,8,10]        
     df_keymetrics=df_PVBattopt.iloc[2, Appraisal_indexes]
     df_keymetrics.iat[0]=df_PVBattopt["Renewables fraction"].mean()
     df_keymetrics.iat[2]=df_PVBattopt["Emissions intensity (gCO2/kWh)"].mean()
-    
-    # Create a directory with the name of the simulation to save the figures 
+       
+    # Create a directory with the name of the simulation to save the metrics and figures 
     script_dir = os.path.dirname(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/")
     plot_dir = os.path.join(script_dir, 'Opt_{}_Re{}_Load{}/'.format(Systype, Reliability, Loadtype))
     
     if not os.path.isdir(plot_dir):
         os.makedirs(plot_dir)
     
-    # Save key metrics obtained in a .csv file
     df_keymetrics=pd.DataFrame(df_keymetrics)    
     df_keymetrics=df_keymetrics.transpose()
-    df_keymetrics.to_csv(rself.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}/Key_Metrics.csv'.format(Systype, Reliability, Loadtype), index=False, header=True)
+    df_keymetrics.to_csv(plot_dir + 'Key_Metrics.csv', index=None, header=True)
   
     print('\nKey system metrics saved as Key_Metrics.csv \n')
     print(df_keymetrics)
     
-    # Display breakdown of costs:Total System Cost, Total equipment cost, total O&M cost, total fuel cost     
+    # Display breakdown of costs:Total System Cost, Total equipment cost, total O&M cost, total fuel cost        
     Financial_indexes=[29, 30, 32, 33]        
     df_financialmetricsperyear=df_PVBattopt.iloc[:, Financial_indexes]
     df_financialmetrics= pd.DataFrame(df_financialmetricsperyear.sum())
     df_financialmetrics=df_financialmetrics.transpose()
     
-    # Calculate new PV, storage and diesel installations over lifetime
-    PV_array_size = pd.Series([df_PVBattopt.iloc[0,3], df_PVBattopt.iloc[1,3]-df_PVBattopt.iloc[0,5],df_PVBattopt.iloc[2,3]-df_PVBattopt.iloc[1,5]])
-    storage_size = pd.Series([df_PVBattopt.iloc[0,4], df_PVBattopt.iloc[1,4]-df_PVBattopt.iloc[0,6],df_PVBattopt.iloc[2,4]-df_PVBattopt.iloc[1,6]])
+    # Breakdown of the discounted cost of the equipment installed over the lifetime of the system
+    df_equipmentcost = equipment_costs(['Opt_{}_Re{}_Load{}'.format(Systype, Reliability, Loadtype)]).reset_index(drop=True)
     
-    # Calculate cost of installations over lifetime
-    PV_cost_array = Finance().get_PV_cost(PV_array_size,0)
-    BOS_cost_array = Finance().get_BOS_cost(PV_array_size,0)
-    storage_cost_array = Finance().get_storage_cost(storage_size,0)
+    # Save main financial metrics into .csv file
+    df_financialmetrics.to_csv(plot_dir + 'Financial_Metrics.csv', index=None)
+    print('Financial metrics saved as Financial_Metrics.csv \n')
     
-    # Discount fraction used for discount rate of 9.5%
-    discount_fraction = [((1.0 - 0.095)**0),((1.0 - 0.095)**5),((1.0 - 0.095)**10)]
+    # Save breakdown of equipment costs in .csv file
+    df_equipmentcost.to_csv(plot_dir + 'Equipment_costs.csv', index=None)
+    print('Equipment costs saved as Equipment_costs.csv \n')
+         
+    # Obtain breakdown of emissions: Total emissions, Equipment emissions, O&M emissions, fuel emissions     
+    Environmental_indexes=[37, 39, 41, 42]        
+    df_environmentalmetricsperyear=df_PVBattopt.iloc[:, Environmental_indexes]
+    df_environmentalmetrics= pd.DataFrame(df_environmentalmetricsperyear.sum())
+    df_environmentalmetrics=df_environmentalmetrics.transpose()
     
-    PV_cost = sum(np.multiply(PV_cost_array,discount_fraction))
-    storage_cost = sum(np.multiply(storage_cost_array,discount_fraction))
-    BOS_cost = sum(np.multiply(BOS_cost_array,discount_fraction))   
-    Other_equip_cost = df_financialmetrics.iat[0,1]-(PV_cost+BOS_cost+storage_cost)
+    # Save environmental metrics in .csv file
+    df_environmentalmetrics.to_csv(plot_dir + 'Environmental_Metrics.csv', index=None)
+    print('\nEnvironmental metrics saved as Environmental_Metrics.csv \n')
     
-    df_equipmentcost=pd.DataFrame()
-    df_equipmentcost['PV Cost']=PV_cost
-    df_equipmentcost['Storage Cost']=storage_cost
-    df_equipmentcost['BOS Cost']=BOS_cost
-    df_equipmentcost['Other equipment Cost']= Other_equip_cost
- 
-    # Save financial metrics obtained in .csv file
-    df_financialmetrics.to_csv(rself.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}/Financial_Metrics.csv'.format(Systype, Reliability, Loadtype), index=None)
-    print('Financial metrics saved as Financial_Metrics.csv \n')
+    return df_keymetrics
+
+    
+def PVBatt_sys_figures (max_blackouts, Loadtype):
+    """
+    Render the cost and emissions breakdown and hourly energy profile figures of PV-battery system for the selected scenario,
+    simulating the lifetime of the optimisation only when its rollup cube is missing or outdated
+    
+    PRE-REQUISITE: Run PVBatt_sys_metrics(max_blackouts, Loadtype)
+    
+    Input: Optimisation file resulting of PVBatt_sys_performance(max_blackouts, Loadtype)
+           Financial_Metrics.csv, Equipment_costs.csv and Environmental_Metrics.csv of the optimisation
+        
+    Output: Save .png figures on /Saved Optimisations/Optimisation Name*/ directory    
+    
+    """  
+    Systype = 'PVBatt'   
+    Reliability= reliability_level(max_blackouts)
+    
+    # Optimisation and directory with its metrics
+    df_PVBattopt = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}.csv'.format(Systype, Reliability, Loadtype))
+    plot_dir = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}/'.format(Systype, Reliability, Loadtype)
     
-    # Save equipment cost breakdown in .csv file
-    df_equipmentcost.to_csv(rself.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}/Equipment_costs.csv'.format(Systype, Reliability, Loadtype), index=None)
-    print('Equipment costs saved as Financial_Metrics.csv \n')
+    df_financialmetrics = pd.read_csv(plot_dir + 'Financial_Metrics.csv')
+    df_equipmentcost = pd.read_csv(plot_dir + 'Equipment_costs.csv')
+    df_environmentalmetrics = pd.read_csv(plot_dir + 'Environmental_Metrics.csv')
     
     # Cost Breakdown Donught   
     labels = ['PV Cost', 'Storage Cost', 'BOS Cost', 'Other equipment costs', 'O&M cost']
-    sizes = [PV_cost, storage_cost, BOS_cost, Other_equip_cost, df_financialmetrics.iat[0,2]]
+    sizes = list(df_equipmentcost.iloc[0]) + [df_financialmetrics.iat[0,2]]
     colors = ['gold','yellowgreen','darkcyan','steelblue', 'lightsteelblue']
     explode = (0.1,0.1,0.1,0.1,0.1)
     patches, texts, autotexts = plt.pie(sizes, colors=colors, startangle=180, counterclock=False, autopct='%1.1f%%', pctdistance=1.2, explode=explode)
@@ -3049,16 +5177,6 @@ def PVBatt_sys_stats (max_blackouts, Loadtype):
     
     print('\nFigure saved as ', plot_name)  
          
-    # Obtain breakdown of emissions: Total emissions, Equipment emissions, O&M emissions, fuel emissions        
-    Environmental_indexes=[37, 39, 41, 42]        
-    df_environmentalmetricsperyear=df_PVBattopt.iloc[:, Environmental_indexes]
-    df_environmentalmetrics= pd.DataFrame(df_environmentalmetricsperyear.sum())
-    df_environmentalmetrics=df_environmentalmetrics.transpose()
-    
-    # Save environmental metrics in .csv file
-    df_environmentalmetrics.to_csv(rself.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}/Environmental_Metrics.csv'.format(Systype, Reliability, Loadtype), index=None)
-    print('\nEnvironmental metrics saved as Environmental_Metrics.csv \n')
-    
     # GHGs Emissions Breakdown Donught 
     labels = ['New equipment emissions', 'O&M emissions']
     sizes = [df_environmentalmetrics.iat[0,1], df_environmentalmetrics.iat[0,2]]
@@ -3083,30 +5201,22 @@ def PVBatt_sys_stats (max_blackouts, Loadtype):
 
     # Obtain the hourly energy performance of the system, divided by technology
        
-    # Run simulation of optimization file  
-    df_simulation=Energy_System().lifetime_simulation(df_PVBattopt)
+    # Open the rollup cube of the lifetime simulation of the optimisation, simulating it only if the optimisation changed
+    filepath_opt = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}.csv'.format(Systype, Reliability, Loadtype)
+    filepath_rollup = plot_dir + 'Lifetime_simulation_Rollup.csv'
     
-    # Add a column with the hour to simulation file
-    hours=pd.Series(data=[0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,23])
-    length = len(df_simulation.index)
-    num=int(length/len(hours))
-    hours_column = pd.concat([hours]*num, ignore_index=True)
-    df_simulation['Hour']=hours_column  
-    hourly_variables=pd.DataFrame(columns=[df_simulation.columns])
-    hourly_variables['Hour']=hours    
+    if os.path.exists(filepath_rollup) and os.path.getmtime(filepath_rollup) >= os.path.getmtime(filepath_opt):
+        df_rollup = pd.read_csv(filepath_rollup)
+    else:
+        # Run simulation of optimization file  
+        df_simulation=Energy_System().lifetime_simulation(df_PVBattopt)
+        df_rollup = save_rollup(df_simulation, plot_dir + 'Lifetime_simulation.csv')
     
-    # Obtain hourly average of all variables in simulation 
-    for column in df_simulation.columns:
-            
-               hourly_mean=pd.DataFrame()
-               
-               for i in range(0, 24):
+    # Hours of the day
+    hours=pd.Series(data=[0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,17,18,19,20,21,22,23])
     
-                  df_i = df_simulation.loc[df_simulation['Hour'] == i].mean(axis=0).loc[column]
-                  dflocal = pd.DataFrame([df_i])
-                  hourly_mean=pd.concat([hourly_mean, dflocal])
-                  
-               hourly_variables[column]=list(hourly_mean[0])
+    # Obtain hourly average of all variables in simulation    
+    hourly_variables=rollup_query(df_rollup, ['Hour'], None, 'mean').reset_index(drop=True)
                     
     hourly_plot=hourly_variables[['Load energy (kWh)','Renewables energy supplied (kWh)','Dumped energy (kWh)','Storage energy supplied (kWh)']]
 
@@ -3145,16 +5255,207 @@ def PVBatt_sys_stats (max_blackouts, Loadtype):
     plt.ylim((-50,70))
     plt.yticks([-50,-40,-20,0,20,40,60,70])            
     
-    # Name the figure and save it in the corresponding directory
-    plot_name = "HourlyEnergyProfile_{}_Re{}_Load{}.png".format(Systype, Reliability, Loadtype)    
-    plt.savefig(plot_dir + plot_name, dpi=300)
-    plt.show()    
+    # Name the figure and save it in the corresponding directory
+    plot_name = "HourlyEnergyProfile_{}_Re{}_Load{}.png".format(Systype, Reliability, Loadtype)    
+    plt.savefig(plot_dir + plot_name, dpi=300)
+    plt.show()    
+    
+    print('Figure saved as '+plot_name)
+    
+    #hourly_plot.to_csv(rself.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}/HourlyEnergy.csv'.format(Systype, Reliability, Loadtype), index=None)
+    #print('\n Hourly energy performance saved as HourlyEnergy.csv')
+
+
+def PVBatt_sys_stats (max_blackouts, Loadtype):
+    """
+    Present costs, GHGs, renewable fraction of PV-battery system for the selected scenario 
+    
+    Input: Optimisation file resulting of hybrid_sys_performance(max_blackouts, Loadtype)
+        
+    Output: Display LCUE, emissions intensity, Diesel capacity, Diesel fuel usage
+             Save them in Key_Metrics.csv file 
+            Display breakdown of costs:Total System Cost, Total fuel cost, total O&M cost
+             Save them in Financial_Metrics.csv file 
+            Display breakdown of emissions: Total, System, Fuel, O&M
+             Save them in Environmental_Metrics.csv file 
+            Save .png figures on /Saved Optimisations/Optimisation Name*/ directory    
+     
+    """
+    PVBatt_sys_metrics (max_blackouts, Loadtype)
+    PVBatt_sys_figures (max_blackouts, Loadtype)
+
+    
+def open_warehouse ():
+    """
+    Open the results warehouse of the location, an SQLite database with every appraisal, optimisation and metrics 
+    file ingested with ingest_results()
+    
+    Input: Analysis/Results_warehouse.sqlite file of the location, created if it doesn't exist
+    
+    Output: Connection to the database
+    
+    """
+    filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Analysis/Results_warehouse.sqlite"
+    
+    if not os.path.isdir(os.path.dirname(filepath)):
+        os.makedirs(os.path.dirname(filepath))
+    
+    connection = sqlite3.connect(filepath)
+    
+    # One row per ingested file with the key of its run, and one row per value of each file in long format
+    connection.executescript('''
+        CREATE TABLE IF NOT EXISTS sources (source_id INTEGER PRIMARY KEY, path TEXT UNIQUE, modified REAL, kind TEXT, run_type TEXT, 
+                                            systype TEXT, loadtype TEXT, reliability REAL, pv_size REAL, storage_size REAL, variant TEXT);
+        CREATE TABLE IF NOT EXISTS results (source_id INTEGER, row INTEGER, metric TEXT, value REAL);
+        CREATE INDEX IF NOT EXISTS sources_key ON sources (systype, loadtype, reliability, kind);
+        CREATE INDEX IF NOT EXISTS results_metric ON results (metric, value);
+        CREATE INDEX IF NOT EXISTS results_source ON results (source_id, row);
+        ''')
+    
+    return connection
+
+
+def ingest_results ():
+    """
+    Add to the results warehouse every saved simulation appraisal, saved optimisation and Key/Financial/Environmental
+    metrics file of the location, with the key of its run (system type, load type, reliability, sizes) taken from its name. 
+    Only files new or modified since they were last ingested are read, and the results of files no longer found are removed
+    
+    Input: Saved simulations and Saved optimisations directories of the location
+    
+    Output: Results warehouse updated
+            Number of files ingested
+    
+    """
+    location_filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/"
+    
+    # Names of the runs of simulations and optimisations
+    run_names = re.compile(r'^(?:(?P<sim>Sim)_PV(?P<PV>[\d.]+)_Storage(?P<storage>[\d.]+)|(?P<opt>Opt|Cached_Opt|DP_Opt))'
+                           r'_(?P<Systype>[A-Za-z]+)_Re(?P<Reliability>[\d.]+)_Load(?P<Loadtype>[A-Za-z0-9]+)(?:_(?P<variant>[A-Za-z0-9]+))?$')
+    kinds = {'Key_Metrics.csv':'Key metrics', 'Financial_Metrics.csv':'Financial metrics', 'Environmental_Metrics.csv':'Environmental metrics'}
+    
+    # Results files and the run of each one
+    files = []
+    for directory in ['Simulation/Saved simulations', 'Optimisation/Saved optimisations']:
+        
+        if not os.path.isdir(location_filepath + directory):
+            continue
+        
+        for name in os.listdir(location_filepath + directory):
+            path = os.path.join(location_filepath + directory, name)
+            
+            if os.path.isdir(path):
+                run = run_names.match(name)
+                files += [(os.path.join(path, filename), kinds[filename], run) for filename in os.listdir(path) if filename in kinds and run]
+            
+            elif name.endswith('_Appraisal.csv'):
+                files.append((path, 'Appraisal', run_names.match(name[:-len('_Appraisal.csv')])))
+            
+            elif name.endswith('.csv') and not name.endswith('_Rollup.csv'):
+                run = run_names.match(name[:-len('.csv')])
+                if run and run.group('opt'):
+                    files.append((path, 'Optimisation', run))
+    
+    connection = open_warehouse()
+    ingested = dict(connection.execute('SELECT path, modified FROM sources').fetchall())
+    n_files = 0
     
-    print('Figure saved as '+plot_name)
+    for path, kind, run in files:
+        
+        if run is None or ingested.get(path) == os.path.getmtime(path):
+            continue
+        
+        # Values of every numeric column of every row of the file
+        df_results = pd.read_csv(path).select_dtypes(include=[np.number])
+        df_results = df_results.drop(columns=[column for column in df_results.columns if column.startswith('Unnamed')])
+        
+        connection.execute('DELETE FROM results WHERE source_id IN (SELECT source_id FROM sources WHERE path = ?)', (path,))
+        connection.execute('DELETE FROM sources WHERE path = ?', (path,))
+        
+        source_id = connection.execute('INSERT INTO sources (path, modified, kind, run_type, systype, loadtype, reliability, pv_size, storage_size, variant) VALUES (?,?,?,?,?,?,?,?,?,?)',
+                                       (path, os.path.getmtime(path), kind, run.group('opt') or 'Sim', run.group('Systype'), run.group('Loadtype'), float(run.group('Reliability')),
+                                        float(run.group('PV')) if run.group('sim') else None, float(run.group('storage')) if run.group('sim') else None, run.group('variant'))).lastrowid
+        
+        df_long = df_results.reset_index().melt(id_vars='index').dropna()
+        connection.executemany('INSERT INTO results (source_id, row, metric, value) VALUES (?,?,?,?)',
+                               [(source_id, int(row), metric, float(value)) for row, metric, value in df_long.itertuples(index=False)])
+        n_files += 1
     
-    #hourly_plot.to_csv(rself.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}/HourlyEnergy.csv'.format(Systype, Reliability, Loadtype), index=None)
-    #print('\n Hourly energy performance saved as HourlyEnergy.csv')
+    # Remove the results of files deleted, moved or renamed since they were ingested
+    removed = set(ingested) - set(path for path, kind, run in files if run is not None)
+    
+    for path in removed:
+        connection.execute('DELETE FROM results WHERE source_id IN (SELECT source_id FROM sources WHERE path = ?)', (path,))
+        connection.execute('DELETE FROM sources WHERE path = ?', (path,))
+    
+    connection.commit()
+    connection.close()
+    
+    print('\n {} results files ingested in the warehouse, {} already up to date, {} removed.'.format(n_files, len(files) - n_files, len(removed)))
+    
+    return n_files
+
+
+def query_results (metrics, filters):
+    """
+    Obtain the selected metrics of every run of the results warehouse meeting the filters, in a single query
+    
+    PRE-REQUISITE: Run ingest_results() to add the latest results to the warehouse
+    
+    Input: List of metrics (column names of the results files), i.e.: ['LCUE ($/kWh)', 'Renewables fraction']
+           Dictionary of filters on the run key ('Kind', 'Run type', 'Systype', 'Loadtype', 'Reliability', 'PV size (kWp)', 
+               'Storage size (kWh)', 'Variant') or on any metric, with a single value, a list of values or a (minimum, maximum) 
+               tuple, i.e.: {'Kind':'Appraisal', 'Systype':['Hybrid','PVBatt'], 'Reliability':(90, 100), 'Renewables fraction':(0.5, 1.0)}
+    
+    Output: DataFrame with the key of each run, the row of the file and the selected metrics (one row per row of each file)
+    
+    """
+    keys = collections.OrderedDict([('Kind','kind'), ('Run type','run_type'), ('Systype','systype'), ('Loadtype','loadtype'), ('Reliability','reliability'),
+                                    ('PV size (kWp)','pv_size'), ('Storage size (kWh)','storage_size'), ('Variant','variant'), ('Source','path')])
+    
+    # Condition of a filter on a column of the query
+    def condition (column, value, parameters):
+        if isinstance(value, tuple):
+            parameters += [value[0], value[1]]
+            return '{} BETWEEN ? AND ?'.format(column)
+        elif isinstance(value, list):
+            parameters += value
+            return '{} IN ({})'.format(column, ','.join('?' * len(value)))
+        else:
+            parameters.append(value)
+            return '{} = ?'.format(column)
+    
+    if len(metrics) == 0:
+        raise ValueError('At least one metric must be selected')
+    
+    conditions = ['r.metric IN ({})'.format(','.join('?' * len(metrics)))]
+    parameters = list(metrics)
+    
+    for name, value in filters.items():
+        
+        if isinstance(value, list) and len(value) == 0:
+            raise ValueError('Filter on {} has an empty list of values'.format(name))
+        
+        if name in keys:
+            conditions.append(condition('s.' + keys[name], value, parameters))
+        else:
+            parameters.append(name)
+            conditions.append('EXISTS (SELECT 1 FROM results f WHERE f.source_id = r.source_id AND f.row = r.row AND f.metric = ? AND {})'.format(condition('f.value', value, parameters)))
+    
+    query = 'SELECT {}, r.source_id, r.row, r.metric, r.value FROM results r JOIN sources s ON s.source_id = r.source_id WHERE {}'.format(
+            ', '.join('s.{} AS "{}"'.format(column, name) for name, column in keys.items()), ' AND '.join(conditions))
     
+    connection = open_warehouse()
+    df_long = pd.read_sql_query(query, connection, params=parameters)
+    connection.close()
+    
+    # One column per metric
+    df_values = df_long.pivot_table(index=['source_id', 'row'], columns='metric', values='value').reindex(columns=metrics)
+    df_query = df_long.drop_duplicates(['source_id', 'row']).drop(columns=['metric', 'value']).join(df_values, on=['source_id', 'row'])
+    df_query = df_query.sort_values(['source_id', 'row']).drop(columns='source_id').rename(columns={'row':'Row'}).reset_index(drop=True)
+    
+    return df_query
+
 
 def compare_keymetrics (max_blackouts, Loadtype):
     """
@@ -3168,7 +5469,7 @@ def compare_keymetrics (max_blackouts, Loadtype):
     
     """ 
     # Read the data from Key_Metrics.csv files for diesel, hybrid and PVBatt systems for the reliability level selected
-    Reliability= int((1 - max_blackouts)*100)
+    Reliability= reliability_level(max_blackouts)
     
     df_dieselmetrics = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV0_Storage0_Diesel_Re{}_Load{}/Key_Metrics.csv'.format(Reliability, Loadtype))
     df_hybridmetrics = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_Hybrid_Re{}_Load{}/Key_Metrics.csv'.format(Reliability, Loadtype))
@@ -3236,7 +5537,7 @@ def compare_costs (max_blackouts, Loadtype):
             
     """ 
     # Read the data from Financial_Metrics.csv files for diesel, hybrid and PVBatt systems for the reliability level
-    Reliability= int((1 - max_blackouts)*100)
+    Reliability= reliability_level(max_blackouts)
     
     df_dieselcosts = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV0_Storage0_Diesel_Re{}_Load{}/Financial_Metrics.csv'.format(Reliability, Loadtype))
     df_hybridcosts = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_Hybrid_Re{}_Load{}/Financial_Metrics.csv'.format(Reliability, Loadtype))
@@ -3339,254 +5640,852 @@ def compare_costs (max_blackouts, Loadtype):
     if not os.path.isdir(plot_dir):
         os.makedirs(plot_dir)
     
-    fig.savefig(plot_dir + plot_name,dpi=300)
-    plt.show()
+    fig.savefig(plot_dir + plot_name,dpi=300)
+    plt.show()
+
+    print('Figure saved as ', plot_name)  
+    
+
+
+def compare_GHGs (max_blackouts, Loadtype):
+    """
+    Present  GHGs breakdown of PVBatt/Hybrid systems vs base case of diesel-powered system for the selected scenario 
+    
+    Input: max_blackouts  Maximum acceptible blackouts (0.0-1.0)
+           Load profile for the selected scenario, between 'InstitutionalBase', 'InstitutionalAdv', 'Mix1', 'Mix2'
+           
+    Output: Display barchart of breakdown of costs savings/expenditures of hybrid/PVbatt systems compared to diesel case
+            Save on /Plots/Plots Comparison/ directory  .png graphs 
+            
+    """ 
+    # Read the data from Environmental_Metrics.csv files for diesel, hybrid and PVBatt systems for that reliability level
+    Reliability= reliability_level(max_blackouts)
+    
+    df_dieselGHGs = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV0_Storage0_Diesel_Re{}_Load{}/Environmental_Metrics.csv'.format(Reliability, Loadtype))
+    df_hybridGHGs = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_Hybrid_Re{}_Load{}/Environmental_Metrics.csv'.format(Reliability, Loadtype))
+    df_PVBattGHGs = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_PVBatt_Re{}_Load{}/Environmental_Metrics.csv'.format(Reliability, Loadtype))
+    
+    # Calculate the difference of emissions between hybrid and PVBatt system vs base diesel case
+    df_hybridGHGs_comparison= df_hybridGHGs - df_dieselGHGs
+    df_PVBattGHGs_comparison= df_PVBattGHGs - df_dieselGHGs
+    
+    # Represent barchart with the breakdown of emissions of hybrid/PVBatt systems compared to diesel base
+    labels = ['Total System\n Emissions', 'New Equipment \n Emissions', 'O&M Emissions \n (excluding fuel)', 'Fuel Emissions']
+    hybrid_means = df_hybridGHGs_comparison.iloc[0]/1000
+    PVBatt_means = df_PVBattGHGs_comparison.iloc[0]/1000
+
+    x = np.arange(len(labels))  # the label locations
+    width = 0.35  # the width of the bars
+
+    fig, ax = plt.subplots()
+    rects1 = ax.bar(x - width/2, hybrid_means, width, label='Hybrid System', color='lightskyblue')
+    rects2 = ax.bar(x + width/2, PVBatt_means, width, label='PV-Battery System', color='yellowgreen')
+
+    # Add some text for labels, title and custom x-axis tick labels, etc.
+    ax.set_ylabel('tonnes of CO2eq')
+    ax.set_title(r'$\bf{Emissions \ breakdown \ comparison \ by \ system}$'+'\n Values compared to base case with diesel system \n')
+    ax.set_xticks(x)
+    ax.set_xticklabels(labels)
+    ax.xaxis.set_label_position('bottom')
+    ax.legend(loc='lower center')   
+    ax.set_ylim([-1750, 500])
+    ax.set_yticks([-1750,-1500,-1250,-1000,-750,-500,-250,0,250, 500])
+    
+    #Attach a text label above each bar in *rects*, displaying its height.
+    percentagehybrid= ((df_hybridGHGs - df_dieselGHGs)/df_dieselGHGs)*100.0
+    pctGHGhybrid=percentagehybrid.iloc[0]
+
+    percentagePVBatt= ((df_PVBattGHGs - df_dieselGHGs)/df_dieselGHGs)*100.0
+    pctGHGPVBatt=percentagePVBatt.iloc[0]
+    
+    def autolabel(rects):
+        
+        for rect in rects:   
+
+               height = rect.get_height()                 
+                              
+               for i in range(0,4):
+                   
+                   if height == hybrid_means[i]:
+                   
+                     percentage = pctGHGhybrid[i]
+                     pctrounded = round(percentage, 0)
+                     pct=int(pctrounded)
+                                          
+                     if pct >= 0.0:
+                                                
+                        ax.annotate('+'+str(pct)+'%',
+                          xy=(rect.get_x() + rect.get_width() / 2, height),
+                          xytext=(0, 3),  # 3 points vertical offset
+                          textcoords="offset points",
+                          ha='center', va='bottom', size=8)
+                        
+                     else:
+                        ax.annotate(str(pct)+'%',
+                          xy=(rect.get_x() + rect.get_width() / 2, height),
+                          xytext=(0, -15),  # 3 points vertical offset
+                          textcoords="offset points",
+                          ha='center', va='bottom', size=8)
+
+                   elif height == PVBatt_means[i]:
+                   
+                     percentage = pctGHGPVBatt[i]
+                     pctrounded = round(percentage, 0)
+                     pct=int(pctrounded)                     
+                     
+                     if pct >= 0.0:
+                                                
+                        ax.annotate('+'+str(pct)+'%',
+                          xy=(rect.get_x() + rect.get_width() / 2, height),
+                          xytext=(0, 3),  # 3 points vertical offset
+                          textcoords="offset points",
+                          ha='center', va='bottom', size=8)
+                        
+                     else:
+                        ax.annotate(str(pct)+'%',
+                          xy=(rect.get_x() + rect.get_width() / 2, height),
+                          xytext=(0, -15),  # 3 points vertical offset
+                          textcoords="offset points",
+                          ha='center', va='bottom', size=8)                        
+               
+    # Include labels in figure
+    autolabel(rects1)
+    autolabel(rects2)
+ 
+    fig.tight_layout()
+
+    # Create a directory to save the figure 
+    script_dir = os.path.dirname(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/")
+    plot_dir = os.path.join(script_dir, 'Analysis/Comparison_Re{}_Load{}/'.format(Reliability, Loadtype))
+    plot_name = 'GHGsBreakdown_Comparison_Re{}_Load{}.png'.format(Reliability, Loadtype)
+    
+    if not os.path.isdir(plot_dir):
+        os.makedirs(plot_dir)
+    
+    fig.savefig(plot_dir + plot_name,dpi=300)
+    plt.show()
+
+    print('Figure saved as ', plot_name)  
+
+
+# =============================================================================
+#                           Sensitivity analysis
+# =============================================================================   
+#
+    
+def create_workspace (Name):
+    """
+    Create an isolated copy of the CLOVER inputs so that simulations can run concurrently without modifying
+    the scenario, optimisation and load inputs used by other runs
+    
+    Input: Name of the workspace
+    
+    Output: Filepath of the workspace, containing a copy of CLOVER-master without saved simulations,
+            optimisations or analyses
+    
+    """
+    workspace = self.CLOVER_filepath + '/Workspaces/{}'.format(Name)
+    
+    # Start from a fresh copy of the current inputs
+    if os.path.isdir(workspace):
+        shutil.rmtree(workspace)
+    
+    shutil.copytree(self.CLOVER_filepath + '/CLOVER-master', workspace + '/CLOVER-master', 
+                    ignore=shutil.ignore_patterns('Saved simulations', 'Saved optimisations', 'Analysis', 'Checkpoints', 'Workspaces'))
+    
+    # Create the output directories expected by CLOVER
+    os.makedirs(workspace + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations')
+    os.makedirs(workspace + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations')
+    
+    # Copy the evaluation table, reused by the cached optimisations
+    evaluations_directory = '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Evaluations'
+    
+    if os.path.isdir(self.CLOVER_filepath + evaluations_directory):
+        shutil.copytree(self.CLOVER_filepath + evaluations_directory, workspace + evaluations_directory)
+    
+    return workspace
+
+
+def isolate_workspace (origin, workspace):
+    """
+    Redirect the input and output filepaths of this script and of the CLOVER classes to a workspace 
+    
+    Input: Filepath of the CLOVER folder and of the workspace created with create_workspace(Name)
+    
+    Output: Every CLOVER object created afterwards in this process reads and writes in the workspace
+    
+    """
+    self.CLOVER_filepath = workspace
+    CLOVER_paths['Origin'] = origin
+    CLOVER_paths['Workspace'] = workspace
+    
+    # Locate the CLOVER classes imported, directly or by other CLOVER scripts
+    scripts = os.path.abspath(origin + '/CLOVER-master/Scripts')
+    
+    for module in list(sys.modules.values()):
+        
+        if not os.path.abspath(str(getattr(module, '__file__', None))).startswith(scripts):
+            continue
+        
+        for obj in list(vars(module).values()):
+            
+            if not isinstance(obj, type) or obj.__module__ != module.__name__ or '__workspace_init__' in vars(obj):
+                continue
+            
+            # Rewrite the filepaths set when the CLOVER object is created
+            def __workspace_init__ (obj_self, *args, __init__=obj.__init__, **kwargs):
+                __init__(obj_self, *args, **kwargs)
+                
+                for attribute, value in vars(obj_self).items():
+                    if isinstance(value, str) and CLOVER_paths['Origin'] != CLOVER_paths['Workspace'] and value.startswith(CLOVER_paths['Origin']):
+                        setattr(obj_self, attribute, CLOVER_paths['Workspace'] + value[len(CLOVER_paths['Origin']):])
+            
+            obj.__init__ = __workspace_init__
+            obj.__workspace_init__ = True
+
+
+def run_task (workspace, Function, args):
+    """
+    Run a function of this script in a workspace, used by run_task_graph() in each process of the pool 
+    
+    Input: Filepath of the workspace (None to run on the CLOVER folder), name of the function and its arguments
+    
+    Output: Value returned by the function
+    
+    """
+    # Figures are saved but not displayed by the processes of the pool
+    plt.switch_backend('Agg')
+    
+    origin = self.CLOVER_filepath
+    
+    if workspace != None:
+        isolate_workspace (origin, workspace)
+        
+    try:
+        return globals()[Function](*args)
+    
+    finally:
+        isolate_workspace (origin, origin)
+        plt.close('all')
+
+
+def run_task_graph (tasks, max_workers, on_complete):
+    """
+    Run a graph of tasks, starting each task in a process pool as soon as the tasks it depends on have finished
+    
+    Input: Ordered dictionary of tasks, each one a dictionary with 'Function' (name of a function of this script),
+               'Args', 'Workspace' and 'Depends' (list of the tasks required before)
+           Maximum number of processes running at the same time
+           Function called with the task name and its result as each task finishes
+           
+    Output: Dictionary with the results of the tasks. Tasks that failed, or that depend on a task that failed, 
+            are reported and not included
+            
+    The tasks are run by processes forked from the current one, which is only supported on Linux and macOS 
+    when running the functions of this script from a console. Where processes can't be forked, the tasks are run 
+    one after the other in the current process
+    
+    """
+    # Tasks depending on tasks missing from the graph, or on each other, would never start
+    for name, task in tasks.items():
+        unknown = [depend for depend in task['Depends'] if depend not in tasks]
+        
+        if len(unknown) > 0:
+            raise ValueError('Task {} depends on tasks not in the graph: {}'.format(name, unknown))
+    
+    order = []
+    while len(order) < len(tasks):
+        ready = [name for name in tasks if name not in order and all(depend in order for depend in tasks[name]['Depends'])]
+        
+        if len(ready) == 0:
+            raise ValueError('Tasks {} depend on each other'.format([name for name in tasks if name not in order]))
+        
+        order.extend(ready)
+    
+    results = {}
+    pending = collections.OrderedDict(tasks)
+    running = {}
+    failed = set()
+    
+    # Run the tasks in the order of their dependencies in this process
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        
+        print('\n Processes can\'t be forked on this platform, running {} tasks one after the other...'.format(len(tasks)))
+        
+        for name in order:
+            
+            if any(task in failed for task in tasks[name]['Depends']):
+                print('\n Task {} not run, a task it depends on failed'.format(name))
+                failed.add(name)
+                continue
+            
+            try:
+                results[name] = run_task(tasks[name]['Workspace'], tasks[name]['Function'], tasks[name]['Args'])
+            except Exception as error:
+                print('\n Task {} failed: {}'.format(name, error))
+                failed.add(name)
+                continue
+            
+            on_complete (name, results[name])
+        
+        return results
+    
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('fork')) as pool:
+        
+        while len(pending) > 0 or len(running) > 0:
+            
+            # Discard the tasks that depend on a task that failed
+            for name in [name for name in pending if any(task in failed for task in pending[name]['Depends'])]:
+                print('\n Task {} not run, a task it depends on failed'.format(name))
+                failed.add(name)
+                del pending[name]
+            
+            # Start the tasks with all their dependencies completed
+            for name in [name for name in pending if all(task in results for task in pending[name]['Depends'])]:
+                task = pending.pop(name)
+                running[pool.submit(run_task, task['Workspace'], task['Function'], task['Args'])] = name
+            
+            if len(running) == 0:
+                continue
+            
+            # Wait for any task to finish 
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            
+            for future in finished:
+                name = running.pop(future)
+                
+                try:
+                    results[name] = future.result()
+                except Exception as error:
+                    print('\n Task {} failed: {}'.format(name, error))
+                    failed.add(name)
+                    continue
+                
+                on_complete (name, results[name])
+    
+    return results
+
+
+def collect_workspace (workspace):
+    """
+    Copy the simulations and optimisations saved in a workspace to the CLOVER folder 
+    
+    Input: Filepath of the workspace created with create_workspace(Name)
+    
+    Output: Saved simulations and optimisations available in the CLOVER folder, evaluation tables merged with the 
+            ones of the CLOVER folder, workspace removed
+    
+    """
+    evaluations_directory = '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Evaluations'
+    
+    # Merge the evaluation tables, which other workspaces may have extended at the same time
+    if os.path.isdir(workspace + evaluations_directory):
+        
+        if not os.path.isdir(self.CLOVER_filepath + evaluations_directory):
+            os.makedirs(self.CLOVER_filepath + evaluations_directory)
+        
+        for filename in os.listdir(workspace + evaluations_directory):
+            df_evaluations = pd.read_csv(workspace + evaluations_directory + '/' + filename, dtype=str)
+            filepath = self.CLOVER_filepath + evaluations_directory + '/' + filename
+            
+            if os.path.exists(filepath):
+                df_evaluations = pd.concat([pd.read_csv(filepath, dtype=str), df_evaluations]).drop_duplicates()
+            
+            df_evaluations.to_csv(filepath, index=None)
+        
+        shutil.rmtree(workspace + evaluations_directory)
+    
+    for directory in ['/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations', '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations']:
+        shutil.copytree(workspace + directory, self.CLOVER_filepath + directory, dirs_exist_ok=True)
+    
+    shutil.rmtree(workspace)
+
+
+def exact_threshold (max_blackouts):
+    """
+    Obtain the exact decimal value of a blackout threshold, free of the floating point errors of ranges such as np.arange
+    
+    Input: Maximum fraction of blackouts allowed (float or Decimal)
+    
+    Output: Blackout threshold as a Decimal, i.e.: Decimal('0.07') for 0.07000000000000001
+    
+    """
+    if not isinstance(max_blackouts, Decimal):
+        max_blackouts = Decimal(str(round(float(max_blackouts), 10)))
+    
+    return max_blackouts.normalize()
 
-    print('Figure saved as ', plot_name)  
+
+def reliability_level (max_blackouts):
+    """
+    Obtain the reliability level of a blackout threshold used to name the files of its systems
+    
+    Input: Maximum fraction of blackouts allowed
+    
+    Output: Reliability level (%), as an integer when it is a whole number, i.e.: 93 for 0.07 and 97.5 for 0.025
     
+    """
+    Reliability = (1 - exact_threshold(max_blackouts)) * 100
+    
+    if Reliability == Reliability.to_integral_value():
+        return int(Reliability)
+    else:
+        return float(Reliability)
 
 
-def compare_GHGs (max_blackouts, Loadtype):
+def blackout_thresholds (initial_max_blackout, final_max_blackout, stepsize):
     """
-    Present  GHGs breakdown of PVBatt/Hybrid systems vs base case of diesel-powered system for the selected scenario 
+    Obtain the blackout thresholds of a sweep, from the final to the initial threshold (both included)
     
-    Input: max_blackouts  Maximum acceptible blackouts (0.0-1.0)
-           Load profile for the selected scenario, between 'InstitutionalBase', 'InstitutionalAdv', 'Mix1', 'Mix2'
-           
-    Output: Display barchart of breakdown of costs savings/expenditures of hybrid/PVbatt systems compared to diesel case
-            Save on /Plots/Plots Comparison/ directory  .png graphs 
-            
-    """ 
-    # Read the data from Environmental_Metrics.csv files for diesel, hybrid and PVBatt systems for that reliability level
-    Reliability= int((1 - max_blackouts)*100)
+    Input: Initial and final maximum fractions of blackouts allowed and stepsize between thresholds
     
-    df_dieselGHGs = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV0_Storage0_Diesel_Re{}_Load{}/Environmental_Metrics.csv'.format(Reliability, Loadtype))
-    df_hybridGHGs = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_Hybrid_Re{}_Load{}/Environmental_Metrics.csv'.format(Reliability, Loadtype))
-    df_PVBattGHGs = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_PVBatt_Re{}_Load{}/Environmental_Metrics.csv'.format(Reliability, Loadtype))
+    Output: List of exact blackout thresholds (Decimal)
     
-    # Calculate the difference of emissions between hybrid and PVBatt system vs base diesel case
-    df_hybridGHGs_comparison= df_hybridGHGs - df_dieselGHGs
-    df_PVBattGHGs_comparison= df_PVBattGHGs - df_dieselGHGs
+    """
+    initial, final, step = exact_threshold(initial_max_blackout), exact_threshold(final_max_blackout), exact_threshold(stepsize)
     
-    # Represent barchart with the breakdown of emissions of hybrid/PVBatt systems compared to diesel base
-    labels = ['Total System\n Emissions', 'New Equipment \n Emissions', 'O&M Emissions \n (excluding fuel)', 'Fuel Emissions']
-    hybrid_means = df_hybridGHGs_comparison.iloc[0]/1000
-    PVBatt_means = df_PVBattGHGs_comparison.iloc[0]/1000
+    return [(final + i * step).normalize() for i in range(int((initial - final) / step) + 1)]
 
-    x = np.arange(len(labels))  # the label locations
-    width = 0.35  # the width of the bars
 
-    fig, ax = plt.subplots()
-    rects1 = ax.bar(x - width/2, hybrid_means, width, label='Hybrid System', color='lightskyblue')
-    rects2 = ax.bar(x + width/2, PVBatt_means, width, label='PV-Battery System', color='yellowgreen')
+def get_sweep_inputs_hash (Loadtype, accuracy, cached):
+    """
+    Obtain a hash of the inputs that define the systems of a reliability sweep, identifying the points of the sweep
+    that remain valid. The system type and blackout threshold of the scenario are excluded, as they change for each point,
+    as well as the rows of the optimisation inputs set by each optimisation (minimum sizes, steps and threshold)
+    
+    Input: Load profile of the sweep, whose total load is hashed (see get_load_filepath)
+           Accuracy (stepsize) of the optimisations, None for systems simulated without optimisation
+           Cached, True if the system is optimised with cached_optimise_system()
+    
+    Output: Hash of the inputs (hexadecimal string)
+    
+    """
+    location_filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/"
+    
+    # Scenario inputs other than the technologies and blackout threshold
+    df_scenario = pd.read_csv(location_filepath + "Scenario/Scenario inputs.csv", header=None)
+    inputs_hash = hashlib.md5(df_scenario.iloc[4:].to_csv(index=None, header=None).encode())
+    
+    # Technical, financial, environmental inputs and total load of the load profile    
+    input_files = ['Simulation/Energy system inputs.csv', 'Impact/Finance inputs.csv', 'Impact/GHG inputs.csv', 'Diesel/Diesel inputs.csv',
+                   'PV/PV generation inputs.csv', 'Location data/Location inputs.csv']
+    
+    for filepath in [location_filepath + input_file for input_file in input_files] + [get_load_filepath(Loadtype)]:
+        if os.path.exists(filepath):
+            with open(filepath, 'rb') as f:
+                inputs_hash.update(f.read())
+    
+    # Optimisation inputs other than those set by each optimisation, and accuracy of the optimisations
+    if accuracy != None:
+        df_optimisation = pd.read_csv(location_filepath + "Optimisation/Optimisation inputs.csv", header=None)
+        df_optimisation.iloc[[2, 4, 6, 8, 11], 1:] = ''
+        inputs_hash.update(df_optimisation.to_csv(index=None, header=None).encode())
+        inputs_hash.update('Accuracy {}'.format(float(accuracy)).encode())
+    
+    # Optimisations from the evaluation table are distinguished from the optimisations of CLOVER
+    if cached == True:
+        inputs_hash.update(b'cached_optimise_system')
+                
+    return inputs_hash.hexdigest()
 
-    # Add some text for labels, title and custom x-axis tick labels, etc.
-    ax.set_ylabel('tonnes of CO2eq')
-    ax.set_title(r'$\bf{Emissions \ breakdown \ comparison \ by \ system}$'+'\n Values compared to base case with diesel system \n')
-    ax.set_xticks(x)
-    ax.set_xticklabels(labels)
-    ax.xaxis.set_label_position('bottom')
-    ax.legend(loc='lower center')   
-    ax.set_ylim([-1750, 500])
-    ax.set_yticks([-1750,-1500,-1250,-1000,-750,-500,-250,0,250, 500])
+
+def set_reliability (max_blackouts):
+    """
+    Set the blackout threshold of the scenario and of the optimisation 
     
-    #Attach a text label above each bar in *rects*, displaying its height.
-    percentagehybrid= ((df_hybridGHGs - df_dieselGHGs)/df_dieselGHGs)*100.0
-    pctGHGhybrid=percentagehybrid.iloc[0]
+    Input: Maximum fraction of blackouts allowed
+    
+    Output: Scenario inputs.csv and Optimisation inputs.csv updated
+    
+    """
+    filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Scenario/Scenario inputs.csv"
+    filepathopt = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Optimisation inputs.csv"
+    
+    # Set maximum blackout threshold (0.0-1.0) in scenario inputs
+    df_scenario = pd.read_csv(filepath, header=None)
+    df_scenario.iat[3, 1] = max_blackouts
+    df_scenario.to_csv(filepath, index=None, header =None)
+    
+    # Set reliability (blackout threshold) for optimisation inputs
+    df_optimisation = pd.read_csv(filepathopt, header=None)
+    df_optimisation.iat[11,1] = max_blackouts
+    df_optimisation.to_csv(filepathopt, index=None, header =None)
 
-    percentagePVBatt= ((df_PVBattGHGs - df_dieselGHGs)/df_dieselGHGs)*100.0
-    pctGHGPVBatt=percentagePVBatt.iloc[0]
+
+def sweep_performance (Systype, max_blackouts, Loadtype, accuracy, cached=False):
+    """
+    Simulate or optimise one system of a reliability sweep with its blackout threshold
     
-    def autolabel(rects):
+    Input: System type, between 'Diesel', 'Hybrid', or 'PVBatt', maximum fraction of blackouts allowed, 
+           load type and accuracy (stepsize) of the optimisation
+           Cached, if True the hybrid and PVbatt systems are optimised with cached_optimise_system(), reusing the 
+               evaluation table of previous thresholds, otherwise with optimise_system()
+    
+    Output: Simulation or optimisation files to be analysed with the *_sys_stats() function of the system 
+    
+    """
+    set_reliability (max_blackouts)
+    
+    Optimisation_Name = 'Opt_{}_Re{}_Load{}'.format(Systype, reliability_level(max_blackouts), Loadtype)
+    
+    if Systype == 'Diesel':
+        diesel_sys_performance (max_blackouts, Loadtype)
+    elif cached == True:
         
-        for rect in rects:   
+        # Optimise from the evaluation table, saved with the name of the optimisation analysed by the *_sys_stats() functions
+        if not os.path.exists(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/" + Optimisation_Name + ".csv"):
+            SysOptimisation = cached_optimise_system (Systype, Loadtype, max_blackouts, accuracy)
+            
+            if len(SysOptimisation) > 0:
+                Optimisation().save_optimisation(SysOptimisation, Optimisation_Name)
+                print('\n Cached optimisation also saved as', Optimisation_Name)
+                
+    elif Systype == 'Hybrid':
+        hybrid_sys_performance (max_blackouts, Loadtype, accuracy)
+    elif Systype == 'PVBatt':
+        PVBatt_sys_performance (max_blackouts, Loadtype, accuracy)
 
-               height = rect.get_height()                 
-                              
-               for i in range(0,4):
-                   
-                   if height == hybrid_means[i]:
-                   
-                     percentage = pctGHGhybrid[i]
-                     pctrounded = round(percentage, 0)
-                     pct=int(pctrounded)
-                                          
-                     if pct >= 0.0:
-                                                
-                        ax.annotate('+'+str(pct)+'%',
-                          xy=(rect.get_x() + rect.get_width() / 2, height),
-                          xytext=(0, 3),  # 3 points vertical offset
-                          textcoords="offset points",
-                          ha='center', va='bottom', size=8)
-                        
-                     else:
-                        ax.annotate(str(pct)+'%',
-                          xy=(rect.get_x() + rect.get_width() / 2, height),
-                          xytext=(0, -15),  # 3 points vertical offset
-                          textcoords="offset points",
-                          ha='center', va='bottom', size=8)
 
-                   elif height == PVBatt_means[i]:
-                   
-                     percentage = pctGHGPVBatt[i]
-                     pctrounded = round(percentage, 0)
-                     pct=int(pctrounded)                     
-                     
-                     if pct >= 0.0:
-                                                
-                        ax.annotate('+'+str(pct)+'%',
-                          xy=(rect.get_x() + rect.get_width() / 2, height),
-                          xytext=(0, 3),  # 3 points vertical offset
-                          textcoords="offset points",
-                          ha='center', va='bottom', size=8)
-                        
-                     else:
-                        ax.annotate(str(pct)+'%',
-                          xy=(rect.get_x() + rect.get_width() / 2, height),
-                          xytext=(0, -15),  # 3 points vertical offset
-                          textcoords="offset points",
-                          ha='center', va='bottom', size=8)                        
-               
-    # Include labels in figure
-    autolabel(rects1)
-    autolabel(rects2)
- 
-    fig.tight_layout()
+def sweep_stats (Systype, max_blackouts, Loadtype):
+    """
+    Obtain the key metrics of one system of a reliability sweep, once sweep_performance() has finished. Its figures 
+    are not rendered, see queue_figures(runs) 
+    
+    Input: System type, between 'Diesel', 'Hybrid', or 'PVBatt', maximum fraction of blackouts allowed and load type
+    
+    Output: Key_Metrics.csv and other metrics of the system saved
+            DataFrame with the key metrics
+    
+    """
+    if Systype == 'Diesel':
+        return diesel_sys_metrics (max_blackouts, Loadtype)
+    elif Systype == 'Hybrid':
+        return hybrid_sys_metrics (max_blackouts, Loadtype)
+    elif Systype == 'PVBatt':
+        return PVBatt_sys_metrics (max_blackouts, Loadtype)
 
-    # Create a directory to save the figure 
-    script_dir = os.path.dirname(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/")
-    plot_dir = os.path.join(script_dir, 'Analysis/Comparison_Re{}_Load{}/'.format(Reliability, Loadtype))
-    plot_name = 'GHGsBreakdown_Comparison_Re{}_Load{}.png'.format(Reliability, Loadtype)
+
+def queue_figures (runs):
+    """
+    Add the figures of systems to the rendering queue, to be rendered later with render_figures(max_workers) 
     
-    if not os.path.isdir(plot_dir):
-        os.makedirs(plot_dir)
+    Input: List of runs, each one (System type, maximum fraction of blackouts allowed, load type)
     
-    fig.savefig(plot_dir + plot_name,dpi=300)
-    plt.show()
+    Output: Figure_queue.csv in Analysis directory updated
+    
+    """
+    filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Analysis/Figure_queue.csv"
+    
+    if os.path.exists(filepath):
+        df_queue = pd.read_csv(filepath, dtype=str)
+    else:
+        df_queue = pd.DataFrame(columns=['System','Max blackouts','Loadtype'])
+    
+    if not os.path.isdir(os.path.dirname(filepath)):
+        os.makedirs(os.path.dirname(filepath))
+    
+    df_runs = pd.DataFrame([[Systype, str(exact_threshold(max_blackouts)), Loadtype] for Systype, max_blackouts, Loadtype in runs], columns=df_queue.columns)
+    df_queue = pd.concat([df_queue, df_runs]).drop_duplicates().reset_index(drop=True)
+    df_queue.to_csv(filepath, index=False)
 
-    print('Figure saved as ', plot_name)  
+
+def render_figures (max_workers):
+    """
+    Render the figures of all systems in the rendering queue, removing each system from the queue once rendered
+    
+    Input: Figure_queue.csv in Analysis directory, filled by queue_figures(runs)
+           Maximum number of systems rendered at the same time. With more than one, the figures are rendered 
+           by a process pool (see run_task_graph) and saved without being displayed
+    
+    Output: Figures of each system saved in the directory of its simulation or optimisation
+    
+    """
+    filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Analysis/Figure_queue.csv"
+    
+    if not os.path.exists(filepath):
+        print('\n No figures queued.')
+        return
+    
+    df_queue = pd.read_csv(filepath, dtype=str)
+    figure_functions = {'Diesel':'diesel_sys_figures', 'Hybrid':'hybrid_sys_figures', 'PVBatt':'PVBatt_sys_figures'}
+    
+    # Remove a system from the queue once its figures are saved
+    def on_complete (name, result):
+        df_queue.drop(df_queue.index[(df_queue['System'] == name[0]) & (df_queue['Max blackouts'] == name[1]) & (df_queue['Loadtype'] == name[2])], inplace=True)
+        df_queue.to_csv(filepath, index=False)
+    
+    print('\n Rendering figures of {} systems...'.format(len(df_queue)))
+    
+    if max_workers > 1:
+        
+        tasks = collections.OrderedDict()
+        
+        for Systype, threshold, Loadtype in df_queue.itertuples(index=False):
+            tasks[(Systype, threshold, Loadtype)] = {'Function':figure_functions[Systype], 'Args':(float(threshold), Loadtype), 'Workspace':None, 'Depends':[]}
+        
+        run_task_graph (tasks, max_workers, on_complete)
+        
+    else:
+        
+        for Systype, threshold, Loadtype in list(df_queue.itertuples(index=False)):
+            globals()[figure_functions[Systype]](float(threshold), Loadtype)
+            on_complete ((Systype, threshold, Loadtype), None)
 
 
-# =============================================================================
-#                           Sensitivity analysis
-# =============================================================================   
-#
+def batch_stats (runs, max_workers, render):
+    """
+    Obtain and save the metrics of a list of systems at the same time, queueing their figures for rendering
+    
+    PRE-REQUISITE: Simulate or optimise each system, i.e.: with sweep_performance(Systype, max_blackouts, Loadtype, accuracy)
+    
+    Input: List of runs, each one (System type, maximum fraction of blackouts allowed, load type)
+           Maximum number of systems processed at the same time by a process pool (see run_task_graph)
+           True to render the queued figures once all metrics are saved, False to leave them in the queue 
+               to be rendered later with render_figures(max_workers)
+        
+    Output: Key, financial and environmental metrics of each system saved and added to the results warehouse
+            DataFrame with one row per system with its key metrics
     
-def LCUE_sensitivity (Loadtype, initial_max_blackout, final_max_blackout, stepsize, accuracy):
     """
-    Compare LCUE for diesel/hybrid/PVbatt systems for different reliability thresholds 
+    tasks = collections.OrderedDict()
+    
+    for Systype, max_blackouts, Loadtype in runs:
+        tasks[(Systype, str(exact_threshold(max_blackouts)), Loadtype)] = {'Function':'sweep_stats', 'Args':(Systype, float(max_blackouts), Loadtype), 'Workspace':None, 'Depends':[]}
+    
+    # Queue the figures of each system as soon as its metrics are saved
+    def on_complete (name, result):
+        queue_figures ([name])
+    
+    if max_workers > 1:
+        results = run_task_graph (tasks, max_workers, on_complete)
+    else:
+        results = {}
+        for name, task in tasks.items():
+            results[name] = sweep_stats (*task['Args'])
+            on_complete (name, results[name])
+    
+    # Key metrics of all systems processed
+    df_stats = pd.DataFrame(columns=['System','Reliability','Loadtype'])
+    
+    for name in [name for name in tasks if name in results]:
+        df_system = pd.concat([pd.DataFrame([[name[0], reliability_level(name[1]), name[2]]], columns=df_stats.columns[:3]), results[name].reset_index(drop=True).iloc[:1]], axis=1)
+        df_stats = df_system if len(df_stats) == 0 else pd.concat([df_stats, df_system], ignore_index=True)
+    
+    ingest_results ()
+    
+    if render:
+        render_figures (max_workers)
+    
+    return df_stats
+
+
+def reliability_sweep (Loadtype, initial_max_blackout, final_max_blackout, stepsize, accuracy, max_workers=1, cached=False):
+    """
+    Obtain the key metrics of diesel/hybrid/PVbatt systems for different reliability thresholds 
     
     Input: Minimum and maximum reliability thresholds for analysis (0-1), stepsize and load type
-        
-    Output: Display LCUE of each system vs reliability for "stepsize" resolution in reliability levels
-            Save .csv files and .png graphs in Analysis/Sensitivity Analysis directory       
+           Accuracy (stepsize) of the hybrid and PVbatt optimisations
+           Maximum number of systems simulated at the same time (1 by default). With more than one, each system 
+           is simulated in its own workspace by a process pool (see run_task_graph)
+           Cached, if True the hybrid and PVbatt systems are optimised with cached_optimise_system(), so that the 
+               systems evaluated for one threshold are reused by the others (see sweep_performance)
+        
+    Output: Dataframe with one row per reliability level and system type with blackout threshold, renewables fraction, 
+            LCUE, emissions intensity, cumulative cost and cumulative GHGs of the system
+            Save it as Reliability_sweep_Load*.csv in Analysis/Sensitivity Analysis directory, where the points 
+            completed in previous sweeps with the current inputs are reused, as recorded in Sweep_manifest.csv. The files 
+            of points obtained with previous inputs are moved to the Stale/{inputs hash} directory of their saved 
+            simulations or optimisations and simulated again
+            Figures of the systems simulated are queued, to be rendered with render_figures(max_workers)
     
     """  
-    # Define initial and final reliability levels for sensitivity analysis
-    initial_Reliability= int((1.0 - initial_max_blackout)*100.0)
-    final_Reliability= int((1.0 - final_max_blackout)*100.0)
+    # Open the results table of previous sweeps for the load profile and the manifest of completed points, if any
+    script_dir = os.path.dirname(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Analysis/Sensitivity Analysis/")
     
-    # Open optimisation and scenario inputs file
-    filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Scenario/Scenario inputs.csv"
-                
-    # Locate and open Optimisation inputs file
-    filepathopt = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Optimisation inputs.csv"
+    if not os.path.isdir(script_dir):
+          os.makedirs(script_dir)
+          
+    filepathsweep = os.path.join(script_dir, 'Reliability_sweep_Load{}.csv'.format(Loadtype))
+    filepathmanifest = os.path.join(script_dir, 'Sweep_manifest.csv')
+    
+    Metrics = ['Renewables fraction', 'LCUE ($/kWh)', 'Emissions intensity (gCO2/kWh)', 'Cumulative cost ($)', 'Cumulative GHGs (kgCO2eq)']
     
-    # Create dataframe for LCUE vs Reliability data for diesel, hybrid and PVBatt systems:
-    df_LCUEvsRe = pd.DataFrame(columns=['Reliability','LCUE Diesel System', 'LCUE Hybrid System', 'LCUE PV-Batt System'])
+    if os.path.exists(filepathsweep):
+        df_sweep = pd.read_csv(filepathsweep, dtype={'Max blackouts':str})
+    else:
+        df_sweep = pd.DataFrame(columns=['Max blackouts','Reliability','System'] + Metrics)
     
-    # Initialise counter to locate the reliabily results 
-    count=0
+    # Blackout threshold of the results of previous versions of the table, keyed by reliability level only
+    if 'Max blackouts' not in df_sweep.columns:
+        df_sweep.insert(0, 'Max blackouts', [str(exact_threshold((100 - Decimal(str(Reliability))) / 100)) for Reliability in df_sweep['Reliability']])
     
-    # For each realiability value in the range specified:
-    for blackouts in np.arange(final_max_blackout, initial_max_blackout+0.01, stepsize):
+    if os.path.exists(filepathmanifest):
+        df_manifest = pd.read_csv(filepathmanifest, dtype=str)
+    else:
+        df_manifest = pd.DataFrame(columns=['Max blackouts','System','Loadtype','Input hash'])
+    
+    # Hash of the current inputs of each type of system
+    hashes = {'Diesel':get_sweep_inputs_hash(Loadtype, None, False), 'Hybrid':get_sweep_inputs_hash(Loadtype, accuracy, cached), 
+              'PVBatt':get_sweep_inputs_hash(Loadtype, accuracy, cached)}
+    
+    # Key metrics file of each type of system
+    types = collections.OrderedDict([
+            ('Diesel', '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV0_Storage0_Diesel_Re{}_Load{}/Key_Metrics.csv'),
+            ('Hybrid', '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_Hybrid_Re{}_Load{}/Key_Metrics.csv'),
+            ('PVBatt', '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_PVBatt_Re{}_Load{}/Key_Metrics.csv')])
+    
+    # Read the key metrics file of a system once, keep all metrics of the system in the results table 
+    # and record the point as completed with the current inputs
+    def record_metrics (Systype, threshold):
+        Reliability = reliability_level(threshold)
+        df_metrics = pd.read_csv(self.CLOVER_filepath + types[Systype].format(Reliability, Loadtype))
         
-        Reliability= int((1 - blackouts)*100)
+        df_sweep.drop(df_sweep.index[(df_sweep['Max blackouts'] == str(threshold)) & (df_sweep['System'] == Systype)], inplace=True)
+        df_sweep.reset_index(drop=True, inplace=True)
+        df_sweep.loc[len(df_sweep)] = [str(threshold), Reliability, Systype] + list(df_metrics[Metrics].iloc[0])
+        df_sweep.to_csv(filepathsweep, index=False)
         
-        # Substitute new values in Scenario  Inputs.csv file for simulation
-        df_scenario = pd.read_csv(filepath, header=None)
-                
-        # Substitute new values in Scenario  Inputs.csv file for simulation
-        df_scenario.to_csv(filepath, index=None, header =None)
+        df_manifest.drop(df_manifest.index[(df_manifest['Max blackouts'] == str(threshold)) & (df_manifest['System'] == Systype) 
+                                           & (df_manifest['Loadtype'] == Loadtype)], inplace=True)
+        df_manifest.reset_index(drop=True, inplace=True)
+        df_manifest.loc[len(df_manifest)] = [str(threshold), Systype, Loadtype, hashes[Systype]]
+        df_manifest.to_csv(filepathmanifest, index=False)
         
-        # Substitute new values in Optimisation inputs.csv file for optimisation
-        df_optimisation = pd.read_csv(filepathopt, header=None)                   
-        df_optimisation.to_csv(filepathopt, index=None, header =None)
+        print('\nData for {} system with Reliability {}% saved.'.format(Systype, Reliability))
+    
+    # Move the saved files of a system obtained with previous inputs to the Stale directory of their inputs hash, 
+    # so that it is simulated again with the current inputs
+    def archive_system (Systype, threshold, stale_hash):
+        system_dir = os.path.dirname(self.CLOVER_filepath + types[Systype].format(reliability_level(threshold), Loadtype))
+        saved_dir, Name = os.path.split(system_dir)
+        filenames = [filename for filename in os.listdir(saved_dir) if filename == Name or filename.startswith(Name + '.') or filename.startswith(Name + '_')]
         
-        # Set maximum blackout threshold (0.0-1.0) in scenario inputs
-        if df_scenario.iat[3, 1] != 1.0 - Reliability/100 :
-               df_scenario.iat[3, 1] = 1.0 - Reliability/100
-               
-        # Set reliability (blackout threshold) for optimisation inputs
-        df_optimisation.iat[11,1] = 1.0 - Reliability/100
-                                                                             
-        # For each type of system        
-        types = ['diesel','hybrid','PVBatt']        
-        for Systype in types:
+        # Files archived before with the same inputs are kept in a numbered directory
+        stale_dir = os.path.join(saved_dir, 'Stale', stale_hash)
+        copy = 1
+        
+        while any(os.path.exists(os.path.join(stale_dir, filename)) for filename in filenames):
+            stale_dir = os.path.join(saved_dir, 'Stale', '{}_{}'.format(stale_hash, copy))
+            copy += 1
+        
+        if not os.path.isdir(stale_dir):
+            os.makedirs(stale_dir)
+        
+        for filename in filenames:
+            shutil.move(os.path.join(saved_dir, filename), os.path.join(stale_dir, filename))
+        
+        # The results of the stale point are no longer reported
+        df_sweep.drop(df_sweep.index[(df_sweep['Max blackouts'] == str(threshold)) & (df_sweep['System'] == Systype)], inplace=True)
+        df_sweep.reset_index(drop=True, inplace=True)
+        df_sweep.to_csv(filepathsweep, index=False)
+        
+        print('\n Files of {} system with Reliability {}% obtained with previous inputs moved to {}'.format(Systype, reliability_level(threshold), stale_dir))
+    
+    thresholds = blackout_thresholds(initial_max_blackout, final_max_blackout, stepsize)
+    tasks = collections.OrderedDict()
+    
+    # For each realiability value in the range specified:
+    for threshold in thresholds:
+        
+        Reliability = reliability_level(threshold)
+        blackouts = float(threshold)
+        
+        # Points completed with the current inputs, and points completed with previous inputs
+        df_point = df_manifest[(df_manifest['Max blackouts'] == str(threshold)) & (df_manifest['Loadtype'] == Loadtype)]
+        current = np.array([hashes.get(Systype) == point_hash for Systype, point_hash in zip(df_point['System'], df_point['Input hash'])], dtype=bool)
+        done = set(df_point.loc[current, 'System']) & set(df_sweep.loc[df_sweep['Max blackouts'] == str(threshold), 'System'])
+        outdated = dict(zip(df_point.loc[~current, 'System'], df_point.loc[~current, 'Input hash']))
+        
+        for Systype in [Systype for Systype in types if Systype not in done]:
             
-            # Check if simulation for blackout level exists already, if not, performs simulation for diesel, hybrid and/or PVBatt
-            if Systype == 'diesel':
+            if Systype in outdated:
                 
-                check = os.path.exists(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV0_Storage0_{}_Re{}_LoadInstitutionalBase.csv".format(Systype, Reliability, Loadtype) ) 
-    
-                if check == False :
+                print('\n Simulation for {} system with Reliability {}% obtained with previous inputs is stale, simulating it again...'.format(Systype, Reliability))
+                archive_system (Systype, threshold, outdated[Systype])
+            
+            # Check if results for blackout level exist already, if not, performs simulation for the system
+            if os.path.exists(self.CLOVER_filepath + types[Systype].format(Reliability, Loadtype)):
                 
-                    print('\n Simulation for {} system with Reliability {}% doesn\'t exist, simulation in progress...'.format(Systype, Reliability))
-        
-                    # Simulate system for that reliability level and save results              
-                    diesel_sys_performance (blackouts, Loadtype)
-                    diesel_sys_stats (blackouts, Loadtype)
-                    
-                else:
+                print('\n Simulation for {} system with Reliability {}% found, continuing with the analysis ...'.format(Systype, Reliability))
+                record_metrics (Systype, threshold)
                 
-                   print('\n Simulation for {} system with Reliability {}% found, continuing with the analysis ...'.format(Systype, Reliability))
+            elif max_workers > 1:
                 
-            elif Systype == 'hybrid':
+                # Simulation and statistics of the system, in a workspace of its own
+                workspace = self.CLOVER_filepath + '/Workspaces/{}_Re{}_Load{}'.format(Systype, Reliability, Loadtype)
                 
-                check = os.path.exists(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}.csv".format(Systype, Reliability, Loadtype) ) 
-    
-                if check == False :
+                tasks[(Systype, threshold, 'performance')] = {'Function':'sweep_performance', 'Args':(Systype, blackouts, Loadtype, accuracy, cached), 'Workspace':workspace, 'Depends':[]}
+                tasks[(Systype, threshold, 'stats')] = {'Function':'sweep_stats', 'Args':(Systype, blackouts, Loadtype), 'Workspace':workspace, 'Depends':[(Systype, threshold, 'performance')]}
                 
-                    print('\n Simulation for {} system with Reliability {}% doesn\'t exist, simulation in progress...'.format(Systype, Reliability))
-        
-                    # Simulate system for that reliability level and save results                                   
-                    hybrid_sys_performance (blackouts, Loadtype, accuracy)
-                    hybrid_sys_stats (blackouts, Loadtype)
-                    
-                else:
+            else:
                 
-                   print('\n Simulation for {} system with Reliability {}% found, continuing with the analysis ...'.format(Systype, Reliability))
-                    
-            elif Systype == 'PVBatt':
+                print('\n Simulation for {} system with Reliability {}% doesn\'t exist, simulation in progress...'.format(Systype, Reliability))
                 
-                check = os.path.exists(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}.csv".format(Systype, Reliability, Loadtype) ) 
+                # Simulate system for that reliability level and save results 
+                sweep_performance (Systype, blackouts, Loadtype, accuracy, cached)
+                sweep_stats (Systype, blackouts, Loadtype)
+                record_metrics (Systype, threshold)
+                queue_figures ([(Systype, threshold, Loadtype)])
+    
+    # Simulate the remaining systems concurrently, saving each system in the results table as it finishes
+    if len(tasks) > 0:
+        
+        print('\n Simulating {} systems with up to {} processes...'.format(len(tasks)//2, max_workers))
+        
+        for (Systype, threshold, step), task in tasks.items():
+            if step == 'performance':
+                create_workspace (os.path.basename(task['Workspace']))
+        
+        def on_complete (name, result):
+            if name[2] == 'stats':
+                collect_workspace (tasks[name]['Workspace'])
+                record_metrics (name[0], name[1])
+                queue_figures ([(name[0], name[1], Loadtype)])
+        
+        run_task_graph (tasks, max_workers, on_complete)
+    
+    # Return the points of the sweep requested, ordered by reliability
+    df_sweep = df_sweep[df_sweep['Max blackouts'].isin([str(threshold) for threshold in thresholds])]
+    df_sweep = df_sweep.sort_values(['Reliability','System']).reset_index(drop=True)
+    
+    return df_sweep
+
+
+def sweep_metric (df_sweep, Metric, Name):
+    """
+    Arrange one metric of the reliability sweep by system type 
+    
+    Input: Dataframe resulting of reliability_sweep(), metric to arrange and name used for its columns
+        
+    Output: Dataframe with a column of reliability and a column of the metric for each system type
+    
+    """  
+    df_metric = df_sweep.pivot(index='Reliability', columns='System', values=Metric)
+    df_metric = df_metric[['Diesel','Hybrid','PVBatt']].astype(float).reset_index()
+    df_metric.columns = ['Reliability','{} Diesel System'.format(Name), '{} Hybrid System'.format(Name), '{} PV-Batt System'.format(Name)]
+    
+    return df_metric
+    
+
+def LCUE_sensitivity (Loadtype, initial_max_blackout, final_max_blackout, stepsize, accuracy, max_workers=1, cached=False):
+    """
+    Compare LCUE for diesel/hybrid/PVbatt systems for different reliability thresholds 
     
-                if check == False :
-                
-                    print('\n Simulation for {} system with Reliability {}% doesn\'t exist, simulation in progress...'.format(Systype, Reliability))
-        
-                    # Simulate system for that reliability level and save results                                   
-                    PVBatt_sys_performance (blackouts, Loadtype, accuracy)
-                    PVBatt_sys_stats (blackouts, Loadtype)
-                        
-                    print('\n Simulation for {} system with Reliability {}%finished, continuig with the evaluation ...'.format(Systype, Reliability))
-        
-                else:
-                
-                   print('\n Simulation for {} system with Reliability {}% found, continuing with the analysis ...'.format(Systype, Reliability))
+    Input: Minimum and maximum reliability thresholds for analysis (0-1), stepsize and load type
+           Accuracy (stepsize) of the optimisations and maximum number of systems simulated at the same time (1 by default)
+           Cached, if True the hybrid and PVbatt systems reuse the evaluation table between thresholds (see reliability_sweep)
         
-        # Read the optimisation files existent or created
-        df_dieselmetrics = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV0_Storage0_Diesel_Re{}_Load{}/Key_Metrics.csv'.format(Reliability, Loadtype))
-        df_hybridmetrics = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_Hybrid_Re{}_Load{}/Key_Metrics.csv'.format(Reliability, Loadtype))
-        df_PVBattmetrics = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_PVBatt_Re{}_Load{}/Key_Metrics.csv'.format(Reliability, Loadtype))
-         
-        # Locate the corresponding LCUE values of each system type for each reliability level
-        df_LCUEvsRe.loc[count] = [Reliability, df_dieselmetrics.iat[0,1], df_hybridmetrics.iat[0,1],  df_PVBattmetrics.iat[0,1]] 
-                             
-        print('\nData for Reliability {}% saved.'.format(Reliability))
-  
-        # Add to the counter to locate results in the corresponding place      
-        count +=1
+    Output: Display LCUE of each system vs reliability for "stepsize" resolution in reliability levels
+            Save .csv files and .png graphs in Analysis/Sensitivity Analysis directory       
+    
+    """  
+    # Define initial and final reliability levels for sensitivity analysis
+    initial_Reliability= reliability_level(initial_max_blackout)
+    final_Reliability= reliability_level(final_max_blackout)
+    
+    # Obtain LCUE vs Reliability data for diesel, hybrid and PVBatt systems from the reliability sweep:
+    df_sweep = reliability_sweep (Loadtype, initial_max_blackout, final_max_blackout, stepsize, accuracy, max_workers, cached)
+    df_LCUEvsRe = sweep_metric (df_sweep, 'LCUE ($/kWh)', 'LCUE')
     
     # Save Reliability vs LCUE data on a csv file:
     
@@ -3601,16 +6500,10 @@ def LCUE_sensitivity (Loadtype, initial_max_blackout, final_max_blackout, stepsi
     df_LCUEvsRe.to_csv(filepath)
             
     # Plot the graphic of Reliability vs LCUE for diesel, hybrid, PVbatt sys:
-    ReliabilityX=df_LCUEvsRe.loc[:,'Reliability']
-    ReliabilityX[6]=97
-    A=sorted(ReliabilityX)
-    WW=(df_LCUEvsRe.loc[:,'LCUE PV-Batt System'])
-    B=sorted(WW)
-    
     fig, ax = plt.subplots()   
     ax.plot(df_LCUEvsRe.loc[:,'Reliability'], df_LCUEvsRe.loc[:,'LCUE Diesel System'], '-', linewidth=3, color="lightcoral")
     ax.plot(df_LCUEvsRe.loc[:,'Reliability'], df_LCUEvsRe.loc[:,'LCUE Hybrid System'], '-', linewidth=3, color="lightskyblue")
-    ax.plot(A, B, '-', linewidth=3, color="yellowgreen")
+    ax.plot(df_LCUEvsRe.loc[:,'Reliability'], df_LCUEvsRe.loc[:,'LCUE PV-Batt System'], '-', linewidth=3, color="yellowgreen")
     plt.xlabel("System reliability (%)", fontsize=15)
     plt.ylabel("LCUE ($/kWh)", fontsize=15)
     ax.grid()
@@ -3628,120 +6521,25 @@ def LCUE_sensitivity (Loadtype, initial_max_blackout, final_max_blackout, stepsi
 
     print('Figure saved as', plot_name)     
     
-def GHG_sensitivity (Loadtype, initial_max_blackout, final_max_blackout, stepsize, accuracy):
+def GHG_sensitivity (Loadtype, initial_max_blackout, final_max_blackout, stepsize, accuracy, max_workers=1, cached=False):
     """
     Compare GHGs for diesel/hybrid/PVbatt systems for different reliability thresholds 
     
     Input: Minimum and maximum reliability thresholds for analysis (0-1), stepsize and load type
+           Accuracy (stepsize) of the optimisations and maximum number of systems simulated at the same time (1 by default)
+           Cached, if True the hybrid and PVbatt systems reuse the evaluation table between thresholds (see reliability_sweep)
         
     Output: Display GHGs emissions intensity of each system vs reliability for "stepsize" resolution in reliability levels
             Save .csv files and .png graphs in Analysis/Sensitivity Analysis directory       
     
     """  
     # Define initial and final reliability levels for sensitivity analysis
-    initial_Reliability= int((1 - initial_max_blackout)*100.0)
-    final_Reliability= int((1 - final_max_blackout)*100.0)
-    
-    # Open optimisation and scenario inputs file
-    filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Scenario/Scenario inputs.csv"
-                
-    # Locate and open Optimisation inputs file
-    filepathopt = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Optimisation inputs.csv"
-    
-    # Create dataframe for LCUE vs Reliability data for diesel, hybrid and PVBatt systems:
-    df_GHGvsRe = pd.DataFrame(columns=['Reliability','GHG Diesel System', 'GHG Hybrid System', 'GHG PV-Batt System'])
-    
-    # Initialise counter to locate the sensitivity results
-    count=0
-    
-    # For each realiability value in the range specified: 
-    for blackouts in np.arange(final_max_blackout, initial_max_blackout+0.01, stepsize):
-        
-        Reliability= int((1.0 - blackouts)*100.0)
-        df_scenario = pd.read_csv(filepath, header=None)               
-        df_optimisation = pd.read_csv(filepathopt, header=None)        
-        
-        # Set maximum blackout threshold (0.0-1.0) in scenario inputs
-        if df_scenario.iat[3, 1] != 1.0 - Reliability/100.0 :
-               df_scenario.iat[3, 1] = 1.0 - Reliability/100.0
-               
-        # Substitute new values in Scenario  Inputs.csv file for simulation
-        df_scenario.to_csv(filepath, index=None, header =None)
-               
-        # Set reliability (blackout threshold) for optimisation inputs
-        df_optimisation.iat[11,1] = 1.0 - Reliability/100.0
-        
-        # Substitute new values in Optimisation inputs.csv file for optimisation                  
-        df_optimisation.to_csv(filepathopt, index=None, header =None)
-                                                                              
-        # For each type of system        
-        types = ['diesel','hybrid','PVBatt']       
-        for Systype in types:
-            
-            # Check if simulation for blackout level exists already, if not, performs simulation for diesel, hybrid and/or PVBatt
-
-            if Systype == 'diesel':
-                
-                check = os.path.exists(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV0_Storage0_{}_Re{}_LoadInstitutionalBase.csv".format(Systype, Reliability, Loadtype) ) 
-    
-                if check == False :
-                
-                    print('\n Simulation for {} system with Reliability {}% doesn\'t exist, simulation in progress...'.format(Systype, Reliability))
-        
-                    # Simulate system for that reliability level and save results           
-                    diesel_sys_performance (blackouts, Loadtype)
-                    diesel_sys_stats (blackouts, Loadtype)
-                    
-                else:
-                
-                   print('\n Simulation for {} system with Reliability {}% found, continuing with the analysis ...'.format(Systype, Reliability))
-                            
-            elif Systype == 'hybrid':
-                
-                check = os.path.exists(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}.csv".format(Systype, Reliability, Loadtype) ) 
-    
-                if check == False :
-                
-                    print('\n Simulation for {} system with Reliability {}% doesn\'t exist, simulation in progress...'.format(Systype, Reliability))
-        
-                    # Simulate system for that reliability level and save results
-                    hybrid_sys_performance (blackouts, Loadtype, accuracy)
-                    hybrid_sys_stats (blackouts, Loadtype)
-                    
-                else:
-                
-                   print('\n Simulation for {} system with Reliability {}% found, continuing with the analysis ...'.format(Systype, Reliability))
-                    
-            elif Systype == 'PVBatt':
-                
-                check = os.path.exists(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}.csv".format(Systype, Reliability, Loadtype) ) 
+    initial_Reliability= reliability_level(initial_max_blackout)
+    final_Reliability= reliability_level(final_max_blackout)
     
-                if check == False :
-                
-                    print('\n Simulation for {} system with Reliability {}% doesn\'t exist, simulation in progress...'.format(Systype, Reliability))
-        
-                    # Simulate system for that reliability level and save results                                  
-                    PVBatt_sys_performance (blackouts, Loadtype, accuracy)
-                    PVBatt_sys_stats (blackouts, Loadtype)
-                        
-                    print('\n Simulation for {} system with Reliability {}%finished, continuig with the evaluation ...'.format(Systype, Reliability))
-        
-                else:
-                
-                   print('\n Simulation for {} system with Reliability {}% found, continuing with the analysis ...'.format(Systype, Reliability))
-
-        # Read the optimisation files existent or created              
-        df_dieselmetrics = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV0_Storage0_Diesel_Re{}_Load{}/Key_Metrics.csv'.format(Reliability, Loadtype))
-        df_hybridmetrics = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_Hybrid_Re{}_Load{}/Key_Metrics.csv'.format(Reliability, Loadtype))
-        df_PVBattmetrics = pd.read_csv(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_PVBatt_Re{}_Load{}/Key_Metrics.csv'.format(Reliability, Loadtype))
- 
-        # Locate the corresponding emission intensity values of each system type for each reliability level           
-        df_GHGvsRe.loc[count] = [Reliability, df_dieselmetrics.iat[0,2], df_hybridmetrics.iat[0,2],  df_PVBattmetrics.iat[0,2]] 
-                             
-        print('\nData for Reliability {}% saved.'.format(Reliability))
-
-        # Add to the counter to locate results in the corresponding place              
-        count +=1
+    # Obtain emissions intensity vs Reliability data for diesel, hybrid and PVBatt systems from the reliability sweep:
+    df_sweep = reliability_sweep (Loadtype, initial_max_blackout, final_max_blackout, stepsize, accuracy, max_workers, cached)
+    df_GHGvsRe = sweep_metric (df_sweep, 'Emissions intensity (gCO2/kWh)', 'GHG')
     
     # Save Reliability vs LCUE data on a csv file:
     
@@ -3779,34 +6577,478 @@ def GHG_sensitivity (Loadtype, initial_max_blackout, final_max_blackout, stepsiz
     print('Figure saved as', plot_name)     
     
     
-def renewables_sensitivity (Loadtype, max_blackouts, initial_renewablesfraction, final_renewablesfraction, stepsize): 
+def sample_appraisal (df_aggregates, feasible, parameters, X):
+    """
+    Appraise the systems for each sample of financial and GHG inputs, keeping the results of the best design of each sample
+    
+    Input: DataFrame of yearly energy flows of the designs considered, as obtained with get_energy_aggregates()
+               or get_optimisation_aggregates()
+           List of designs meeting the blackout threshold, from which the lowest LCUE design of each sample is kept
+           List of names of the financial and GHG inputs sampled
+           Array of samples, one row per sample and one column per input 
+           
+    Output: Dictionary with the LCUE, cumulative cost and emissions intensity of each sample
+    
+    """
+    finance, ghgs = get_impact_inputs()
+    
+    df_aggregates = df_aggregates[df_aggregates['Design'].isin(feasible)]
+    outputs = {'LCUE ($/kWh)':[], 'Cumulative cost ($)':[], 'Emissions intensity (gCO2/kWh)':[]}
+    
+    # Appraise the samples in chunks to keep the memory used bounded
+    for chunk in range(0, len(X), 2000):
+        
+        for n, name in enumerate(parameters):
+            if name in finance:
+                finance[name] = X[chunk:chunk+2000, n]
+            elif name in ghgs:
+                ghgs[name] = X[chunk:chunk+2000, n]
+            else:
+                raise KeyError('{} is not a financial or GHG input'.format(name))
+        
+        results = reappraise_systems(df_aggregates, finance, ghgs)
+        
+        # Best design of each sample
+        best = np.argmin(results['LCUE ($/kWh)'], axis=1)
+        
+        for output in outputs:
+            outputs[output].append(results[output][np.arange(len(best)), best])
+    
+    return {output: np.concatenate(values) for output, values in outputs.items()}
+
+
+def global_sensitivity (Systype, Loadtype, max_blackouts, parameters, samples, method, reoptimise):
+    """
+    Obtain the global sensitivity of LCUE, cumulative cost and emissions intensity to the financial and GHG inputs,
+    re-appraising cached systems for every sample of the inputs
+    
+    PRE-REQUISITE: Run hybrid_sys_performance() or PVBatt_sys_performance() for the optimal system, or evaluate 
+                   the grid of systems over the whole scenario (i.e. with renewables_fraction_sweep()) when reoptimise is True
+    
+    Input: System type, between 'Diesel', 'Hybrid', or 'PVBatt'
+           Load profile for the selected scenario, between 'Mix1', 'Mix2', 'Mix2B', 'Mix1Adv', 'Mix2Adv', 'Mix1to2B'
+           Maximum fraction of blackouts allowed
+           Dictionary with the financial and GHG inputs analysed and their range, i.e.: {'Discount rate':(0.05,0.15)}
+           Number of base samples (Sobol) or trajectories (Morris)
+           Method, between 'Sobol' (Saltelli design, first-order and total indices) and 'Morris' (elementary effects)
+           Reoptimise, if True the lowest LCUE system of the cached evaluation grid is selected for every sample, 
+               otherwise the saved optimisation of the system is re-appraised
+    
+    Output: DataFrame with the sensitivity indices of each input for each output 
+            Save .csv file and .png graph in Analysis/Sensitivity Analysis directory
+    
+    """
+    Reliability = reliability_level(max_blackouts)
+    
+    # Designs re-appraised for each sample
+    if reoptimise == True:
+        
+        PV_sizes, storage_sizes, Scenario_length, Iteration_length = get_design_grid(1)
+        df_aggregates = open_aggregates_table(Systype, Loadtype)
+        
+        df_evaluations = open_evaluation_table(Systype, Loadtype, 0, Scenario_length)
+        df_evaluations = df_evaluations[df_evaluations['Blackouts'] <= max_blackouts]
+        feasible = ['PV{}_Storage{}_0to{}'.format(PV, storage, Scenario_length) for PV, storage in zip(df_evaluations['Candidate PV size'], df_evaluations['Candidate storage size'])]
+        
+    else:
+        
+        Optimisation_Name = 'Opt_{}_Re{}_Load{}'.format(Systype, Reliability, Loadtype)
+        df_aggregates = get_optimisation_aggregates(Optimisation_Name, Optimisation_Name)
+        feasible = [Optimisation_Name]
+    
+    print('\n Re-appraising {} designs for each sample...'.format(len(set(feasible) & set(df_aggregates['Design']))))
+    
+    names = list(parameters)
+    k = len(names)
+    low = np.array([parameters[name][0] for name in names], dtype=float)
+    high = np.array([parameters[name][1] for name in names], dtype=float)
+    
+    rng = np.random.default_rng(0)
+    
+    if method == 'Sobol':
+        
+        # Saltelli design: two independent sample matrices and k matrices with one column of the second one
+        A = rng.random((samples, k))
+        B = rng.random((samples, k))
+        AB = np.repeat(A[np.newaxis], k, axis=0)
+        AB[np.arange(k), :, np.arange(k)] = B.T
+        
+        X = np.concatenate([A, B, AB.reshape(-1, k)])
+        outputs = sample_appraisal(df_aggregates, feasible, names, low + X * (high - low))
+        
+        df_indices = pd.DataFrame({'Parameter':names})
+        
+        for output, Y in outputs.items():
+            
+            # Outputs centred on their mean, reducing the error of the estimators
+            Y = Y - np.mean(Y[:2*samples])
+            Y_A, Y_B, Y_AB = Y[:samples], Y[samples:2*samples], Y[2*samples:].reshape(k, samples)
+            variance = np.var(Y[:2*samples])
+            
+            # First-order (Saltelli 2010) and total (Jansen) indices
+            df_indices[output + ' S1'] = np.mean(Y_B * (Y_AB - Y_A), axis=1) / variance
+            df_indices[output + ' ST'] = 0.5 * np.mean((Y_A - Y_AB)**2, axis=1) / variance
+            
+        plotted = ['LCUE ($/kWh) S1', 'LCUE ($/kWh) ST']
+        
+    elif method == 'Morris':
+        
+        # Trajectories of one-at-a-time steps over a grid of 4 levels
+        levels = 4
+        delta = levels / (2.0 * (levels - 1))
+        
+        start = rng.integers(0, levels // 2, (samples, k)) / (levels - 1.0)
+        order = np.argsort(rng.random((samples, k)), axis=1)
+        direction = rng.choice([-1.0, 1.0], (samples, k))
+        start = np.where(direction < 0, start + delta, start)
+        
+        X = np.repeat(start[:, np.newaxis, :], k + 1, axis=1)
+        for step in range(k):
+            X[np.arange(samples), step + 1:, order[:, step]] += (direction * delta)[np.arange(samples), order[:, step]][:, np.newaxis]
+        
+        outputs = sample_appraisal(df_aggregates, feasible, names, low + X.reshape(-1, k) * (high - low))
+        
+        df_indices = pd.DataFrame({'Parameter':names})
+        
+        for output, Y in outputs.items():
+            
+            # Elementary effect of each step, assigned to the input changed
+            Y = Y.reshape(samples, k + 1)
+            effects = np.zeros((samples, k))
+            effects[np.arange(samples)[:, np.newaxis], order] = np.diff(Y, axis=1) / (direction[np.arange(samples)[:, np.newaxis], order] * delta)
+            
+            df_indices[output + ' mu*'] = np.mean(np.abs(effects), axis=0)
+            df_indices[output + ' sigma'] = np.std(effects, axis=0)
+        
+        plotted = ['LCUE ($/kWh) mu*', 'LCUE ($/kWh) sigma']
+    
+    print('\n {} samples re-appraised.'.format(len(X)))
+    
+    # Create a directory with the name of the data and save it
+    script_dir = os.path.dirname(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Analysis/Sensitivity Analysis/")
+    plot_dir = os.path.join(script_dir, 'Global_sensitivity_{}_{}_Re{}_Load{}/'.format(method, Systype, Reliability, Loadtype))
+    
+    if not os.path.isdir(plot_dir):
+          os.makedirs(plot_dir)
+    
+    df_indices.to_csv(plot_dir + 'Global_sensitivity.csv', index=None)
+    
+    # Plot the indices of LCUE for each input
+    fig, ax = plt.subplots()
+    df_indices.set_index('Parameter')[plotted].plot.barh(ax=ax, color=mypalet[:2])
+    plt.xlabel("Sensitivity of LCUE", fontsize=15)
+    plt.ylabel("")
+    ax.grid()
+    ax.legend([label.split(' ')[-1] for label in plotted], fontsize=12, loc='lower right')
+    
+    # Save graph in corresponding Sensitivity Analysis directory
+    plot_name = "LCUE_Global_sensitivity_{}_{}_Re{}_Load{}.png".format(method, Systype, Reliability, Loadtype)
+    fig.savefig(plot_dir + plot_name, dpi=300, bbox_inches='tight')
+    plt.show()
+    
+    print('Figure saved as', plot_name)
+    
+    return df_indices
+    
+    
+def month_codes (hours):
+    """
+    Obtain the month of each hour of the simulation, with years of 365 days as simulated by CLOVER
+    
+    Input: Array of hours since the start of the simulation
+    
+    Output: Array with the month of each hour, counted from the start of the simulation (0 for January of the first year)
+    
+    """
+    month_ends = np.cumsum([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+    
+    day = (hours // 24) % 365
+    
+    return 12 * (hours // 8760) + np.searchsorted(month_ends, day, side='right')
+
+
+def fuel_price_sweep (Simulation_Names, trajectories):
+    """
+    Obtain the LCUE of simulated systems for a batch of diesel fuel price trajectories, and the ranking of systems
+    for each trajectory, recomputing the diesel cost from the hourly fuel usage without simulating again
+    
+    PRE-REQUISITE: Simulate the compared systems with simulate_system(PV_kWp, storage_kWh, Systype, Loadtype)
+    
+    Input: List of names of the saved simulations compared, i.e.: 'Sim_PV0_Storage0_Diesel_Re95_LoadMix1'
+           Array of fuel price trajectories ($/litre), one row per trajectory and one column per year or per month 
+               of the simulation
+    
+    Output: DataFrame with the mean and percentiles 5, 50 and 95 of LCUE of each system over the trajectories, 
+            and the fraction of trajectories in which each system has the lowest LCUE
+            Save .csv files of the LCUE of each trajectory and of the summary in Analysis/Fuel price Analysis directory
+    
+    """
+    if len(Simulation_Names) == 0:
+        raise ValueError('No simulation to compare in the fuel price sweep')
+    
+    trajectories = np.atleast_2d(np.asarray(trajectories, dtype=float))
+    finance, ghgs = get_impact_inputs()
+    
+    # Rollup cube and appraisal of the simulations compared
+    filepaths = [self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/' + Simulation_Name for Simulation_Name in Simulation_Names]
+    df_rollups = [open_rollup(filepath + '.csv') for filepath in filepaths]
+    df_appraisals = [pd.read_csv(filepath + '_Appraisal.csv').iloc[0] for filepath in filepaths]
+    
+    # Trajectories must have one price per year or per month of the simulations, all of the same number of years
+    years = [int(df_rollup['Year'].max()) + 1 for df_rollup in df_rollups]
+    
+    if len(set(years)) > 1:
+        raise ValueError('Simulations compared cover different numbers of years: {}'.format(dict(zip(Simulation_Names, years))))
+    
+    years = years[0]
+    
+    if trajectories.shape[1] not in [years, 12*years]:
+        raise ValueError('Fuel price trajectories need {} (yearly) or {} (monthly) columns, got {} columns for {} years'.format(
+                         years, 12*years, trajectories.shape[1], years))
+    
+    yearly = trajectories.shape[1] == years
+    
+    # Fuel used in each year or month of each simulation, from its rollup cube 
+    fuel_usage = []
+    
+    for df_rollup in df_rollups:
+        fuel = rollup_query(df_rollup, ['Year'] if yearly else ['Year','Month'], ['Diesel fuel usage (l)'], 'sum').values[:, 0]
+        fuel_usage.append(np.concatenate([fuel, np.zeros(trajectories.shape[1] - len(fuel))]))
+    
+    fuel_usage = np.array(fuel_usage)
+    
+    # Discount factor of each year or month
+    discount = discount_factors(finance['Discount rate'], np.arange(trajectories.shape[1]) // (1 if yearly else 12))
+    
+    # Discounted diesel cost of every system for every trajectory in one operation
+    diesel_cost = (trajectories * discount) @ fuel_usage.T
+    
+    df_appraisals = pd.DataFrame(df_appraisals)
+    system_cost = df_appraisals['Total system cost ($)'].values - df_appraisals['Diesel cost ($)'].values + diesel_cost
+    LCUE = system_cost / df_appraisals['Discounted energy (kWh)'].values
+    
+    df_LCUE = pd.DataFrame(LCUE, columns=Simulation_Names)
+    
+    # Ranking of the systems for each trajectory
+    best = np.bincount(np.argmin(LCUE, axis=1), minlength=len(Simulation_Names)) / float(len(LCUE))
+    
+    df_summary = pd.DataFrame({'Mean LCUE ($/kWh)':df_LCUE.mean(), 'LCUE 5% ($/kWh)':df_LCUE.quantile(0.05), 
+                               'LCUE 50% ($/kWh)':df_LCUE.quantile(0.5), 'LCUE 95% ($/kWh)':df_LCUE.quantile(0.95),
+                               'Lowest LCUE fraction':best}, index=Simulation_Names)
+    
+    # Create a directory for the results and save them
+    plot_dir = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Analysis/Fuel price Analysis/"
+    
+    if not os.path.isdir(plot_dir):
+          os.makedirs(plot_dir)
+    
+    df_LCUE.to_csv(plot_dir + 'Fuel_price_sweep_LCUE.csv', index=None)
+    df_summary.to_csv(plot_dir + 'Fuel_price_sweep.csv')
+    
+    print('\n {} fuel price trajectories evaluated for {} systems.'.format(len(trajectories), len(Simulation_Names)))
+    print(df_summary)
+    
+    return df_summary
+
+
+def load_growth_sweep (Simulation_Name, PV_sizes, storage_sizes, growth_rates, categories, max_blackouts):
+    """
+    Obtain the blackouts of a set of PV-battery systems when the load of selected categories of users grows every year, 
+    and the growth rate at which each system stops meeting its reliability target
+    
+    All systems and growth rates are simulated in one batch with dispatch_systems(), scaling the hourly load of each 
+    category without generating the load files again
+    
+    PRE-REQUISITE: Run get_loaddata(Loadtype) for selected scenario
+                   Simulate a system with PV to obtain its PV output with simulate_system(PV_kWp, storage_kWh, Systype, Loadtype)
+    
+    Input: Name of the saved simulation used for the hourly PV output, i.e.: 'Sim_PV200_Storage500_PVBatt_Re95_LoadMix1'
+           Lists of PV (kWp) and battery (kWh) sizes of the systems compared
+           Array of yearly growth rates of the load (fraction per year), in any order
+           List of categories of users growing, between 'Domestic', 'Commercial' and 'Public'
+           Maximum fraction of blackouts allowed
+    
+    Output: DataFrame with the blackouts of each system for each growth rate, in increasing order, and the lowest 
+            growth rate at which blackouts exceed the threshold (NaN if not reached)
+            Save .csv file in Analysis/Sensitivity Analysis directory
+    
+    """
+    Reliability = reliability_level(max_blackouts)
+    
+    # Growth rates in increasing order, so that the first one breaching the threshold is the lowest
+    growth_rates = np.sort(np.asarray(growth_rates, dtype=float))
+    
+    # Hourly load of each category and yearly growth multipliers of each variant
+    df_load = get_category_loads()
+    energy_system = get_energy_system_inputs()
+    PV_output = get_PV_profile(Simulation_Name)
+    
+    years = np.arange(len(df_load)) // 8760
+    growth = (1.0 + growth_rates[np.newaxis, :]) ** years[:, np.newaxis]
+    
+    load = np.zeros((len(df_load), len(growth_rates)))
+    for category in df_load.columns:
+        load += df_load[category].values[:, np.newaxis] * (growth if category in categories else 1.0)
+    
+    # Energy required at the system, including transmission losses
+    load = load / energy_system['Transmission efficiency DC']
+    
+    # Every system with every growth rate
+    PV_kWp = np.repeat(np.asarray(PV_sizes, dtype=float), len(growth_rates))
+    storage_kWh = np.repeat(np.asarray(storage_sizes, dtype=float), len(growth_rates))
+    variant = np.tile(np.arange(len(growth_rates)), len(PV_sizes))
+    
+    print('\n Simulating {} systems with {} growth rates...'.format(len(PV_sizes), len(growth_rates)))
+    
+    results = dispatch_systems(load, variant, PV_output, PV_kWp, storage_kWh, energy_system, None)
+    blackouts = results['Blackouts'].reshape(len(PV_sizes), len(growth_rates))
+    
+    df_growth = pd.DataFrame(blackouts, columns=['Blackouts growth {}'.format(rate) for rate in growth_rates])
+    df_growth.insert(0, 'PV size (kWp)', PV_sizes)
+    df_growth.insert(1, 'Storage size (kWh)', storage_sizes)
+    
+    # Lowest growth rate at which each system exceeds the blackout threshold
+    breach = blackouts > max_blackouts
+    df_growth['Breaching growth rate'] = np.where(breach.any(axis=1), growth_rates[np.argmax(breach, axis=1)], np.nan)
+    
+    # Save the results in the Sensitivity Analysis directory
+    script_dir = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Analysis/Sensitivity Analysis/"
+    
+    if not os.path.isdir(script_dir):
+          os.makedirs(script_dir)
+    
+    df_growth.to_csv(script_dir + 'Load_growth_{}_Re{}.csv'.format('_'.join(categories), Reliability), index=None)
+    
+    print(df_growth[['PV size (kWp)', 'Storage size (kWh)', 'Breaching growth rate']])
+    
+    return df_growth
+
+
+def battery_sensitivity (Simulation_Name, PV_sizes, storage_sizes, parameters, max_blackouts):
+    """
+    Obtain the blackouts and LCUE of a grid of PV-battery systems for every combination of battery inputs, and the 
+    minimum LCUE system meeting the reliability target with each combination
+    
+    All systems and combinations are simulated in batches with dispatch_systems(), without editing the Energy system 
+    inputs.csv file, and appraised at once with reappraise_systems()
+    
+    PRE-REQUISITE: Run get_loaddata(Loadtype) for selected scenario
+                   Simulate a system with PV to obtain its PV output with simulate_system(PV_kWp, storage_kWh, Systype, Loadtype)
+    
+    Input: Name of the saved simulation used for the hourly PV output, i.e.: 'Sim_PV200_Storage500_PVBatt_Re95_LoadMix1'
+           Lists of PV (kWp) and battery (kWh) sizes forming the grid of systems compared
+           Dictionary with the battery inputs studied and the list of values of each, i.e.: 
+               {'Battery minimum charge':[0.2, 0.3, 0.4], 'Battery C rate':[0.25, 0.33, 0.5]}
+               Inputs not included keep the values of the Energy system inputs.csv file
+           Maximum fraction of blackouts allowed
+    
+    Output: DataFrame with the blackouts, LCUE and emissions intensity of every system with every combination of inputs
+            DataFrame with the minimum LCUE system meeting the blackout threshold with each combination (NaN if none)
+            Save .csv files in Analysis/Sensitivity Analysis directory
+    
+    """
+    Reliability = reliability_level(max_blackouts)
+    
+    # Every combination of battery inputs and every system of the grid
+    df_combinations = pd.MultiIndex.from_product(list(parameters.values()), names=list(parameters.keys())).to_frame(index=False)
+    df_designs = pd.MultiIndex.from_product([PV_sizes, storage_sizes], names=['PV size (kWp)', 'Storage size (kWh)']).to_frame(index=False)
+    
+    combinations, designs = len(df_combinations), len(df_designs)
+    
+    combination = np.repeat(np.arange(combinations), designs)
+    PV_kWp = np.tile(df_designs['PV size (kWp)'].values.astype(float), combinations)
+    storage_kWh = np.tile(df_designs['Storage size (kWh)'].values.astype(float), combinations)
+    
+    # Energy required at the system, including transmission losses
+    energy_system = get_energy_system_inputs()
+    PV_output = get_PV_profile(Simulation_Name)
+    load = get_category_loads().sum(axis=1).values / energy_system['Transmission efficiency DC']
+    
+    # Battery inputs of each system
+    battery = dict(energy_system)
+    for name in parameters:
+        battery[name] = df_combinations[name].values.astype(float)[combination]
+    
+    print('\n Simulating {} systems with {} combinations of battery inputs...'.format(designs, combinations))
+    
+    # Simulate the systems in batches to limit the memory used by the hourly results
+    batch = 250
+    results = collections.defaultdict(list)
+    
+    for start in range(0, len(PV_kWp), batch):
+        
+        systems = slice(start, start + batch)
+        batch_battery = {name: (value[systems] if np.ndim(value) else value) for name, value in battery.items()}
+        
+        batch_results = dispatch_systems(load, np.zeros(len(PV_kWp[systems]), dtype=int), PV_output, PV_kWp[systems], 
+                                         storage_kWh[systems], batch_battery, None)
+        
+        for name, values in batch_results.items():
+            results[name].append(values)
+    
+    results = {name: np.concatenate(values) for name, values in results.items()}
+    
+    # Appraisal of all systems at once
+    finance, ghgs = get_impact_inputs()
+    Designs = ['System {}'.format(system) for system in range(len(PV_kWp))]
+    appraisal = reappraise_systems(dispatch_aggregates(results, Designs, PV_kWp, storage_kWh), finance, ghgs)
+    
+    df_battery = pd.concat([df_combinations.iloc[combination].reset_index(drop=True), 
+                            pd.DataFrame({'PV size (kWp)':PV_kWp, 'Storage size (kWh)':storage_kWh})], axis=1)
+    df_battery['Blackouts'] = results['Blackouts']
+    df_battery['LCUE ($/kWh)'] = appraisal['LCUE ($/kWh)'][0]
+    df_battery['Emissions intensity (gCO2/kWh)'] = appraisal['Emissions intensity (gCO2/kWh)'][0]
+    df_battery['Feasible'] = df_battery['Blackouts'] <= max_blackouts
+    
+    # Minimum LCUE system meeting the blackout threshold with each combination of inputs
+    LCUE = np.where(df_battery['Feasible'], df_battery['LCUE ($/kWh)'], np.inf).reshape(combinations, designs)
+    best = np.argmin(LCUE, axis=1) + np.arange(combinations) * designs
+    
+    df_optimum = df_battery.iloc[best].drop(columns='Feasible').reset_index(drop=True)
+    df_optimum.loc[~df_battery['Feasible'].values[best], list(df_optimum.columns[len(parameters):])] = np.nan
+    
+    # Save the results in the Sensitivity Analysis directory
+    script_dir = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Analysis/Sensitivity Analysis/"
+    
+    if not os.path.isdir(script_dir):
+          os.makedirs(script_dir)
+    
+    df_battery.to_csv(script_dir + 'Battery_sensitivity_Re{}.csv'.format(Reliability), index=None)
+    df_optimum.to_csv(script_dir + 'Battery_sensitivity_optimum_Re{}.csv'.format(Reliability), index=None)
+    
+    print(df_optimum)
+    
+    return df_battery, df_optimum
+
+
+def renewables_sensitivity (Loadtype, max_blackouts, initial_renewablesfraction, final_renewablesfraction, stepsize, accuracy=10, refinements=2): 
 
     """
     Compare LCUE of optimised hybrid systems of a given reliability level for different renewable fractions
     
+    The reference minimum LCUE hybrid system is the staged optimisation of CLOVER (Opt_Hybrid_Re{}_Load{}), while the
+    systems of each renewables fraction are single-period designs over the whole scenario from renewables_fraction_sweep(),
+    as recorded in the 'Optimisation' column of the results. The LCUE trend is fitted to the single-period designs only
+    
+    PRE-REQUISITE: Run hybrid_sys_performance(max_blackouts, Loadtype, accuracy) for the reference hybrid system
+    
     Input: Load profile from selected scenario
            Reliability level to perform sensitivity analysis with
            Initial value of renewables fraction considered
            Final value of renewables fraction considered
            Stepsize for the renewables fraction used in sensitivity analysis
+           Accuracy (stepsize) of PV and battery capacity of the optimisations (in kWp or kWh)
+           Number of refinements of the grid of renewables_fraction_sweep(), from a step size of accuracy*2^refinements
         
     Output: Graphic comparing extra costs (LCUE) of increasing renewables fraction of hybrid system      
     
     """     
     
-    # Open optimisation and scenario inputs file
-    filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Scenario/Scenario inputs.csv"
-                
-    # Locate and open Optimisation inputs file
-    filepathopt = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Optimisation inputs.csv"
-        
     # Create dataframe for LCUE vs Reliability data for diesel, hybrid and PVBatt systems:    
-    df_LCUEvsRenewableFraction = pd.DataFrame(columns=['Renewables Fraction','LCUE', 'Total System Cost'])
-    additional_cost=pd.Series()
-    additional_capex=pd.Series()
+    df_LCUEvsRenewableFraction = pd.DataFrame(columns=['Renewables Fraction','LCUE', 'Total System Cost', 'Optimisation'])
     
     # Define reliability level from blackout threshold
-    Reliability= int((1 - max_blackouts)*100.0)
+    Reliability= reliability_level(max_blackouts)
     
     # For baseline diesel system        
     Systype='Diesel'
@@ -3827,82 +7069,30 @@ def renewables_sensitivity (Loadtype, max_blackouts, initial_renewablesfraction,
     # Locate and open min LCUE hybrid system (without renewables fraction constraint)    
     filepathsys = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}.csv".format(Systype, Reliability, Loadtype)
 
-    # Read csv file with hybrid system simulation data
-    df_hybridsys = pd.read_csv(filepathsys)
-  
-    # Obtain Renewable fraction, LCUE, and Total system cost of the reference hybrid system
-    Appraisal_indexes=[18,14,8,30]        
-    df_referencemetrics=df_hybridsys.iloc[2, Appraisal_indexes]
-    df_referencemetrics.iat[0]=df_hybridsys["Renewables fraction"].mean()
-    df_referencemetrics.iat[3]=df_hybridsys.iat[0,30]
-    
-    # Set values of reference minimum LCUE system as first lines of data frame     
-    df_LCUEvsRenewableFraction.loc[0] = [df_referencemetrics.iat[0], df_referencemetrics.iat[1], df_referencemetrics.iat[2]] 
-    additional_cost.loc[0]=0
-    additional_capex.loc[0]=0
-    
-    # Calculate the total sys savings and additional initial costs of reference hybrid system compared to baseline diesel system
-    additional_cost.loc[0]=df_baselinemetrics.iat[2]-df_referencemetrics.iat[2]
-    additional_capex.loc[0]=df_referencemetrics["New equipment cost ($)"].sum()-df_baselinemetrics.iat[3]
-            
-    # Initalise counter to locate sensitivity results (first value assigned to first hybrid system)
-    count=1
-       
-    # For each renewables fraction value in the range specified:   
-    for fraction in np.arange(initial_renewablesfraction, final_renewablesfraction+stepsize, stepsize):
-    
-        # Open scenario inputs and optimisation inputs files
-        df_scenario = pd.read_csv(filepath, header=None)
-        df_optimisation = pd.read_csv(filepathopt, header=None)                    
-        
-        # Set maximum blackout threshold (0.0-1.0) in scenario inputs
-        if df_scenario.iat[3, 1] != max_blackouts :
-               df_scenario.iat[3, 1] = max_blackouts
-               
-        # Substitute new values in Scenario  Inputs.csv file for simulation
-        df_scenario.to_csv(filepath, index=None, header =None)
-               
-        # Set reliability (blackout threshold) for optimisation inputs
-        df_optimisation.iat[11,1] = fraction
-        df_optimisation.iat[10,1] = 'Renewables fraction'
-
-        # Substitute new values in Optimisation inputs.csv file for optimisation
-        df_optimisation.to_csv(filepathopt, index=None, header =None)                                                                      
-            
-        # Check if simulation for renewables fraction level exists already, if not, performs simulation for diesel, hybrid and/or PVBatt           
-        check = os.path.exists(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/RF{}_Opt_{}_Re{}_Load{}.csv".format(fraction, Systype, Reliability, Loadtype)) 
-    
-        if check == False :
-                
-            print('\n Simulation for {} system with Renewables fraction {} doesn\'t exist, simulation in progress...'.format(Systype, fraction))
-        
-            # If doesn't, simulate system for that reliability level and save results                                   
-            hybrid_sys_performance_RF (max_blackouts, Loadtype, fraction)
-                               
-        else:
-                
-            print('\n Simulation for {} system with Renewables fraction {} found, continuing with the analysis ...'.format(Systype, fraction))
-                    
-        # If does, read csv file with hybrid system simulation data
-        df_hybridopt = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/RF{}_Opt_{}_Re{}_Load{}.csv'.format(fraction, Systype, Reliability, Loadtype))
-  
-        # Obtain Renewable fraction, LCUE, and Total system cost of the corresponding hybrid system   
-        Appraisal_indexes=[18,14,8,30]        
-        df_hybridmetrics=df_hybridopt.iloc[2, Appraisal_indexes]
-        df_hybridmetrics.iat[0]=df_hybridopt["Renewables fraction"].mean()
-        df_hybridmetrics.iat[3]=df_hybridopt.iat[0,30]
-        
-        # Obtain total sys savings and additional initial cost compared to baseline diesel system
-        additional_cost.loc[count]=df_baselinemetrics.iat[2]-df_hybridmetrics.iat[2]
-        additional_capex.loc[count]=df_hybridopt["New equipment cost ($)"].sum()-df_baselinemetrics.iat[3]
-        
-        # Locate the LCUE, total system cost and renewables fraction in results file
-        df_LCUEvsRenewableFraction.loc[count] = [df_hybridmetrics.iat[0], df_hybridmetrics.iat[1], df_hybridmetrics.iat[2]] 
-                             
-        print('\nData for Renewables fraction {} saved.'.format(fraction))
-        
-        # Add to the counter to locate results
-        count +=1
+    # Read csv file with hybrid system optimisation data
+    df_hybridsys = pd.read_csv(filepathsys)
+  
+    # Obtain Renewable fraction, LCUE, Total system cost and initial new equipment cost of the reference hybrid system
+    df_referencemetrics = pd.Series([df_hybridsys['Renewables fraction'].mean(), df_hybridsys['LCUE ($/kWh)'].iat[-1], 
+                                     df_hybridsys['Cumulative cost ($)'].iat[-1], df_hybridsys['New equipment cost ($)'].iat[0]])
+    
+    # Obtain the best single-period hybrid systems of all renewables fractions from a single evaluated grid
+    fractions = np.arange(initial_renewablesfraction, final_renewablesfraction+stepsize, stepsize)
+    df_sweep = renewables_fraction_sweep(Loadtype, max_blackouts, fractions, accuracy, refinements)
+    df_sweep = df_sweep.dropna().reset_index(drop=True)
+    
+    print('\n Reference system from the staged optimisation', 'Opt_{}_Re{}_Load{}'.format(Systype, Reliability, Loadtype) + ',', 'renewables fractions from single-period designs')
+    
+    # Set values of reference minimum LCUE system as first line of data frame, followed by the systems of each fraction 
+    df_LCUEvsRenewableFraction.loc[0] = [df_referencemetrics.iat[0], df_referencemetrics.iat[1], df_referencemetrics.iat[2], 'Staged reference']
+    
+    for fraction in range(len(df_sweep)):
+        df_LCUEvsRenewableFraction.loc[fraction+1] = [df_sweep['Renewables fraction'].iat[fraction], df_sweep['LCUE ($/kWh)'].iat[fraction], 
+                                                      df_sweep['Cumulative cost ($)'].iat[fraction], 'Single-period design']
+    
+    # Obtain total sys savings and additional initial cost compared to baseline diesel system
+    additional_cost = df_baselinemetrics.iat[2] - df_LCUEvsRenewableFraction['Total System Cost'].astype(float)
+    additional_capex = pd.concat([pd.Series([df_referencemetrics.iat[3]]), df_sweep['New equipment cost ($)']], ignore_index=True) - df_baselinemetrics.iat[3]
     
     # Save RenewablesFraction vs LCUE data on a csv file:
     
@@ -3916,15 +7106,9 @@ def renewables_sensitivity (Loadtype, max_blackouts, initial_renewablesfraction,
     filepath=self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Analysis/Sensitivity Analysis/Sensitivity_RF{}to{}_Re_{}_Load{}/RenewablesFraction_sensitivity.csv".format(initial_renewablesfraction, final_renewablesfraction, Reliability, Loadtype)
     df_LCUEvsRenewableFraction.to_csv(filepath)
     
-    # Restore the Blackouts as optimisation criteria in Optimisation inputs.csv
-    filepathopt = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Optimisation/Optimisation inputs.csv"    
-    df_optimisation = pd.read_csv(filepathopt, header=None)        
-    df_optimisation.iat[10,1] = 'Blackouts'    
-    df_optimisation.to_csv(filepathopt, index=None, header =None)       
-    
-    # Create a polynomic fit for the LCUE variation trend
-    xloc = df_LCUEvsRenewableFraction.loc[:,'Renewables Fraction']
-    z=np.polyfit(df_LCUEvsRenewableFraction.loc[:,'Renewables Fraction'], (-1.0*(df_LCUEvsRenewableFraction.loc[:,'LCUE']-df_baselinemetrics.iat[1])*100.0/df_baselinemetrics.iat[1]), 6)
+    # Create a polynomic fit for the LCUE variation trend of the single-period designs
+    xloc = df_LCUEvsRenewableFraction.loc[:,'Renewables Fraction'].astype(float)
+    z=np.polyfit(df_sweep['Renewables fraction'], (-1.0*(df_sweep['LCUE ($/kWh)']-df_baselinemetrics.iat[1])*100.0/df_baselinemetrics.iat[1]), 6)
     trendpoly = np.poly1d(z) 
     xtrend=np.arange(0.37,1.01,0.01)
     
@@ -3974,7 +7158,7 @@ def hybrid_sys_performance_RF (max_blackouts, Loadtype, fraction):
     # Read the load .csv file containing hourly load information of the selected facility  
     filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Scenario/Scenario inputs.csv"  
     df_scenario = pd.read_csv(filepath, header=None)   
-    Reliability= int((1 - max_blackouts)*100.0)
+    Reliability= reliability_level(max_blackouts)
     
     # Analysis done for hybrid system
     Systype = 'Hybrid'
@@ -4133,7 +7317,7 @@ def optimise_system_RF (Systype, Loadtype, max_blackouts, fraction, Stepsize):
     SysOptimisation = Optimisation().multiple_optimisation_step(previous_systems=initial_sys)
     
     # Define reliability of system for identifying the saved files
-    Reliability = int((1.0 - max_blackouts)*100.0) 
+    Reliability = reliability_level(max_blackouts) 
     
     # Save the outputs from the optimisation
     Optimisation_Name = 'RF{}_Opt_{}_Re{}_Load{}'.format(fraction, Systype, Reliability, Loadtype)
@@ -4202,7 +7386,7 @@ def privateimpact_reliability(Loadtype, max_blackouts, Systype):
     df_scenario.to_csv(filepath, index=None, header =None)    
     
     # Define reliability from blackout threshold
-    Reliability= int((1.0 - max_blackouts)*100.0)
+    Reliability= reliability_level(max_blackouts)
  
     # Initialise variables of study for each scenario
     monthly_reliability={'Scenario 1 Load':[],
@@ -4212,10 +7396,6 @@ def privateimpact_reliability(Loadtype, max_blackouts, Systype):
                          'Scenario 4 Load':[]
                          }   
     
-    # Create a date range column corresponding to the lifetime of the system (15 years)
-    date_rng = pd.date_range(start='1/1/2020', end='1/1/2035', freq='H')
-    Date=date_rng[:131400]    
-    
     # Create directory to save simulations
     script_dir = os.path.dirname(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Analysis/")
     plot_dir = os.path.join(script_dir, 'Productive Load Impact/{} System {} Re/'.format(Systype, Reliability))  
@@ -4244,32 +7424,18 @@ def privateimpact_reliability(Loadtype, max_blackouts, Systype):
             # Save simulation           
             filepath=self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Analysis/Productive Load Impact/{} System {} Re/Simulation_{}.csv'.format(Systype, Reliability, Loadtype)
             df_simulation.to_csv(filepath, index=None)  
+            df_rollup = save_rollup(df_simulation, filepath)
             
     else:
             
             print('\n Simulation found, getting reliability data...')           
             
-            # Read data from saved simulation
-            df_simulation=pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Analysis/Productive Load Impact/{} System {} Re/Simulation_{}.csv'.format(Systype, Reliability, 'Mix1'))
-    
-    # Include a colum in simulation file with the date and hour
-    df_simulation['Date'] = Date
+            # Read the rollup cube of the saved simulation
+            df_rollup=open_rollup(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Analysis/Productive Load Impact/{} System {} Re/Simulation_{}.csv'.format(Systype, Reliability, 'Mix1'))
     
-    # For every year of lifetime, obtain the monthly average reliability of the system    
-    for years in range(2020,2035):
-        
-        # For every month
-        for month in ['01','02','03','04','05','06','07','08','09','10','11','12']:
-            
-            # Create a mask to filter only data from that month, and obtain the average blackouts
-            start_date='01-'+str(month)+'-'+str(years)
-            final_date='27-'+str(month)+'-'+str(years)
-            mask = (df_simulation['Date'] > start_date) & (df_simulation['Date'] <= final_date)     
-            df_month = df_simulation.loc[mask].mean(axis=0).iloc[3]
-
-            # Define average reliability from average blackouts
-            df_reliability=(1.0-df_month)*100.0
-            monthly_reliability['Scenario 1 Load'].append(df_reliability)
+    # Obtain the monthly average reliability of the system over its lifetime from the average blackouts
+    df_monthly = rollup_query(df_rollup, ['Year','Month'], ['Blackouts'], 'mean')
+    monthly_reliability['Scenario 1 Load'] = list((1.0 - df_monthly['Blackouts'])*100.0)
             
     print('\n Monthly reliability data for Scenario 1 calculated.')   
             
@@ -4307,32 +7473,18 @@ def privateimpact_reliability(Loadtype, max_blackouts, Systype):
             # Save simulation    
             filepath=self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Analysis/Productive Load Impact/{} System {} Re/Simulation_{}.csv'.format(Systype, Reliability, 'Mix2B')
             df_simulation.to_csv(filepath, index=None)
+            df_rollup = save_rollup(df_simulation, filepath)
             
     else:
         
             print('\n Simulation found, getting reliability data...') 
 
-            # Read data from saved simulation            
-            df_simulation=pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Analysis/Productive Load Impact/{} System {} Re/Simulation_{}.csv'.format(Systype, Reliability, 'Mix2B'))
+            # Read the rollup cube of the saved simulation
+            df_rollup=open_rollup(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Analysis/Productive Load Impact/{} System {} Re/Simulation_{}.csv'.format(Systype, Reliability, 'Mix2B'))
       
-    # Include a colum in simulation file with the date and hour
-    df_simulation['Date'] = Date
-        
-    # For every year of lifetime, obtain the monthly average reliability of the system    
-    for years in range(2020,2035):
-        
-        # For every month
-        for month in ['01','02','03','04','05','06','07','08','09','10','11','12']:
-
-            # Create a mask to filter only data from that month, and obtain the average blackouts
-            start_date='01-'+str(month)+'-'+str(years)
-            final_date='27-'+str(month)+'-'+str(years)           
-            mask = (df_simulation['Date'] > start_date) & (df_simulation['Date'] <= final_date)           
-            df_month = df_simulation.loc[mask].mean(axis=0).iloc[3]           
-            
-            # Define average reliability from average blackouts         
-            df_reliability=(1.0-df_month)*100.0           
-            monthly_reliability['Scenario 2B Load'].append(df_reliability)
+    # Obtain the monthly average reliability of the system over its lifetime from the average blackouts
+    df_monthly = rollup_query(df_rollup, ['Year','Month'], ['Blackouts'], 'mean')
+    monthly_reliability['Scenario 2B Load'] = list((1.0 - df_monthly['Blackouts'])*100.0)
             
     print('\n Monthly reliability data for Scenario 2B calculated.')
     
@@ -4371,34 +7523,20 @@ def privateimpact_reliability(Loadtype, max_blackouts, Systype):
             # Save simulation   
             filepath=self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Analysis/Productive Load Impact/{} System {} Re/Simulation_{}.csv'.format(Systype, Reliability, 'Mix2')
             df_simulation.to_csv(filepath, index=None)
+            df_rollup = save_rollup(df_simulation, filepath)
             
     else:
         
             print('\n Simulation found, getting reliability data...') 
 
-            # Read data from saved simulation            
-            df_simulation=pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Analysis/Productive Load Impact/{} System {} Re/Simulation_{}.csv'.format(Systype, Reliability, 'Mix2'))
+            # Read the rollup cube of the saved simulation
+            df_rollup=open_rollup(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Analysis/Productive Load Impact/{} System {} Re/Simulation_{}.csv'.format(Systype, Reliability, 'Mix2'))
 
     
         
-    # Include a colum in simulation file with the date and hour       
-    df_simulation['Date'] = Date
-        
-    # For every year of lifetime, obtain the monthly average reliability of the system      
-    for years in range(2020,2035):
-        
-        # For every month
-        for month in ['01','02','03','04','05','06','07','08','09','10','11','12']:
- 
-            # Create a mask to filter only data from that month, and obtain the average blackouts
-            start_date='01-'+str(month)+'-'+str(years)
-            final_date='27-'+str(month)+'-'+str(years)            
-            mask = (df_simulation['Date'] > start_date) & (df_simulation['Date'] <= final_date)            
-            df_month = df_simulation.loc[mask].mean(axis=0).iloc[3]            
-            
-            # Define average reliability from average blackouts            
-            df_reliability=(1.0-df_month)*100.0            
-            monthly_reliability['Scenario 2 Load'].append(df_reliability)
+    # Obtain the monthly average reliability of the system over its lifetime from the average blackouts
+    df_monthly = rollup_query(df_rollup, ['Year','Month'], ['Blackouts'], 'mean')
+    monthly_reliability['Scenario 2 Load'] = list((1.0 - df_monthly['Blackouts'])*100.0)
             
     print('\n Monthly reliability data for Scenario 2 calculated.')
     
@@ -4436,32 +7574,18 @@ def privateimpact_reliability(Loadtype, max_blackouts, Systype):
             # Save simulation    
             filepath=self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Analysis/Productive Load Impact/{} System {} Re/Simulation_{}.csv'.format(Systype, Reliability, 'Mix1Adv')
             df_simulation.to_csv(filepath, index=None)
+            df_rollup = save_rollup(df_simulation, filepath)
             
     else:
         
             print('\n Simulation found, getting reliability data...') 
             
-            # Read data from saved simulation            
-            df_simulation=pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Analysis/Productive Load Impact/{} System {} Re/Simulation_{}.csv'.format(Systype, Reliability, 'Mix1Adv'))
+            # Read the rollup cube of the saved simulation
+            df_rollup=open_rollup(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Analysis/Productive Load Impact/{} System {} Re/Simulation_{}.csv'.format(Systype, Reliability, 'Mix1Adv'))
                             
-    # Include a colum in simulation file with the date and hour         
-    df_simulation['Date'] = Date    
-        
-    # For every year of lifetime, obtain the monthly average reliability of the system     
-    for years in range(2020,2035):
-        
-        # For every month
-        for month in ['01','02','03','04','05','06','07','08','09','10','11','12']:
-
-            # Create a mask to filter only data from that month, and obtain the average blackouts
-            start_date='01-'+str(month)+'-'+str(years)
-            final_date='27-'+str(month)+'-'+str(years)           
-            mask = (df_simulation['Date'] > start_date) & (df_simulation['Date'] <= final_date)           
-            df_month = df_simulation.loc[mask].mean(axis=0).iloc[3]
-
-            # Define average reliability from average blackouts            
-            df_reliability=(1.0-df_month)*100.0            
-            monthly_reliability['Scenario 3 Load'].append(df_reliability)
+    # Obtain the monthly average reliability of the system over its lifetime from the average blackouts
+    df_monthly = rollup_query(df_rollup, ['Year','Month'], ['Blackouts'], 'mean')
+    monthly_reliability['Scenario 3 Load'] = list((1.0 - df_monthly['Blackouts'])*100.0)
             
     print('\n Monthly reliability data for Scenario 3 calculated.')
         
@@ -4499,32 +7623,18 @@ def privateimpact_reliability(Loadtype, max_blackouts, Systype):
             # Save simulation
             filepath=self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Analysis/Productive Load Impact/{} System {} Re/Simulation_{}.csv'.format(Systype, Reliability, 'Mix2Adv')
             df_simulation.to_csv(filepath, index=None)
+            df_rollup = save_rollup(df_simulation, filepath)
             
     else:
         
             print('\n Simulation found, getting reliability data...') 
             
-            # Read data from saved simulation
-            df_simulation=pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Analysis/Productive Load Impact/{} System {} Re/Simulation_{}.csv'.format(Systype, Reliability, 'Mix2Adv'))
+            # Read the rollup cube of the saved simulation
+            df_rollup=open_rollup(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Analysis/Productive Load Impact/{} System {} Re/Simulation_{}.csv'.format(Systype, Reliability, 'Mix2Adv'))
     
-    # Include a colum in simulation file with the date and hour         
-    df_simulation['Date'] = Date    
-
-    # For every year of lifetime, obtain the monthly average reliability of the system            
-    for years in range(2020,2035):
-        
-        # For every month
-        for month in ['01','02','03','04','05','06','07','08','09','10','11','12']:
- 
-            # Create a mask to filter only data from that month, and obtain the average blackouts
-            start_date='01-'+str(month)+'-'+str(years)
-            final_date='27-'+str(month)+'-'+str(years)           
-            mask = (df_simulation['Date'] > start_date) & (df_simulation['Date'] <= final_date)           
-            df_month = df_simulation.loc[mask].mean(axis=0).iloc[3]
-
-            # Define average reliability from average blackouts            
-            df_reliability=(1.0-df_month)*100.0           
-            monthly_reliability['Scenario 4 Load'].append(df_reliability)
+    # Obtain the monthly average reliability of the system over its lifetime from the average blackouts
+    df_monthly = rollup_query(df_rollup, ['Year','Month'], ['Blackouts'], 'mean')
+    monthly_reliability['Scenario 4 Load'] = list((1.0 - df_monthly['Blackouts'])*100.0)
             
     print('\n Monthly reliability data for Scenario 4 calculated.')
         
@@ -4639,7 +7749,7 @@ def privateimpact_design(Loadtype, max_blackouts):
     df_scenario.to_csv(filepath, index=None, header =None)   
  
     # Define reliability from blackout threshold
-    Reliability= int((1.0 - max_blackouts)*100.0)
+    Reliability= reliability_level(max_blackouts)
     
     # Initialise the variables used
     monthly_data={'Energy demand':[],
@@ -4651,10 +7761,6 @@ def privateimpact_design(Loadtype, max_blackouts):
                          'Wasted energy (B)':[]
                          }   
     
-    # Create a date range column corresponding to the lifetime of the system  
-    date_rng = pd.date_range(start='1/1/2020', end='1/1/2035', freq='H')
-    Date=date_rng[:131400]    
-  
     # Create directory to save simulations
     script_dir = os.path.dirname(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Analysis/")
     plot_dir = os.path.join(script_dir, 'Productive Load Impact/{} System {} Re/'.format(Systype, Reliability))
@@ -4670,31 +7776,15 @@ def privateimpact_design(Loadtype, max_blackouts):
     df_simulation=Energy_System().lifetime_simulation(df_opt)   
     filepath=self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Analysis/Productive Load Impact/{} System {} Re/Simulation_{}_{}.csv'.format(Systype, Reliability,'Mix1to2B','A')
     df_simulation.to_csv(filepath, index=None)
+    df_rollup = save_rollup(df_simulation, filepath)
 
-    # Include a colum in simulation file with the date and hour                     
-    df_simulation['Date'] = Date    
-
-    # For every year of lifetime, obtain the monthly average performance of the system                    
-    for years in range(2020,2035):
-        
-        # For every month
-        for month in ['01','02','03','04','05','06','07','08','09','10','11','12']:
- 
-            # Create a mask to filter only data from that month, and obtain the average variables
-            start_date='01-'+str(month)+'-'+str(years)
-            final_date='27-'+str(month)+'-'+str(years)           
-            mask = (df_simulation['Date'] > start_date) & (df_simulation['Date'] <= final_date)
-            
-            df_demand = df_simulation.loc[mask].mean(axis=0).iloc[0]
-            df_renewables = df_simulation.loc[mask].mean(axis=0).iloc[4]
-            df_storage = df_simulation.loc[mask].mean(axis=0).iloc[5]
-            df_dumped = df_simulation.loc[mask].mean(axis=0).iloc[13]
-            
-            # Add them to the variables over lifetime
-            monthly_data['Energy demand'].append(df_demand)
-            monthly_data['Renewables energy supplied (A)'].append(df_renewables)
-            monthly_data['Storage energy supplied (A)'].append(df_storage)
-            monthly_data['Wasted energy (A)'].append(df_dumped)
+    # Obtain the monthly average performance of the system over its lifetime: load, renewables energy, storage energy and dumped energy
+    df_monthly = rollup_query(df_rollup, ['Year','Month'], df_simulation.columns[[0,4,5,13]], 'mean')
+    
+    monthly_data['Energy demand'] = list(df_monthly.iloc[:,0])
+    monthly_data['Renewables energy supplied (A)'] = list(df_monthly.iloc[:,1])
+    monthly_data['Storage energy supplied (A)'] = list(df_monthly.iloc[:,2])
+    monthly_data['Wasted energy (A)'] = list(df_monthly.iloc[:,3])
             
     print('\n Monthly  data for Scenario A calculated...')
     
@@ -4710,30 +7800,14 @@ def privateimpact_design(Loadtype, max_blackouts):
     df_simulation=Energy_System().lifetime_simulation(df_opt)    
     filepath=self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Analysis/Productive Load Impact/{} System {} Re/Simulation_{}_{}.csv'.format(Systype, Reliability,'Mix1to2B','B')
     df_simulation.to_csv(filepath, index=None)
+    df_rollup = save_rollup(df_simulation, filepath)
     
-    # Include a colum in simulation file with the date and hour                                 
-    df_simulation['Date'] = Date
-      
-     # For every year of lifetime, obtain the monthly average performance of the system                           
-    for years in range(2020,2035):
-        
-        # For every month
-        for month in ['01','02','03','04','05','06','07','08','09','10','11','12']:
- 
-            # Create a mask to filter only data from that month, and obtain the average variables
-            start_date='01-'+str(month)+'-'+str(years)
-            final_date='27-'+str(month)+'-'+str(years)           
-            mask = (df_simulation['Date'] > start_date) & (df_simulation['Date'] <= final_date)
-            
-            df_demand = df_simulation.loc[mask].mean(axis=0).iloc[0]
-            df_renewables = df_simulation.loc[mask].mean(axis=0).iloc[4]
-            df_storage = df_simulation.loc[mask].mean(axis=0).iloc[5]
-            df_dumped = df_simulation.loc[mask].mean(axis=0).iloc[13]
-            
-            # Add them to the variables over lifetime
-            monthly_data['Renewables energy supplied (B)'].append(df_renewables)
-            monthly_data['Storage energy supplied (B)'].append(df_storage)
-            monthly_data['Wasted energy (B)'].append(df_dumped)
+    # Obtain the monthly average performance of the system over its lifetime: load, renewables energy, storage energy and dumped energy
+    df_monthly = rollup_query(df_rollup, ['Year','Month'], df_simulation.columns[[0,4,5,13]], 'mean')
+    
+    monthly_data['Renewables energy supplied (B)'] = list(df_monthly.iloc[:,1])
+    monthly_data['Storage energy supplied (B)'] = list(df_monthly.iloc[:,2])
+    monthly_data['Wasted energy (B)'] = list(df_monthly.iloc[:,3])
             
     print('\n Monthly  data for Scenario B calculated...') 
       
@@ -4870,7 +7944,7 @@ def cumulative_capacity(max_blackouts):
        df_scenario.to_csv(filepath, index=None, header =None)    
        
        # Define reliability from blackout threshold
-       Reliability= int((1.0 - max_blackouts)*100.0)
+       Reliability= reliability_level(max_blackouts)
     
        # Create directory to save simulations
        script_dir = os.path.dirname(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Analysis/")
@@ -5009,6 +8083,111 @@ def cumulative_capacity(max_blackouts):
     print(' Figure saved as '+plot_name)
     plt.show()
            
+def discount_vector (discount_rate, years, periods_per_year):
+    """
+    Obtain the discount factor of each period (i.e. month or hour) over a number of years, constant within each year 
+    as in the appraisal of systems
+    
+    Input: Discount rate (fraction), single value or array of values
+           Number of years
+           Number of periods per year, i.e.: 12 for months, 8760 for hours
+    
+    Output: Array of discount factors, one row per discount rate and one column per period
+    
+    """
+    return discount_factors(discount_rate, np.arange(int(years * periods_per_year)) // periods_per_year)
+
+
+def discounted_cost_streams (df_stages, periods_per_year):
+    """
+    Obtain the discounted cost of each period (i.e. month or hour) of many systems at once from the total costs of 
+    their stages. New equipment is paid at the start of each stage, and the O&M and diesel costs of each stage are
+    spread over its periods in proportion to their discount factors
+    
+    Input: DataFrame with one row per stage of each system, with columns 'System', 'Start year', 'End year', 
+               'New equipment cost ($)', 'O&M cost ($)' and 'Diesel cost ($)' (discounted costs of the stage)
+           Number of periods per year, i.e.: 12 for months, 8760 for hours
+           Finance inputs.csv file of the location
+    
+    Output: DataFrame with one row per period and, for each system, its new equipment, O&M, diesel, total and 
+            cumulative costs ($)
+    
+    """
+    finance, ghgs = get_impact_inputs()
+    
+    codes, systems = pd.factorize(df_stages['System'])
+    starts = df_stages['Start year'].values.astype(float)[:, np.newaxis] * periods_per_year
+    ends = df_stages['End year'].values.astype(float)[:, np.newaxis] * periods_per_year
+    
+    discount = discount_vector(finance['Discount rate'], df_stages['End year'].max(), periods_per_year)
+    periods = np.arange(discount.shape[1])
+    
+    # Weight of each period in the costs of each stage
+    spread = np.where((periods >= starts) & (periods < ends), discount, 0.0)
+    spread = spread / spread.sum(axis=1, keepdims=True)
+    upfront = (periods == starts).astype(float)
+    
+    # Stages added to the costs of their system
+    membership = (codes[np.newaxis, :] == np.arange(len(systems))[:, np.newaxis]).astype(float)
+    
+    streams = collections.OrderedDict()
+    streams['New Eq Costs'] = membership.dot(df_stages['New equipment cost ($)'].values[:, np.newaxis] * upfront)
+    streams['O&M Costs'] = membership.dot(df_stages['O&M cost ($)'].values[:, np.newaxis] * spread)
+    streams['Diesel Costs'] = membership.dot(df_stages['Diesel cost ($)'].values[:, np.newaxis] * spread)
+    streams['Total Costs'] = streams['New Eq Costs'] + streams['O&M Costs'] + streams['Diesel Costs']
+    streams['Cumulative Costs'] = np.cumsum(streams['Total Costs'], axis=1)
+    
+    df_streams = pd.concat({Cost: pd.DataFrame(values.T, columns=systems) for Cost, values in streams.items()}, axis=1)
+    
+    return df_streams.swaplevel(axis=1)[list(systems)]
+
+
+def cumulative_cost_curves (max_blackouts, Scenarios, Types, periods_per_year):
+    """
+    Obtain the discounted costs of each period over the lifetime of the systems of all scenarios and system types 
+    at once, simulating the diesel systems that don't exist yet
+    
+    PRE-REQUISITE: Optimise the hybrid and PV-battery systems of each scenario, i.e.: with hybrid_sys_performance()
+    
+    Input: Minimum reliability threshold (max_blackouts)
+           List of load types, i.e.: ['Mix1','Mix2B','Mix1Adv','Mix2Adv']
+           List of system types, between 'Diesel', 'Hybrid' and 'PVBatt'
+           Number of periods per year, i.e.: 12 for months, 8760 for hours
+    
+    Output: DataFrame with one row per period and, for each system (i.e. 'Mix1 Hybrid'), its new equipment, O&M, 
+            diesel, total and cumulative costs ($)
+    
+    """
+    Reliability= reliability_level(max_blackouts)
+    
+    stages = []
+    
+    for Loadtype in Scenarios:
+        for Systype in Types:
+            
+            if Systype == 'Diesel':
+                
+                filepath = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV0_Storage0_{}_Re{}_Load{}_Appraisal.csv'.format(Systype, Reliability, Loadtype)
+                
+                # Perform diesel simulation if does not exist previously
+                if not os.path.exists(filepath):
+                    set_system_type (Systype, max_blackouts)
+                    diesel_sys_performance (max_blackouts, Loadtype)
+                
+                df_stage = pd.read_csv(filepath)
+                
+                # Diesel generator already installed in the camp
+                df_stage['New equipment cost ($)'] -= 13.0*560.0
+                
+            else:
+                df_stage = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}.csv'.format(Systype, Reliability, Loadtype))
+            
+            df_stage['System'] = '{} {}'.format(Loadtype, Systype)
+            stages.append(df_stage[['System', 'Start year', 'End year', 'New equipment cost ($)', 'O&M cost ($)', 'Diesel cost ($)']])
+    
+    return discounted_cost_streams(pd.concat(stages, ignore_index=True), periods_per_year)
+
+
 def cumulative_costs(max_blackouts):
     """
     Present cumulative costs for optimized systes for each scenario over lifetime
@@ -5020,7 +8199,7 @@ def cumulative_costs(max_blackouts):
     
     """            
     # Define reliability from blackout threshold  
-    Reliability= int((1.0 - max_blackouts)*100.0)
+    Reliability= reliability_level(max_blackouts)
 
     # Create directory to save simulations
     script_dir = os.path.dirname(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Analysis/")
@@ -5053,302 +8232,31 @@ def cumulative_costs(max_blackouts):
     # Key metrics used for barchart graphic
     df_keymetrics=pd.DataFrame(columns=['LCUE ($/kWh)','Cumulative cost ($)']) 
     
+    # Monthly costs of every system of every scenario over lifetime
+    df_curves = cumulative_cost_curves(max_blackouts, Scenarios, Types, 12)
+    
+    if not os.path.isdir(plot_dir + 'Systems monthly costs/'):
+           os.makedirs(plot_dir + 'Systems monthly costs/')
+    
+    # Names of each scenario and system in the figures
+    columns = {'Mix1':'Scenario 1', 'Mix2B':'Scenario 2B', 'Mix1Adv':'Scenario 3', 'Mix2Adv':'Scenario 4'}
+    names = {'Hybrid':'Hybrid', 'PVBatt':'PV-Battery', 'Diesel':'Diesel'}
+    
     # For every load Scenario:
     for Loadtype in Scenarios :
         
         # For every system type:
         for Systype in Types:
-        
-           # Read the Scenario Inputs .csv file containing hourly load information of the selected facility     
-           filepath = self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Scenario/Scenario inputs.csv"  
-           df_scenario = pd.read_csv(filepath, header=None)    
-    
-           if Systype == 'Diesel' :
-        
-               # Not consider PV or battery storage for simulation
-               if df_scenario.iat[0, 1] != 'N':
-                   df_scenario.iat[0, 1] = 'N'    
-               if df_scenario.iat[1, 1] != 'N':
-                   df_scenario.iat[1, 1] = 'N'
-        
-               # Consider only diesel for simulation
-               if df_scenario.iat[2, 1] != 'Y':
-                   df_scenario.iat[2, 1] = 'Y'    
-    
-           elif Systype == 'Hybrid' :
-        
-               # Consider PV and battery storage for simulation
-               if df_scenario.iat[0, 1] != 'Y':
-                   df_scenario.iat[0, 1] = 'Y'    
-               if df_scenario.iat[1, 1] != 'Y':
-                   df_scenario.iat[1, 1] = 'Y'
-        
-               # Consider diesel for simulation
-               if df_scenario.iat[2, 1] != 'Y':
-                   df_scenario.iat[2, 1] = 'Y'  
-                        
-           elif Systype == 'PVBatt' :
-        
-               # Consider only PV and battery storage for simulation
-               if df_scenario.iat[0, 1] != 'Y':
-                   df_scenario.iat[0, 1] = 'Y'    
-               if df_scenario.iat[1, 1] != 'Y':
-                   df_scenario.iat[1, 1] = 'Y'
-        
-               # Not onsider only diesel for simulation
-               if df_scenario.iat[2, 1] != 'N':
-                   df_scenario.iat[2, 1] = 'N'  
-            
-           # Define diesel backup threshold of system for scenario
-           df_scenario.iat[3,1] = max_blackouts
-    
-           # Substitute new values in Scenario  Inputs.csv file for optimisation
-           df_scenario.to_csv(filepath, index=None, header =None)    
            
-           # Check if corresponding optimisation file exists, if not, simulates it
-           if Loadtype=='Mix1':
-              column='Scenario 1'
-           
-           if Loadtype=='Mix2B':
-              column='Scenario 2B'
-        
-           if Loadtype=='Mix1Adv':
-              column='Scenario 3'
-           
-           if Loadtype=='Mix2Adv':
-              column='Scenario 4'
-        
+           # Read csv file with the simulation or optimization
            if Systype == 'Diesel':
-        
-              check = os.path.exists(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV0_Storage0_{}_Re{}_Load{}_Appraisal.csv'.format(Systype, Reliability, Loadtype)) 
-    
-              if check == True :              
-           
-                 # Read csv file with the optimization
-                 df_opt = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV0_Storage0_{}_Re{}_Load{}_Appraisal.csv'.format(Systype, Reliability, Loadtype))
-            
-              elif check == False :
-                 
-                 # Perform diesel simulation if does not exist previously
-                 diesel_sys_performance(max_blackouts, Loadtype)
-           
-                 # Read csv file with the optimization
-                 df_opt = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV0_Storage0_{}_Re{}_Load{}_Appraisal.csv'.format(Systype, Reliability, Loadtype))
-
-              # Create costs dataframe for cumulative cost over lifetime
-              df_Costs=pd.DataFrame()               
-                
-              # Introduce colum with new equipment costs        
-              df_Costs['New Eq Costs'] = np.zeros(180)
-              df_Costs.iat[0,0]=df_opt.iat[0,30]-13.0*560.0
-    
-              # Introduce colum with O&M costs            
-              df_Costs['O&M Costs'] = np.zeros(180)
-              
-              # Monthly de-discounted costs over lifetime assuming constant costs
-              X= df_opt.iat[0,32]/(0.54474*180.0)
-              
-              # Assign discount factor to each year over lifetime
-              X_0=X*((1.0-0.095)**0.0)
-              X_1=X*((1.0-0.095)**1.0)
-              X_2=X*((1.0-0.095)**2.0)
-              X_3=X*((1.0-0.095)**3.0)
-              X_4=X*((1.0-0.095)**4.0)
-              X_5=X*((1.0-0.095)**5.0)
-              X_6=X*((1.0-0.095)**6.0)
-              X_7=X*((1.0-0.095)**7.0)
-              X_8=X*((1.0-0.095)**8.0)
-              X_9=X*((1.0-0.095)**9.0)
-              X_10=X*((1.0-0.095)**10.0)
-              X_11=X*((1.0-0.095)**11.0)
-              X_12=X*((1.0-0.095)**12.0)
-              X_13=X*((1.0-0.095)**13.0)
-              X_14=X*((1.0-0.095)**14.0)
- 
-              # Discount the costs of each year by their corresponding discount factor
-              df_Costs.loc[0:11,'O&M Costs'] = X_0
-              df_Costs.loc[12:23,'O&M Costs'] = X_1
-              df_Costs.loc[24:35,'O&M Costs'] = X_2
-              df_Costs.loc[36:47,'O&M Costs'] = X_3
-              df_Costs.loc[48:59,'O&M Costs'] = X_4
-              df_Costs.loc[60:71,'O&M Costs'] = X_5
-              df_Costs.loc[72:83,'O&M Costs'] = X_6
-              df_Costs.loc[84:95,'O&M Costs'] = X_7
-              df_Costs.loc[96:107,'O&M Costs'] = X_8
-              df_Costs.loc[108:119,'O&M Costs'] = X_9
-              df_Costs.loc[120:131,'O&M Costs'] = X_10
-              df_Costs.loc[132:143,'O&M Costs'] = X_11
-              df_Costs.loc[144:155,'O&M Costs'] = X_12
-              df_Costs.loc[156:167,'O&M Costs'] = X_13
-              df_Costs.loc[168:179,'O&M Costs'] = X_14
-    
-              # Introduce colum with Diesel costs           
-              df_Costs['Diesel Costs'] = np.zeros(180)
-
-              # Monthly de-discounted costs over lifetime assuming constant costs
-              X= df_opt.iat[0,33]/(0.54474*180.0)
-
-              # Assign discount factor to each year over lifetime
-              X_0=X*((1.0-0.095)**0.0)
-              X_1=X*((1.0-0.095)**1.0)
-              X_2=X*((1.0-0.095)**2.0)
-              X_3=X*((1.0-0.095)**3.0)
-              X_4=X*((1.0-0.095)**4.0)
-              X_5=X*((1.0-0.095)**5.0)
-              X_6=X*((1.0-0.095)**6.0)
-              X_7=X*((1.0-0.095)**7.0)
-              X_8=X*((1.0-0.095)**8.0)
-              X_9=X*((1.0-0.095)**9.0)
-              X_10=X*((1.0-0.095)**10.0)
-              X_11=X*((1.0-0.095)**11.0)
-              X_12=X*((1.0-0.095)**12.0)
-              X_13=X*((1.0-0.095)**13.0)
-              X_14=X*((1.0-0.095)**14.0)
-
-              # Discount the costs of each year by their corresponding discount factor
-              df_Costs.loc[0:11,'Diesel Costs'] = X_0
-              df_Costs.loc[12:23,'Diesel Costs'] = X_1
-              df_Costs.loc[24:35,'Diesel Costs'] = X_2
-              df_Costs.loc[36:47,'Diesel Costs'] = X_3
-              df_Costs.loc[48:59,'Diesel Costs'] = X_4
-              df_Costs.loc[60:71,'Diesel Costs'] = X_5
-              df_Costs.loc[72:83,'Diesel Costs'] = X_6
-              df_Costs.loc[84:95,'Diesel Costs'] = X_7
-              df_Costs.loc[96:107,'Diesel Costs'] = X_8
-              df_Costs.loc[108:119,'Diesel Costs'] = X_9
-              df_Costs.loc[120:131,'Diesel Costs'] = X_10
-              df_Costs.loc[132:143,'Diesel Costs'] = X_11
-              df_Costs.loc[144:155,'Diesel Costs'] = X_12
-              df_Costs.loc[156:167,'Diesel Costs'] = X_13
-              df_Costs.loc[168:179,'Diesel Costs'] = X_14             
-    
-        
-              # Total monthly costs and cumulative costs   
-              df_Costs['Total Costs'] = df_Costs['New Eq Costs']+df_Costs['Diesel Costs']+df_Costs['O&M Costs']
-              df_Costs['Cumulative Costs']=np.cumsum(df_Costs['Total Costs'])
-        
-           elif Systype == 'Hybrid':
-               
-              # Read csv file with the optimization
-              df_opt = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}.csv'.format(Systype, Reliability, Loadtype))  
-              
-              # Create costs dataframe for cumulative cost over lifetime              
-              df_Costs=pd.DataFrame()
-        
-              # Introduce colum with new equipment costs           
-              df_Costs['New Eq Costs'] = np.zeros(180)
-              df_Costs.iat[0,0]=df_opt.iat[0,30]
-              df_Costs.iat[60,0]=df_opt.iat[1,30]
-              df_Costs.iat[120,0]=df_opt.iat[2,30]
-    
-              # Introduce colum with O&M costs for each of the 3 iteration periods      
-              df_Costs['O&M Costs'] = np.zeros(180)
-              X_1= df_opt.iat[0,32]/60.0
-              X_2=df_opt.iat[1,32]/60.0
-              X_3=df_opt.iat[2,32]/60.0
-        
-              df_Costs.loc[0:59,'O&M Costs'] = X_1
-              df_Costs.loc[60:119,'O&M Costs'] = X_2
-              df_Costs.loc[120:179,'O&M Costs'] = X_3
-    
-              # Introduce colum with Diesel costs        
-              df_Costs['Diesel Costs'] = np.zeros(180)
-
-              # Monthly de-discounted costs over lifetime for each of the 3 iteration periods
-              X_A= df_opt.iat[0,33]/(60.0*0.827)
-              X_B=df_opt.iat[1,33]/(60.0*0.502)
-              X_C=df_opt.iat[2,33]/(60.0*0.304)
- 
-              # Discount the costs of each year by their corresponding discount factor             
-              X_0=X_A*((1.0-0.095)**0.0)
-              X_1=X_A*((1.0-0.095)**1.0)
-              X_2=X_A*((1.0-0.095)**2.0)
-              X_3=X_A*((1.0-0.095)**3.0)
-              X_4=X_A*((1.0-0.095)**4.0)
-              X_5=X_B*((1.0-0.095)**5.0)
-              X_6=X_B*((1.0-0.095)**6.0)
-              X_7=X_B*((1.0-0.095)**7.0)
-              X_8=X_B*((1.0-0.095)**8.0)
-              X_9=X_B*((1.0-0.095)**9.0)
-              X_10=X_C*((1.0-0.095)**10.0)
-              X_11=X_C*((1.0-0.095)**11.0)
-              X_12=X_C*((1.0-0.095)**12.0)
-              X_13=X_C*((1.0-0.095)**13.0)
-              X_14=X_C*((1.0-0.095)**14.0)              
-
-              # Discount the costs of each year by their corresponding discount factor
-              df_Costs.loc[0:11,'Diesel Costs'] = X_0
-              df_Costs.loc[12:23,'Diesel Costs'] = X_1
-              df_Costs.loc[24:35,'Diesel Costs'] = X_2
-              df_Costs.loc[36:47,'Diesel Costs'] = X_3
-              df_Costs.loc[48:59,'Diesel Costs'] = X_4
-              df_Costs.loc[60:71,'Diesel Costs'] = X_5
-              df_Costs.loc[72:83,'Diesel Costs'] = X_6
-              df_Costs.loc[84:95,'Diesel Costs'] = X_7
-              df_Costs.loc[96:107,'Diesel Costs'] = X_8
-              df_Costs.loc[108:119,'Diesel Costs'] = X_9
-              df_Costs.loc[120:131,'Diesel Costs'] = X_10
-              df_Costs.loc[132:143,'Diesel Costs'] = X_11
-              df_Costs.loc[144:155,'Diesel Costs'] = X_12
-              df_Costs.loc[156:167,'Diesel Costs'] = X_13
-              df_Costs.loc[168:179,'Diesel Costs'] = X_14      
-
-        
-              # Total monthly costs and cumulative costs   
-              df_Costs['Total Costs'] = df_Costs['New Eq Costs']+df_Costs['Diesel Costs']+df_Costs['O&M Costs']
-              df_Costs['Cumulative Costs']=np.cumsum(df_Costs['Total Costs'])               
-               
+              df_opt = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV0_Storage0_{}_Re{}_Load{}_Appraisal.csv'.format(Systype, Reliability, Loadtype))
            else:
-        
-              # Read csv file with the optimization
-              df_opt = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}.csv'.format(Systype, Reliability, Loadtype))  
-
-              # Create costs dataframe for cumulative cost over lifetime                      
-              df_Costs=pd.DataFrame()
-    
-              # Introduce colum with new equipment costs           
-              df_Costs['New Eq Costs'] = np.zeros(180)
-              df_Costs.iat[0,0]=df_opt.iat[0,30]
-              df_Costs.iat[60,0]=df_opt.iat[1,30]
-              df_Costs.iat[120,0]=df_opt.iat[2,30]
-    
-              # Introduce colum with O&M costs for each of the 3 iteration periods            
-              df_Costs['O&M Costs'] = np.zeros(180)
-              X_1= df_opt.iat[0,32]/60.0
-              X_2=df_opt.iat[1,32]/60.0
-              X_3=df_opt.iat[2,32]/60.0
-       
-              df_Costs.loc[0:59,'O&M Costs'] = X_1
-              df_Costs.loc[60:119,'O&M Costs'] = X_2
-              df_Costs.loc[120:179,'O&M Costs'] = X_3
-    
-              # Introduce colum with Diesel costs for each of the 3 iteration periods           
-              df_Costs['Diesel Costs'] = np.zeros(180)
-              X_1=df_opt.iat[0,33]/60.0
-              X_2=df_opt.iat[1,33]/60.0
-              X_3=df_opt.iat[2,33]/60.0
-    
-              df_Costs.loc[0:59,'Diesel Costs'] = X_1
-              df_Costs.loc[60:119,'Diesel Costs'] = X_2
-              df_Costs.loc[120:179,'Diesel Costs'] = X_3
-        
-              # Total monthly costs and cumulative costs
-              df_Costs['Total Costs'] = df_Costs['New Eq Costs']+df_Costs['Diesel Costs']+df_Costs['O&M Costs']
-              df_Costs['Cumulative Costs']=np.cumsum(df_Costs['Total Costs'])
-    
-              # Append results to final plotting data variable
-    
-           if Systype=='Hybrid':
-        
-               cumulative_cost[column+' Hybrid']=df_Costs['Cumulative Costs']
-
-           elif Systype=='PVBatt':
-        
-               cumulative_cost[column+' PV-Battery']=df_Costs['Cumulative Costs']
-        
-           elif Systype=='Diesel':
-        
-               cumulative_cost[column+' Diesel']=df_Costs['Cumulative Costs']
+              df_opt = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}.csv'.format(Systype, Reliability, Loadtype))
+           
+           # Append results to final plotting data variable
+           df_Costs = df_curves['{} {}'.format(Loadtype, Systype)]
+           cumulative_cost['{} {}'.format(columns[Loadtype], names[Systype])] = df_Costs['Cumulative Costs']
                
            # Extract final cumulative cost and LCUE                               
            Appraisal_indexes=[30,14]        
@@ -5366,7 +8274,7 @@ def cumulative_costs(max_blackouts):
     # Plot results: 1) Cumulative costs over lifetime for each Scenario
 
     # X variable as months over lifetime (15 years)    
-    x=list(range(0,180))
+    x=list(range(0,len(df_curves)))
 
     # Extract plotting variables
     labels=[]
@@ -5449,6 +8357,7 @@ def cumulative_costs(max_blackouts):
     #Save the monthly total load data in a file    
     df_CummCosts=pd.DataFrame(cumulative_cost, index=None)
     filepath=self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Analysis/Scenario comparison/{} Re/CumulativeCosts.csv".format(Reliability)
+    df_CummCosts.to_csv(filepath, index=None)
     
     print( "\n Data saved as CumulativeCosts.csv" )
 
@@ -5504,14 +8413,14 @@ def tariff_calculation(Systype, max_blackouts):
         
     Input: Type of system and reliability level required
         
-    Output: Calculates a number of relevant tariffs
+    Output: DataFrame with the additional costs, tariffs, savings and revenue calculated
+            Save it as Tariff_calculation_{Systype}_Re{Reliability}.csv in Analysis/Tariffs directory
     
     """           
-    from operator import add  
     
     # Open Scenario 1 PV-Battery System optimisation file         
     Loadtype='Mix1'    
-    Reliability= int((1.0 - max_blackouts)*100.0)  
+    Reliability= reliability_level(max_blackouts)  
     df_opt1 = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}.csv'.format(Systype, Reliability, Loadtype))    
   
     # Open Scenario 1 diesel system appraisal file
@@ -5524,75 +8433,354 @@ def tariff_calculation(Systype, max_blackouts):
     # Open Scenario 1 to 2B (A) PV-Battery System optimisation file       
     df_optA = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/Opt_{}_Re{}_Load{}_{}.csv'.format(Systype, Reliability, Loadtype,'A'))
         
-    # Get the additional cumulative discounted cost of A and B    
+    # Get the cumulative discounted cost of each system, the additional costs of A and B are obtained with tariff_metrics()    
     CumulativeCost_1=df_opt1.iloc[-1,8]    
-    LCUE_1=df_opt1.iloc[-1,14]    
     CumulativeCost_diesel=df_diesel.iloc[-1,8]    
     LCUE_diesel=df_diesel.iloc[-1,14]
     CumulativeCost_A=df_optA.iloc[-1,8]
     CumulativeCost_B=df_optB.iloc[-1,8]        
-    AdditionalCost_A=CumulativeCost_A-CumulativeCost_1    
-    AdditionalCost_B=CumulativeCost_B-CumulativeCost_1
     
     # Calculate total hourly energy consumption
-    load_filepath=self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Load/Device Load/{}_load.csv'.format('total')
+    load_filepath=self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Load/Device load/{}_load.csv'.format('total')
     Total_Load=pd.read_csv(load_filepath)     
-    Total_private=pd.DataFrame(Total_Load.loc[:,'Commercial'])                           
+    
+    # Discount factor of each hour over lifetime of system
+    finance, ghgs = get_impact_inputs()
+    discount = discount_factors(finance['Discount rate'], np.arange(len(Total_Load)) // 8760)[0]
     
     # Calculate discounted hourly revenue if charged at grid tariff level    
     grid_tariff=0.0002244 # in $/Wh     
-    Total_private['Revenue'] = np.multiply(Total_private['Commercial'],grid_tariff)             
-    Total_discount=[]
-    
-    for year in range(0,15):
-        
-        discount_factor=(1-0.095)**year        
-        yearly_factor= [discount_factor] * 8760        
-        Total_discount.extend(yearly_factor)        
-
-    Total_private['Discount factor'] = Total_discount        
-    Total_private['Discounted revenue'] = np.multiply(Total_private['Revenue'],Total_private['Discount factor'])
+    Revenue = Total_Load['Commercial'].values * grid_tariff * discount
     
     # Calculate cumulative discounted revenue over lifetime of system from businesses connected
-    Total_private['Cumulative discounted revenue']=np.cumsum(Total_private['Discounted revenue'])
-    Cumulative_revenue=Total_private.iloc[-1,4]
+    Cumulative_revenue=Revenue.sum()
+    
+    # Obtain remaining additional costs, tariffs for public users +10%ROI and savings compared to diesel system
+    Total_discounted_public_energy=(Total_Load['Public'].values * discount).sum()/1000.0
+    
+    metrics = tariff_metrics(CumulativeCost_1, CumulativeCost_A, CumulativeCost_B, CumulativeCost_diesel, LCUE_diesel, Cumulative_revenue, Total_discounted_public_energy)
+    
+    metrics['Cumulative revenue ($)'] = Cumulative_revenue
+    metrics['Revenue last year ($)'] = Revenue[-8760:].sum()
+    
+    df_tariffs = pd.DataFrame(metrics, index=[Reliability])
+    df_tariffs.index.name = 'Reliability'
+    
+    # Create a directory for the tariffs and save them
+    script_dir = os.path.dirname(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Analysis/Tariffs/")
+    
+    if not os.path.isdir(script_dir):
+          os.makedirs(script_dir)
+    
+    df_tariffs.to_csv(os.path.join(script_dir, 'Tariff_calculation_{}_Re{}.csv'.format(Systype, Reliability)))
+    print('\n Tariffs saved as Tariff_calculation_{}_Re{}.csv'.format(Systype, Reliability))
+    
+    return df_tariffs
 
-    # Create a date range column corresponding to the lifetime of the system
-        
-    date_rng = pd.date_range(start='1/1/2020', end='1/1/2035', freq='H')            
-    Date=date_rng[:131400]    
-    Total_private['Date'] = Date
+
+def tariff_metrics (CumulativeCost_1, CumulativeCost_A, CumulativeCost_B, CumulativeCost_diesel, LCUE_diesel, Cumulative_revenue, Total_discounted_public_energy):
+    """
+    Calculates the additional costs of Approach A and B, and the tariffs for public users to recover them
+    
+    Input: Cumulative discounted costs of Scenario 1, Approach A, Approach B and diesel systems ($)
+           LCUE of the diesel system ($/kWh)
+           Cumulative discounted revenue of businesses at grid tariff ($)
+           Total discounted energy of public users (kWh)
+           Any of them can be an array of values, i.e. one value per sample
+    
+    Output: Dictionary with the additional costs, remaining costs, tariffs, savings and LCUE variation of A and B
+    
+    """
+    metrics = collections.OrderedDict()
+    
+    # Get the additional cumulative discounted cost of A and B    
+    metrics['Additional cost A ($)'] = CumulativeCost_A - CumulativeCost_1
+    metrics['Additional cost B ($)'] = CumulativeCost_B - CumulativeCost_1
     
     # Obtain remaining additional costs to pay    
-    Extra_cost_A=AdditionalCost_A-Cumulative_revenue
-    Extra_cost_B=AdditionalCost_B-Cumulative_revenue    
+    metrics['Extra cost A ($)'] = metrics['Additional cost A ($)'] - Cumulative_revenue
+    metrics['Extra cost B ($)'] = metrics['Additional cost B ($)'] - Cumulative_revenue
     
     # Obtain the tariff that public users need to pay to pay back for the complete system +10%ROI    
-    Discounted_public_energy=np.multiply(Total_Load.loc[:,'Public'],Total_private['Discount factor'])
-    Total_discounted_public_energy=Discounted_public_energy.sum()/1000.0
+    metrics['Tariff A total system ($/kWh)'] = CumulativeCost_A * 1.1 / Total_discounted_public_energy
+    metrics['Tariff B total system ($/kWh)'] = CumulativeCost_B * 1.1 / Total_discounted_public_energy
+    
+    # Obtain LCUE for public users to pay just for Scenario 1 system + remaining from additional A/B    
+    Total_Cost_A_extra_withROI = (CumulativeCost_1 + metrics['Extra cost A ($)']) + CumulativeCost_A * 0.1
+    Total_Cost_B_extra_withROI = (CumulativeCost_1 + metrics['Extra cost B ($)']) + CumulativeCost_B * 0.1
+    
+    metrics['Tariff A extra ($/kWh)'] = Total_Cost_A_extra_withROI / Total_discounted_public_energy
+    metrics['Tariff B extra ($/kWh)'] = Total_Cost_B_extra_withROI / Total_discounted_public_energy
+    
+    metrics['Savings with extra A ($)'] = CumulativeCost_diesel - Total_Cost_A_extra_withROI
+    metrics['Savings with extra B ($)'] = CumulativeCost_diesel - Total_Cost_B_extra_withROI
+    
+    metrics['LCUE variation extra A (%)'] = -(LCUE_diesel - metrics['Tariff A extra ($/kWh)']) * 100.0 / LCUE_diesel
+    metrics['LCUE variation extra B (%)'] = -(LCUE_diesel - metrics['Tariff B extra ($/kWh)']) * 100.0 / LCUE_diesel
+    
+    return metrics
 
-    Total_Cost_A_withROI=CumulativeCost_A*1.1
-    Total_Cost_B_withROI=CumulativeCost_B*1.1    
 
-    TariffA_TotalSystem=Total_Cost_A_withROI/Total_discounted_public_energy
-    TariffB_TotalSystem=Total_Cost_B_withROI/Total_discounted_public_energy
+def tariff_structure (classes, peak_hours, peak_ratio):
+    """
+    Define a tariff structure as the relative price paid by each class of users at each hour of the day 
     
-    # Obtain LCUE for public users to pay just for Scenario 1 system + remaining from additional A/B    
-    Total_Cost_A_extra_withROI=(CumulativeCost_1+Extra_cost_A)+CumulativeCost_A*0.1
-    Total_Cost_B_extra_withROI=(CumulativeCost_1+Extra_cost_B)+CumulativeCost_B*0.1
+    Input: List of classes of users charged, between 'Domestic', 'Commercial' and 'Public'
+           List of peak hours of the day (empty for a flat tariff), i.e.: [18,19,20,21]
+           Ratio of the peak price to the off-peak price
+    
+    Output: DataFrame with one row per class of users and one column per hour of the day with the relative price,
+            i.e. tariff_structure(['Commercial'], [], 1.0) for a flat tariff for businesses only
+    
+    """
+    df_structure = pd.DataFrame(0.0, index=['Domestic', 'Commercial', 'Public'], columns=range(24))
+    df_structure.loc[classes, :] = 1.0
+    df_structure.loc[classes, list(peak_hours)] = peak_ratio
+    
+    return df_structure
+
+
+def break_even_tariffs (df_targets, structures, df_load, discount_rate):
+    """
+    Obtain the tariffs that recover a set of discounted costs for a set of tariff structures, all at once. The discounted 
+    revenue of every structure is proportional to its tariff, so the break-even tariffs are the costs divided by the
+    discounted energy charged by each structure
+    
+    Input: Series of discounted costs to recover ($), i.e. one per reliability level and approach
+           Dictionary of tariff structures, each one as obtained with tariff_structure(classes, peak_hours, peak_ratio)
+           DataFrame of hourly load (kWh) of the Domestic, Commercial and Public users over the lifetime of the system
+           Discount rate (fraction)
+    
+    Output: DataFrame with the off-peak tariff ($/kWh) of each cost (rows) and tariff structure (columns)
+    
+    """
+    # Discounted energy of each class of users at each hour of the day (classes x 24)
+    discount = discount_factors(discount_rate, np.arange(len(df_load)) // 8760)[0]
+    hours = np.arange(len(df_load)) % 24
+    
+    classes = ['Domestic', 'Commercial', 'Public']
+    energy = np.array([np.bincount(hours, weights=discount * df_load[category].values, minlength=24) for category in classes])
+    
+    # Discounted energy charged by each structure, at a tariff of 1 $/kWh
+    charged = np.array([(structures[name].loc[classes].values * energy).sum() for name in structures])
+    
+    tariffs = df_targets.values.astype(float)[:, np.newaxis] / charged[np.newaxis, :]
+    
+    return pd.DataFrame(tariffs, index=df_targets.index, columns=list(structures))
+
+
+def tariff_table (Systype, Blackout_levels, structures, ROI):
+    """
+    Obtain the break-even tariffs of the Scenario 1, Approach A and Approach B systems, and of the additional costs of 
+    Approach A and B, for all reliability levels and tariff structures in one call
+    
+    PRE-REQUISITE: Same files used by tariff_calculation(Systype, max_blackouts), for each reliability level
+    
+    Input: Type of system
+           List of blackout thresholds (max_blackouts)
+           Dictionary of tariff structures, each one as obtained with tariff_structure(classes, peak_hours, peak_ratio)
+           Return on investment added to the costs (fraction), i.e.: 0.1
+    
+    Output: DataFrame with the cost recovered and the off-peak tariff ($/kWh) of each structure, for each reliability 
+            level and cost
+            Save it as Tariffs_{Systype}.csv in Analysis/Tariffs directory
+    
+    """
+    opt_dir = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Optimisation/Saved optimisations/'
+    
+    # Discounted costs to recover for each reliability level
+    targets = collections.OrderedDict()
+    
+    for max_blackouts in Blackout_levels:
+        
+        Reliability = reliability_level(max_blackouts)
+        
+        CumulativeCost_1 = pd.read_csv(opt_dir + 'Opt_{}_Re{}_Load{}.csv'.format(Systype, Reliability, 'Mix1'))['Cumulative cost ($)'].iat[-1]
+        CumulativeCost_A = pd.read_csv(opt_dir + 'Opt_{}_Re{}_Load{}_{}.csv'.format(Systype, Reliability, 'Mix1to2B', 'A'))['Cumulative cost ($)'].iat[-1]
+        CumulativeCost_B = pd.read_csv(opt_dir + 'Opt_{}_Re{}_Load{}_{}.csv'.format(Systype, Reliability, 'Mix1to2B', 'B'))['Cumulative cost ($)'].iat[-1]
+        
+        targets[(Reliability, 'Scenario 1 system')] = CumulativeCost_1
+        targets[(Reliability, 'Approach A system')] = CumulativeCost_A
+        targets[(Reliability, 'Approach B system')] = CumulativeCost_B
+        targets[(Reliability, 'Additional cost A')] = CumulativeCost_A - CumulativeCost_1
+        targets[(Reliability, 'Additional cost B')] = CumulativeCost_B - CumulativeCost_1
+    
+    df_targets = pd.Series(targets) * (1.0 + ROI)
+    df_targets.index.names = ['Reliability', 'Cost']
+    
+    # Hourly load of each class of users (kWh)
+    df_load = pd.read_csv(self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Load/Device load/total_load.csv')[['Domestic', 'Commercial', 'Public']] / 1000.0
+    finance, ghgs = get_impact_inputs()
+    
+    df_tariffs = break_even_tariffs(df_targets, structures, df_load, finance['Discount rate'])
+    df_tariffs.insert(0, 'Cost recovered ($)', df_targets)
+    
+    # Create a directory for the tariffs and save them
+    script_dir = os.path.dirname(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Analysis/Tariffs/")
+    
+    if not os.path.isdir(script_dir):
+          os.makedirs(script_dir)
+    
+    df_tariffs.to_csv(os.path.join(script_dir, 'Tariffs_{}.csv'.format(Systype)))
+    print('\n Tariffs saved as Tariffs_{}.csv'.format(Systype))
+    
+    return df_tariffs
+
+
+def draw_samples (rng, distribution, samples):
+    """
+    Draw samples of an uncertain input 
+    
+    Input: Random number generator
+           Distribution of the input, between ('normal', mean, standard deviation), ('uniform', minimum, maximum),
+               ('triangular', minimum, mode, maximum) and ('lognormal', median, standard deviation of its logarithm)
+           Number of samples
+    
+    Output: Array of samples
+    
+    """
+    if distribution[0] == 'normal':
+        return rng.normal(distribution[1], distribution[2], samples)
+    elif distribution[0] == 'uniform':
+        return rng.uniform(distribution[1], distribution[2], samples)
+    elif distribution[0] == 'triangular':
+        return rng.triangular(distribution[1], distribution[2], distribution[3], samples)
+    elif distribution[0] == 'lognormal':
+        return distribution[1] * rng.lognormal(0.0, distribution[2], samples)
+    else:
+        raise ValueError("Distribution {} not supported, between 'normal', 'uniform', 'triangular' and 'lognormal'".format(distribution[0]))
+
+
+def uncertainty_analysis (Systype, max_blackouts, distributions, samples):
+    """
+    Propagate the uncertainty of financial inputs and load to LCUE, cumulative costs, additional costs of Approach A and B
+    and tariffs of tariff_calculation() by Monte Carlo, re-appraising the saved systems for every sample
+    
+    PRE-REQUISITE: Same files used by tariff_calculation(Systype, max_blackouts)
+    
+    Input: Type of system and reliability level required
+           Dictionary with the distribution of each uncertain input (see draw_samples), where inputs can be any financial 
+               input, i.e. 'Discount rate', 'Diesel fuel cost', 'Diesel fuel cost decrease' (negative for an increasing 
+               fuel price trajectory), 'PV cost decrease', 'Storage cost decrease', and 'Load scaling' (fraction of the 
+               simulated load), or any GHG input. Inputs not included keep the values of the input files 
+           Number of samples
+    
+    Output: DataFrame with the mean and percentiles 5, 25, 50, 75 and 95 of each result
+            Save .csv files of the samples and percentile bands and .png graph in Analysis/Uncertainty Analysis directory
+    
+    Energy flows and diesel fuel are scaled in proportion to the load, with the installed capacities of each system
+    
+    """
+    Reliability= reliability_level(max_blackouts)  
+    
+    # Yearly energy flows of Scenario 1, Approach A, Approach B and diesel systems
+    systems = collections.OrderedDict()
+    systems['1'] = get_optimisation_aggregates('Opt_{}_Re{}_Load{}'.format(Systype, Reliability, 'Mix1'), '1')
+    systems['A'] = get_optimisation_aggregates('Opt_{}_Re{}_Load{}_{}'.format(Systype, Reliability, 'Mix1to2B', 'A'), 'A')
+    systems['B'] = get_optimisation_aggregates('Opt_{}_Re{}_Load{}_{}'.format(Systype, Reliability, 'Mix1to2B', 'B'), 'B')
+    
+    filepath = self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Simulation/Saved simulations/Sim_PV{}_Storage{}_{}_Re{}_Load{}'.format(0, 0, 'Diesel', Reliability, 'Mix1')
+    systems['Diesel'] = get_energy_aggregates((pd.read_csv(filepath + '.csv'), pd.read_csv(filepath + '_Appraisal.csv')), 'Diesel')
+    
+    df_aggregates = pd.concat(systems.values(), ignore_index=True)
+    
+    # Yearly energy consumption of businesses and public users (Wh)
+    load_filepath=self.CLOVER_filepath + '/CLOVER-master/Locations/Refugee_Camp/Load/Device load/total_load.csv'
+    Total_Load=pd.read_csv(load_filepath)
+    years = np.arange(len(Total_Load)) // 8760
+    private_energy = Total_Load['Commercial'].groupby(years).sum().values
+    public_energy = Total_Load['Public'].groupby(years).sum().values
     
-    TariffA_extra=Total_Cost_A_extra_withROI/Total_discounted_public_energy
-    TariffB_extra=Total_Cost_B_extra_withROI/Total_discounted_public_energy
+    grid_tariff=0.0002244 # in $/Wh     
+    
+    rng = np.random.default_rng(0)
+    df_samples = []
+    
+    # Appraise the samples in chunks to keep the memory used bounded
+    for chunk in range(0, samples, 2000):
+        
+        n = min(2000, samples - chunk)
+        
+        finance, ghgs = get_impact_inputs()
+        scaling = np.ones(n)
+        df_chunk = pd.DataFrame(index=range(chunk, chunk + n))
+        
+        for name, distribution in distributions.items():
+            
+            values = draw_samples(rng, distribution, n)
+            df_chunk[name] = values
+            
+            if name == 'Load scaling':
+                scaling = values
+            elif name in finance:
+                finance[name] = values
+            elif name in ghgs:
+                ghgs[name] = values
+            else:
+                raise KeyError('{} is not a financial or GHG input'.format(name))
+        
+        results = reappraise_systems(df_aggregates, finance, ghgs)
+        
+        # Fuel and grid costs and energy change with the load, the other costs depend on the installed capacities
+        variable_cost = results['Diesel cost ($)'] + results['Grid cost ($)']
+        cumulative_cost = results['Cumulative cost ($)'] + (scaling[:, np.newaxis] - 1.0) * variable_cost
+        LCUE = (results['Total system cost ($)'] + (scaling[:, np.newaxis] - 1.0) * variable_cost) / (scaling[:, np.newaxis] * results['Discounted energy (kWh)'])
+        
+        for n_system, system in enumerate(systems):
+            df_chunk['LCUE {} ($/kWh)'.format(system)] = LCUE[:, n_system]
+            df_chunk['Cumulative cost {} ($)'.format(system)] = cumulative_cost[:, n_system]
+        
+        # Discounted revenue of businesses at grid tariff and discounted energy of public users
+        discount = discount_factors(finance['Discount rate'], np.arange(len(private_energy))) * np.ones((n, 1))
+        Cumulative_revenue = scaling * (discount @ private_energy) * grid_tariff
+        Total_discounted_public_energy = scaling * (discount @ public_energy) / 1000.0
+        
+        df_chunk['Cumulative revenue ($)'] = Cumulative_revenue
+        
+        metrics = tariff_metrics(cumulative_cost[:, 0], cumulative_cost[:, 1], cumulative_cost[:, 2], cumulative_cost[:, 3], LCUE[:, 3], 
+                                 Cumulative_revenue, Total_discounted_public_energy)
+        
+        for name, values in metrics.items():
+            df_chunk[name] = values
+        
+        df_samples.append(df_chunk)
     
-    Savings_with_extra_A=CumulativeCost_diesel-Total_Cost_A_extra_withROI
-    Savings_with_extra_B=CumulativeCost_diesel-Total_Cost_B_extra_withROI
+    df_samples = pd.concat(df_samples)
     
-    LCUE_variation_extra_A=-(LCUE_diesel-TariffA_extra)*100.0/LCUE_diesel
-    LCUE_variation_extra_B=-(LCUE_diesel-TariffB_extra)*100.0/LCUE_diesel
+    # Percentile bands of each result
+    results = [column for column in df_samples.columns if column not in distributions]
+    df_bands = df_samples[results].describe(percentiles=[0.05, 0.25, 0.5, 0.75, 0.95]).transpose()
+    df_bands = df_bands[['mean', '5%', '25%', '50%', '75%', '95%']]
     
-    Revenue=Total_private['Discounted revenue']
-    Revenue_lastyear=Revenue.iloc[-8760:].sum()
+    # Create a directory with the name of the data and save it
+    script_dir = os.path.dirname(self.CLOVER_filepath + "/CLOVER-master/Locations/Refugee_Camp/Analysis/Uncertainty Analysis/")
+    plot_dir = os.path.join(script_dir, 'Uncertainty_{}_Re{}/'.format(Systype, Reliability))
+    
+    if not os.path.isdir(plot_dir):
+          os.makedirs(plot_dir)
+    
+    df_samples.to_csv(plot_dir + 'Samples.csv', index=None)
+    df_bands.to_csv(plot_dir + 'Percentile_bands.csv')
+    
+    # Plot the distribution of LCUE and tariffs
+    plotted = ['LCUE 1 ($/kWh)', 'LCUE Diesel ($/kWh)', 'Tariff A total system ($/kWh)', 'Tariff B total system ($/kWh)', 'Tariff A extra ($/kWh)', 'Tariff B extra ($/kWh)']
+    
+    fig, ax = plt.subplots()
+    ax.boxplot([df_samples[column] for column in plotted], whis=[5, 95], showfliers=False)
+    ax.set_xticklabels(['LCUE', 'LCUE diesel', 'Tariff A', 'Tariff B', 'Tariff A\nextra', 'Tariff B\nextra'], fontsize=12)
+    plt.ylabel("$/kWh", fontsize=15)
+    ax.grid()
+    
+    # Save graph in corresponding Uncertainty Analysis directory
+    plot_name = "Uncertainty_{}_Re{}.png".format(Systype, Reliability)
+    fig.savefig(plot_dir + plot_name, dpi=300, bbox_inches='tight')
+    plt.show()
     
+    print('Figure saved as', plot_name)
+    
+    return df_bands
+
+
 """
 ===============================================================================
                  SUSTAINABLE MINI-GRID ANALYSIS FOR NYABIHEKE